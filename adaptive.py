@@ -0,0 +1,462 @@
+"""Adaptive quizzes: every next question is pitched at the student's current ability.
+
+Usage: python adaptive.py [--students 2000] [--bank 500] [--target-se 0.58]   (simulation)
+
+Model (Rasch, i.e. Elo with a logistic curve): a student of ability t gets
+a question of difficulty b right with probability 1 / (1 + e^(b - t)),
+both in logits.
+- Question difficulties start from the answers recorded so far (see
+  analytics.py) and take a small Elo step after every answer.
+- The student's ability is re-estimated after each answer (maximum a
+  posteriori over this quiz's answers, with a standard normal prior), which
+  also gives its standard error.
+- The most informative next question is the one whose difficulty is closest
+  to that estimate. DifficultyIndex keeps each course's questions in
+  difficulty buckets with a sorted list of bucket keys, so finding it is a
+  bisect plus a random pick, O(log n), however big the bank is.
+- The quiz stops as soon as the standard error is below the target (after a
+  minimum number of questions), so a reliable score takes fewer questions,
+  and fewer question reads, than a fixed-length random quiz.
+"""
+import sys
+import math
+import time
+import random
+import bisect
+import argparse
+import threading
+
+from quizengine import QuizSession, QuestionRecord, InvalidQuestionError
+
+BUCKET_WIDTH = 0.25 # Logits of difficulty per index bucket
+DEFAULT_MIN_QUESTIONS = 5
+DEFAULT_MAX_QUESTIONS = 20
+DEFAULT_TARGET_SE = 0.58 # Stop once the ability estimate is this precise (in logits)
+PRIOR_SD = 1.0 # Abilities are measured relative to the average student
+ELO_K = 0.4 # First step size for a question's difficulty...
+ELO_DECAY = 0.05 # ...shrinking as K / (1 + decay * answers) as evidence piles up
+MAX_LOGIT = 30.0
+
+
+def p_correct(ability, difficulty):
+    z = max(-MAX_LOGIT, min(MAX_LOGIT, ability - difficulty))
+    return 1.0 / (1.0 + math.exp(-z))
+
+def prior_difficulty(answered, correct):
+    """Starting difficulty from recorded answers: the log-odds of a wrong answer, smoothed."""
+    return math.log((answered - correct + 1) / (correct + 1))
+
+def estimate_ability(difficulties, outcomes, prior_sd=PRIOR_SD, start=0.0):
+    """(ability, standard error) from the questions asked so far and whether each was right."""
+    ability = start
+    for _ in range(25): # Newton's method; the log posterior is concave, so this converges fast
+        gradient = -ability / (prior_sd * prior_sd)
+        information = 1.0 / (prior_sd * prior_sd)
+        for difficulty, correct in zip(difficulties, outcomes):
+            p = p_correct(ability, difficulty)
+            gradient += correct - p
+            information += p * (1.0 - p)
+        step = gradient / information
+        ability += step
+        if abs(step) < 1e-6:
+            break
+    return ability, 1.0 / math.sqrt(information)
+
+
+class DifficultyIndex:
+    """The questions of one course, bucketed by estimated difficulty.
+
+    Buckets are lists with an id -> position map, so moving a question to
+    another bucket is an O(1) swap-remove; `_keys` lists the non-empty
+    buckets in order and is what `nearest()` bisects.
+    """
+    def __init__(self, ratings=()):
+        self._rating = {} # id -> [difficulty, answers seen]
+        self._buckets = {} # bucket key -> [id, ...]
+        self._pos = {} # id -> index into its bucket
+        self._keys = [] # Sorted keys of the non-empty buckets
+        for q_id, difficulty, answered in ratings:
+            self.add(q_id, difficulty, answered)
+
+    def __len__(self):
+        return len(self._rating)
+
+    @staticmethod
+    def _key(difficulty):
+        return math.floor(difficulty / BUCKET_WIDTH)
+
+    def _place(self, q_id, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = []
+            bisect.insort(self._keys, key)
+        self._pos[q_id] = len(bucket)
+        bucket.append(q_id)
+
+    def _unplace(self, q_id, key):
+        bucket = self._buckets[key]
+        i = self._pos.pop(q_id)
+        last = bucket.pop()
+        if i < len(bucket):
+            bucket[i] = last
+            self._pos[last] = i
+        if not bucket:
+            del self._buckets[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def add(self, q_id, difficulty=0.0, answered=0):
+        if q_id in self._rating:
+            return
+        self._rating[q_id] = [difficulty, answered]
+        self._place(q_id, self._key(difficulty))
+
+    def discard(self, q_id):
+        rating = self._rating.pop(q_id, None)
+        if rating is not None:
+            self._unplace(q_id, self._key(rating[0]))
+
+    def difficulty(self, q_id):
+        rating = self._rating.get(q_id)
+        return rating[0] if rating else None
+
+    def difficulties(self):
+        return [rating[0] for rating in self._rating.values()]
+
+    def nearest(self, target, exclude=(), rng=random):
+        """A question of difficulty close to `target` that is not in `exclude`, or None."""
+        keys = self._keys
+        hi = bisect.bisect_left(keys, self._key(target))
+        lo = hi - 1
+        while lo >= 0 or hi < len(keys):
+            # Visit buckets outwards from the target, nearer bucket centre first
+            if hi >= len(keys) or (lo >= 0 and target - (keys[lo] + 0.5) * BUCKET_WIDTH
+                                   <= (keys[hi] + 0.5) * BUCKET_WIDTH - target):
+                bucket, lo = self._buckets[keys[lo]], lo - 1
+            else:
+                bucket, hi = self._buckets[keys[hi]], hi + 1
+            for _ in range(4): # A quiz excludes a handful of ids, so random picks almost always land
+                q_id = bucket[rng.randrange(len(bucket))]
+                if q_id not in exclude:
+                    return q_id
+            remaining = [q_id for q_id in bucket if q_id not in exclude]
+            if remaining:
+                return rng.choice(remaining)
+        return None
+
+    def record(self, q_id, correct, ability):
+        """Elo step for one answer. Returns the probability the model gave it of being right."""
+        rating = self._rating.get(q_id)
+        if rating is None:
+            return p_correct(ability, 0.0)
+        old_key = self._key(rating[0])
+        p = p_correct(ability, rating[0])
+        rating[0] += ELO_K / (1.0 + ELO_DECAY * rating[1]) * (p - correct)
+        rating[1] += 1
+        new_key = self._key(rating[0])
+        if new_key != old_key:
+            self._unplace(q_id, old_key)
+            self._place(q_id, new_key)
+        return p
+
+
+class AdaptiveSelector:
+    """One DifficultyIndex per course, built the first time the course is quizzed.
+
+    `answer_counts(course)` -> {id: (answered, correct)} seeds the difficulties,
+    e.g. analytics.ItemAnalytics.answer_counts. Like QuestionSampler, it is
+    told about new and deleted questions through add() / discard(), and
+    `id_source` can narrow the ids a course is built from.
+    """
+    def __init__(self, store, answer_counts=None, seed=None, id_source=None):
+        self.store = store
+        self.id_source = id_source or store.course_question_ids
+        self.answer_counts = answer_counts
+        self.rng = random.Random(seed)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _index(self, course_name):
+        index = self._indexes.get(course_name)
+        if index is None:
+            counts = self.answer_counts(course_name) if self.answer_counts else {}
+            index = DifficultyIndex(
+                (q_id, prior_difficulty(*counts[q_id]) if q_id in counts else 0.0, counts.get(q_id, (0, 0))[0])
+                for q_id in self.id_source(course_name) or [])
+            self._indexes[course_name] = index
+        return index
+
+    def load(self, course_name, ratings):
+        """Replaces a course's index with (id, difficulty, answers seen) ratings, e.g. for a simulation."""
+        with self._lock:
+            self._indexes[course_name] = DifficultyIndex(ratings)
+
+    def add(self, course_name, q_id):
+        with self._lock:
+            if course_name in self._indexes:
+                self._indexes[course_name].add(q_id)
+
+    def discard(self, course_name, q_id):
+        with self._lock:
+            if course_name in self._indexes:
+                self._indexes[course_name].discard(q_id)
+
+    def invalidate(self, course_name=None):
+        with self._lock:
+            if course_name is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(course_name, None)
+
+    def choose(self, course_name, ability, exclude=()):
+        """(id, difficulty) of the best next question, or None when every question has been asked."""
+        with self._lock:
+            index = self._index(course_name)
+            q_id = index.nearest(ability, exclude, self.rng)
+            return None if q_id is None else (q_id, index.difficulty(q_id))
+
+    def record(self, course_name, q_id, correct, ability):
+        with self._lock:
+            return self._index(course_name).record(q_id, correct, ability)
+
+    def expected_share(self, course_name, ability):
+        """The share of the whole course a student of this ability would get right."""
+        with self._lock:
+            difficulties = self._index(course_name).difficulties()
+        if not difficulties:
+            return 0.0
+        return sum(p_correct(ability, difficulty) for difficulty in difficulties) / len(difficulties)
+
+    def start_session(self, course_name, fetch_row, min_questions=DEFAULT_MIN_QUESTIONS,
+                      max_questions=DEFAULT_MAX_QUESTIONS, target_se=DEFAULT_TARGET_SE, timed=False):
+        """A new AdaptiveSession with its first question fetched. `fetch_row(course, id)` returns a question row."""
+        return AdaptiveSession(course_name, self, fetch_row, min_questions, max_questions, target_se, timed)
+
+
+class AdaptiveSession(QuizSession):
+    """A QuizSession that picks each question after the previous answer.
+
+    `questions` grows as the quiz goes; `total` is the most it can reach
+    until the quiz is over, then the number actually asked. The final
+    score (score_out_of) is the share of the course the estimated ability
+    predicts, not the raw share of the questions asked, which adaptive
+    selection pushes towards one half for everyone.
+
+    While the student reads a question, `prepare_next()` can pick and fetch
+    the question that would follow a right and a wrong answer (on a worker
+    thread); handed back through `use_prepared()`, advancing needs no
+    database read.
+    """
+    __slots__ = ("selector", "fetch_row", "ability", "standard_error", "min_questions", "max_questions",
+                 "target_se", "used_prepared", "_difficulties", "_prepared")
+    adaptive = True
+
+    def __init__(self, course, selector, fetch_row, min_questions=DEFAULT_MIN_QUESTIONS,
+                 max_questions=DEFAULT_MAX_QUESTIONS, target_se=DEFAULT_TARGET_SE, timed=False):
+        super().__init__(course, [], timed=timed)
+        self.selector = selector
+        self.fetch_row = fetch_row
+        self.min_questions = min_questions
+        self.max_questions = max_questions
+        self.target_se = target_se
+        self.ability = 0.0
+        self.standard_error = PRIOR_SD
+        self._difficulties = [] # Difficulty of each question when it was asked
+        self._prepared = None # (index, {right: (record, difficulty) or None, wrong: ...}) from prepare_next()
+        self.used_prepared = False # Whether the latest question came from prepare_next()
+        self._pick()
+
+    @property
+    def total(self):
+        if self.index >= len(self.questions):
+            return len(self.questions)
+        return max(self.max_questions, len(self.questions))
+
+    def _find(self, ability, asked):
+        """(record, difficulty) of the best question for `ability` not in `asked`, or None."""
+        asked = set(asked)
+        while True:
+            choice = self.selector.choose(self.course, ability, asked)
+            if choice is None:
+                return None
+            q_id, difficulty = choice
+            row = self.fetch_row(self.course, q_id)
+            try:
+                record = QuestionRecord.from_row(row) if row else None
+            except InvalidQuestionError:
+                record = None
+            if record is not None:
+                return record, difficulty
+            # Deleted since the index was built, or unusable: never offer it again
+            self.selector.discard(self.course, q_id)
+            asked.add(q_id)
+
+    def _pick(self):
+        """Appends the best next question. Returns False when none is left."""
+        asked = {question.id for question in self.questions}
+        found = None
+        if self._prepared is not None and self._prepared[0] == len(self.answers) - 1:
+            found = self._prepared[1][self.answers[-1] == self.questions[-1].correct_index]
+            if found is not None and found[0].id in asked:
+                found = None
+        self._prepared = None
+        self.used_prepared = found is not None
+        if found is None:
+            found = self._find(self.ability, asked)
+        if found is None:
+            return False
+        self.questions.append(found[0])
+        self._difficulties.append(found[1])
+        return True
+
+    def prepare_next(self):
+        """Picks and fetches the follow-up to a right and to a wrong answer to the current question.
+
+        Only reads the session, so it can run on a worker thread; pass the
+        result to use_prepared() on the thread that drives the session.
+        """
+        index = self.index
+        questions = self.questions[:index + 1]
+        if len(questions) <= index:
+            return None
+        difficulties = self._difficulties[:index + 1]
+        outcomes = [answer == q.correct_index for answer, q in zip(self.answers[:index], questions)]
+        asked = {question.id for question in questions}
+        branches = {}
+        for correct in (True, False):
+            ability, error = estimate_ability(difficulties, outcomes + [correct], start=self.ability)
+            answered = index + 1
+            if answered >= self.max_questions or (answered >= self.min_questions and error <= self.target_se):
+                branches[correct] = None # The quiz would end here
+            else:
+                branches[correct] = self._find(ability, asked)
+        return index, branches
+
+    def use_prepared(self, prepared):
+        """Keeps prepare_next()'s result if it is still for the question being asked."""
+        if prepared is not None and prepared[0] == self.index and len(self.answers) == self.index:
+            self._prepared = prepared
+
+    def answer(self, choice):
+        correct = super().answer(choice)
+        question = self.questions[self.index]
+        self.selector.record(self.course, question.id, correct, self.ability)
+        outcomes = [answer == q.correct_index for answer, q in zip(self.answers, self.questions)]
+        self.ability, self.standard_error = estimate_ability(self._difficulties, outcomes, start=self.ability)
+        return correct
+
+    def _done(self):
+        answered = len(self.answers)
+        return answered >= self.max_questions or (answered >= self.min_questions
+                                                  and self.standard_error <= self.target_se)
+
+    def advance(self):
+        self.index += 1
+        if self.index == len(self.questions) and not self._done():
+            self._pick()
+        return self.index < len(self.questions)
+
+    def score_out_of(self, points=10):
+        if not self.answers:
+            return 0
+        return round(self.selector.expected_share(self.course, self.ability) * points, 1)
+
+
+# --- SIMULATION ---
+
+class _SimulatedBank:
+    """Questions with known true difficulties; option A is always right."""
+    def __init__(self, size, rng):
+        self.true_difficulty = {q_id: rng.gauss(0.0, 1.2) for q_id in range(1, size + 1)}
+
+    def course_question_ids(self, course_name):
+        return list(self.true_difficulty)
+
+    def fetch_row(self, course_name, q_id):
+        return (q_id, f"Question {q_id}?", "right", "wrong 1", "wrong 2", "wrong 3", "A")
+
+def _respond(rng, ability, difficulty):
+    return 0 if rng.random() < p_correct(ability, difficulty) else 1 + rng.randrange(3)
+
+def _run_random(bank, rng, ability, length, difficulty_of):
+    """A fixed-length uniformly random quiz, scored with the same ability estimate."""
+    ids = rng.sample(list(bank.true_difficulty), length)
+    outcomes = [_respond(rng, ability, bank.true_difficulty[q_id]) == 0 for q_id in ids]
+    return estimate_ability([difficulty_of(q_id) for q_id in ids], outcomes)[0]
+
+def _rmse(errors):
+    return math.sqrt(sum(e * e for e in errors) / len(errors)) if errors else float("nan")
+
+def run_simulation(students=2000, bank_size=500, target_se=DEFAULT_TARGET_SE, seed=1234):
+    rng = random.Random(seed)
+    bank = _SimulatedBank(bank_size, rng)
+    selector = AdaptiveSelector(bank, seed=seed)
+    course = "sim"
+    index = selector._index(course) # Every question starts at difficulty 0: nothing recorded yet
+
+    print(f"Bank of {bank_size} questions, simulated students with abilities ~ N(0, 1).")
+    print("\nQuestion calibration (Elo) as students take adaptive quizzes:")
+    print(f"  {'students':>8}  {'difficulty RMSE':>15}")
+    checkpoints = {0, students // 10, students // 4, students // 2, students}
+    for n in range(students + 1):
+        if n in checkpoints:
+            errors = [index.difficulty(q_id) - true for q_id, true in bank.true_difficulty.items()]
+            print(f"  {n:>8,}  {_rmse(errors):>15.3f}")
+        if n == students:
+            break
+        ability = rng.gauss(0.0, 1.0)
+        session = selector.start_session(course, bank.fetch_row, target_se=target_se)
+        while not session.finished:
+            session.answer(_respond(rng, ability, bank.true_difficulty[session.current.id]))
+            session.advance()
+
+    print("\nAbility estimate after n questions, on the calibrated bank (RMSE vs the true ability):")
+    print(f"  {'n':>3}  {'random':>8}  {'adaptive':>8}")
+    trials = 400
+    for length in (3, 5, 8, 10, 15, 20):
+        random_errors, adaptive_errors = [], []
+        for _ in range(trials):
+            ability = rng.gauss(0.0, 1.0)
+            random_errors.append(_run_random(bank, rng, ability, length, index.difficulty) - ability)
+            session = selector.start_session(course, bank.fetch_row, min_questions=length, max_questions=length,
+                                             target_se=0.0)
+            while not session.finished:
+                session.answer(_respond(rng, ability, bank.true_difficulty[session.current.id]))
+                session.advance()
+            adaptive_errors.append(session.ability - ability)
+        print(f"  {length:>3}  {_rmse(random_errors):>8.3f}  {_rmse(adaptive_errors):>8.3f}")
+
+    lengths, errors = [], []
+    for _ in range(trials):
+        ability = rng.gauss(0.0, 1.0)
+        session = selector.start_session(course, bank.fetch_row, target_se=target_se)
+        while not session.finished:
+            session.answer(_respond(rng, ability, bank.true_difficulty[session.current.id]))
+            session.advance()
+        lengths.append(len(session.answers))
+        errors.append(session.ability - ability)
+    fixed_errors = [_run_random(bank, rng, ability, 10, index.difficulty) - ability
+                    for ability in (rng.gauss(0.0, 1.0) for _ in range(trials))]
+    print(f"\nStopping at standard error {target_se}: {sum(lengths) / len(lengths):.1f} questions on average "
+          f"(RMSE {_rmse(errors):.3f}), vs 10 random questions (RMSE {_rmse(fixed_errors):.3f}).")
+
+    big = DifficultyIndex((q_id, rng.gauss(0.0, 1.2), 0) for q_id in range(100_000))
+    targets = [rng.gauss(0.0, 1.0) for _ in range(10_000)]
+    exclude = set(range(10))
+    start = time.perf_counter()
+    for target in targets:
+        big.nearest(target, exclude, rng)
+    per_pick = (time.perf_counter() - start) / len(targets)
+    print(f"Choosing the next question from 100,000: {per_pick * 1e6:.1f} us per pick.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate adaptive quizzes and measure how fast they converge.")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--bank", type=int, default=500)
+    parser.add_argument("--target-se", type=float, default=DEFAULT_TARGET_SE)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    if args.bank < 20:
+        print("The bank needs at least 20 questions.")
+        sys.exit(1)
+    run_simulation(args.students, args.bank, args.target_se, args.seed)
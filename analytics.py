@@ -0,0 +1,393 @@
+"""Item analysis for every question, kept in rolled-up tables.
+
+Usage:
+    python analytics.py [database] [--course NAME]      refresh, then print the course report(s)
+    python analytics.py --benchmark [--answers 10000000]  on a scratch database
+
+Per question: difficulty (share answered correctly), discrimination (the
+point-biserial correlation between getting the question right and the
+score on the rest of the quiz), the share of answers each option drew and
+the average time taken. Per course: attempts, mean and spread of scores.
+
+Nothing here re-reads the whole attempt log. `question_stats` and
+`course_stats` hold running sums, and `refresh()` folds in only finished
+attempts not yet counted (`attempts.analyzed = 0`), with one GROUP BY
+upsert per batch that runs entirely inside SQLite. The sums are additive,
+so every statistic above can be derived from them at any time; `derive()`
+does that for many questions at once, vectorized with NumPy when it is
+installed and in plain Python otherwise.
+"""
+import os
+import sys
+import math
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+import attemptlog
+
+try:
+    import numpy as np
+except ImportError: # Optional: derive() falls back to plain Python
+    np = None
+
+DEFAULT_BATCH = 5000 # Attempts folded in per transaction
+MIN_PAIRED = 10 # Fewer paired answers than this and discrimination is not reported
+
+OPTION_COLUMNS = ("chose_a", "chose_b", "chose_c", "chose_d")
+# Column order of question_stats rows as read by question_stats() and derive()
+STATS_COLUMNS = ("question_id", "answered", "correct") + OPTION_COLUMNS + (
+    "timed", "seconds", "paired", "paired_correct", "rest_sum", "rest_sq_sum", "correct_rest_sum")
+
+ANALYTICS_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS question_stats (
+           course TEXT NOT NULL,
+           question_id INTEGER NOT NULL,
+           answered INTEGER NOT NULL,
+           correct INTEGER NOT NULL,
+           chose_a INTEGER NOT NULL, chose_b INTEGER NOT NULL, chose_c INTEGER NOT NULL, chose_d INTEGER NOT NULL,
+           timed INTEGER NOT NULL, -- Answers with a recorded time, and their total seconds
+           seconds REAL NOT NULL,
+           -- Sums over answers from fixed (not adaptive) quizzes of 2+ questions, x = correct (0/1)
+           -- and y = share of the attempt's other questions answered correctly
+           paired INTEGER NOT NULL,
+           paired_correct INTEGER NOT NULL,
+           rest_sum REAL NOT NULL,
+           rest_sq_sum REAL NOT NULL,
+           correct_rest_sum REAL NOT NULL,
+           PRIMARY KEY (course, question_id)
+       ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS course_stats (
+           course TEXT PRIMARY KEY,
+           attempts INTEGER NOT NULL,
+           percent_sum REAL NOT NULL, -- Sums of score / total, for the mean and spread
+           percent_sq_sum REAL NOT NULL,
+           answered INTEGER NOT NULL,
+           correct INTEGER NOT NULL
+       )''',
+    # Finished attempts waiting to be counted; a partial index, so it stays tiny
+    "CREATE INDEX IF NOT EXISTS idx_attempts_unanalyzed ON attempts(finished_at) WHERE analyzed = 0",
+]
+
+_FOLD_QUESTIONS = '''
+    INSERT INTO question_stats
+    SELECT course, question_id, COUNT(*), SUM(correct),
+           SUM(choice = 0), SUM(choice = 1), SUM(choice = 2), SUM(choice = 3),
+           COUNT(seconds), TOTAL(seconds),
+           COUNT(rest), TOTAL(CASE WHEN rest IS NOT NULL THEN correct END),
+           TOTAL(rest), TOTAL(rest * rest), TOTAL(correct * rest)
+    FROM (SELECT b.course, a.question_id, a.choice, a.correct, a.seconds,
+                 -- Adaptive quizzes steer everyone towards half right, so their scores rank nobody
+                 CASE WHEN b.total > 1 AND b.source NOT LIKE '%/adaptive'
+                      THEN (b.score - a.correct) * 1.0 / (b.total - 1) END AS rest
+          -- CROSS JOIN keeps the (small) batch as the outer loop, probing answers by primary key
+          FROM temp.analytics_batch b CROSS JOIN attempt_answers a WHERE a.attempt_id = b.id)
+    WHERE true -- Tells SQLite the ON CONFLICT below belongs to the INSERT, not a join
+    GROUP BY course, question_id
+    ON CONFLICT (course, question_id) DO UPDATE SET
+        answered = answered + excluded.answered, correct = correct + excluded.correct,
+        chose_a = chose_a + excluded.chose_a, chose_b = chose_b + excluded.chose_b,
+        chose_c = chose_c + excluded.chose_c, chose_d = chose_d + excluded.chose_d,
+        timed = timed + excluded.timed, seconds = seconds + excluded.seconds,
+        paired = paired + excluded.paired, paired_correct = paired_correct + excluded.paired_correct,
+        rest_sum = rest_sum + excluded.rest_sum, rest_sq_sum = rest_sq_sum + excluded.rest_sq_sum,
+        correct_rest_sum = correct_rest_sum + excluded.correct_rest_sum'''
+
+_FOLD_COURSES = '''
+    INSERT INTO course_stats
+    SELECT course, COUNT(*), TOTAL(score * 1.0 / total), TOTAL(score * score * 1.0 / (total * total)),
+           TOTAL(total), TOTAL(score)
+    FROM temp.analytics_batch WHERE total > 0 AND source NOT LIKE '%/adaptive' -- Raw scores of fixed quizzes only
+    GROUP BY course
+    ON CONFLICT (course) DO UPDATE SET
+        attempts = attempts + excluded.attempts, percent_sum = percent_sum + excluded.percent_sum,
+        percent_sq_sum = percent_sq_sum + excluded.percent_sq_sum,
+        answered = answered + excluded.answered, correct = correct + excluded.correct'''
+
+
+def create_schema(conn):
+    """Adds the rollup tables, and the `analyzed` flag to attemptlog.py's `attempts`."""
+    attemptlog.create_schema(conn)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(attempts)")}
+    if "analyzed" not in columns:
+        conn.execute("ALTER TABLE attempts ADD COLUMN analyzed INTEGER NOT NULL DEFAULT 0")
+    for statement in ANALYTICS_SCHEMA:
+        conn.execute(statement)
+
+
+# --- DERIVED STATISTICS ---
+
+def _discrimination(n, sx, sy, syy, sxy):
+    var_x = n * sx - sx * sx # x is 0/1, so sum(x^2) == sum(x)
+    var_y = n * syy - sy * sy
+    if n < MIN_PAIRED or var_x <= 0 or var_y <= 1e-12:
+        return None
+    return (n * sxy - sx * sy) / math.sqrt(var_x * var_y)
+
+def derive(rows):
+    """Statistics for many question_stats rows (STATS_COLUMNS order).
+
+    Returns {question_id: (difficulty, discrimination, option_shares, avg_seconds)},
+    with None for anything there is not enough data for.
+    """
+    if not rows:
+        return {}
+    if np is None:
+        result = {}
+        for (q_id, answered, correct, a, b, c, d, timed, seconds,
+             paired, paired_correct, rest_sum, rest_sq_sum, correct_rest_sum) in rows:
+            result[q_id] = (correct / answered if answered else None,
+                            _discrimination(paired, paired_correct, rest_sum, rest_sq_sum, correct_rest_sum),
+                            tuple(n / answered for n in (a, b, c, d)) if answered else None,
+                            seconds / timed if timed else None)
+        return result
+
+    data = np.asarray(rows, dtype=np.float64)
+    ids = data[:, 0].astype(np.int64)
+    answered, correct, options, timed, seconds = data[:, 1], data[:, 2], data[:, 3:7], data[:, 7], data[:, 8]
+    n, sx, sy, syy, sxy = data[:, 9], data[:, 10], data[:, 11], data[:, 12], data[:, 13]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        difficulty = correct / answered
+        shares = options / answered[:, None]
+        avg_seconds = seconds / timed
+        var_x, var_y = n * sx - sx * sx, n * syy - sy * sy
+        discrimination = (n * sxy - sx * sy) / np.sqrt(var_x * var_y)
+    discrimination[(n < MIN_PAIRED) | (var_x <= 0) | (var_y <= 1e-12)] = np.nan
+
+    def clean(value):
+        return None if math.isnan(value) else float(value)
+    return {int(q_id): (clean(p), clean(r), None if answered[i] == 0 else tuple(float(s) for s in shares[i]),
+                        clean(t))
+            for i, (q_id, p, r, t) in enumerate(zip(ids, difficulty, discrimination, avg_seconds))}
+
+
+class ItemAnalytics:
+    """Reads and incrementally maintains question_stats / course_stats."""
+    def __init__(self, pool, batch_size=DEFAULT_BATCH):
+        self.pool = pool
+        self.batch_size = batch_size
+        self._schema_ready = False
+        self._refresh_lock = threading.Lock()
+
+    def _ensure_schema(self, conn):
+        """Databases set up before migration 5 get the tables on first use."""
+        if not self._schema_ready:
+            create_schema(conn)
+            self._schema_ready = True
+
+    def refresh(self):
+        """Folds finished attempts that have not been counted yet into the rollups. Returns how many."""
+        folded = 0
+        with self._refresh_lock:
+            while True:
+                with self.pool.connection() as conn:
+                    conn.execute("BEGIN IMMEDIATE") # Attempts counted and flagged atomically, exactly once
+                    try:
+                        self._ensure_schema(conn)
+                        conn.execute('''CREATE TEMP TABLE IF NOT EXISTS analytics_batch (
+                                            id TEXT PRIMARY KEY, course TEXT, source TEXT,
+                                            score INTEGER, total INTEGER)''')
+                        conn.execute("DELETE FROM temp.analytics_batch")
+                        batch = conn.execute(
+                            '''INSERT INTO temp.analytics_batch
+                               SELECT id, course, source, score, total FROM attempts
+                               WHERE analyzed = 0 AND finished_at IS NOT NULL LIMIT ?''',
+                            (self.batch_size,)).rowcount
+                        if batch:
+                            conn.execute(_FOLD_QUESTIONS)
+                            conn.execute(_FOLD_COURSES)
+                            conn.execute("UPDATE attempts SET analyzed = 1 WHERE id IN (SELECT id FROM temp.analytics_batch)")
+                        conn.commit()
+                    except BaseException:
+                        conn.rollback()
+                        raise
+                folded += batch
+                if batch < self.batch_size:
+                    return folded
+
+    def question_stats(self, course_name, q_ids=None):
+        """Derived statistics (see derive()) for a course, or just the given question ids."""
+        columns = ", ".join(STATS_COLUMNS)
+        with self.pool.connection() as conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='question_stats'").fetchone():
+                return {}
+            if q_ids is None:
+                rows = conn.execute(f"SELECT {columns} FROM question_stats WHERE course = ?", (course_name,)).fetchall()
+            else:
+                rows = []
+                q_ids = list(q_ids)
+                for start in range(0, len(q_ids), 500):
+                    chunk = q_ids[start:start + 500]
+                    rows += conn.execute(
+                        f"SELECT {columns} FROM question_stats WHERE course = ? AND question_id IN ({','.join('?' * len(chunk))})",
+                        (course_name, *chunk)).fetchall()
+        return derive(rows)
+
+    def answer_counts(self, course_name):
+        """{id: (answered, correct)} for every question of a course with recorded answers."""
+        with self.pool.connection() as conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='question_stats'").fetchone():
+                return {}
+            rows = conn.execute("SELECT question_id, answered, correct FROM question_stats WHERE course = ?",
+                                (course_name,)).fetchall()
+        return {q_id: (answered, correct) for q_id, answered, correct in rows}
+
+    def course_summary(self, course_name):
+        """(attempts, mean score, score standard deviation), as shares of the total, or None."""
+        with self.pool.connection() as conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='course_stats'").fetchone():
+                return None
+            row = conn.execute("SELECT attempts, percent_sum, percent_sq_sum FROM course_stats WHERE course = ?",
+                               (course_name,)).fetchone()
+        if not row or not row[0]:
+            return None
+        attempts, total, total_sq = row
+        mean = total / attempts
+        return attempts, mean, math.sqrt(max(total_sq / attempts - mean * mean, 0.0))
+
+
+def format_stats(stats, correct_letter=None):
+    """Short column values for one question: (answered %, discrimination, top distractor, avg time)."""
+    if stats is None:
+        return ("", "", "", "")
+    difficulty, discrimination, shares, avg_seconds = stats
+    distractor = ""
+    if shares is not None:
+        letter = str(correct_letter or "").strip().upper()
+        wrong = [(share, option) for share, option in zip(shares, "ABCD") if option != letter and share > 0]
+        if wrong:
+            share, option = max(wrong)
+            distractor = f"{option} {share:.0%}"
+    return (f"{difficulty:.0%}" if difficulty is not None else "",
+            f"{discrimination:+.2f}" if discrimination is not None else "",
+            distractor,
+            f"{avg_seconds:.1f}s" if avg_seconds is not None else "")
+
+
+# --- BENCHMARK ---
+
+def _generate(conn, answers, questions_per_quiz=10, courses=4, bank=500):
+    """Synthetic finished attempts, built inside SQLite so generation is not what dominates."""
+    attempts = answers // questions_per_quiz
+    create_schema(conn)
+    conn.execute("BEGIN")
+    conn.execute(
+        f'''INSERT INTO attempts (id, course, source, started_at, finished_at, score, total)
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?)
+            SELECT printf('%08x', i), 'course ' || (i % {courses}), 'bench', i, i + 60, 0, {questions_per_quiz} FROM n''',
+        (attempts,))
+    # Question q is answered correctly with probability 0.2-0.9, shifted by up to
+    # +/-0.15 by the student's ability (fixed per attempt); option 0 is always the right one
+    # (MATERIALIZED, or each use of q and r would call random() again)
+    conn.execute(
+        f'''INSERT INTO attempt_answers (attempt_id, position, question_id, choice, correct, seconds)
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?),
+                 draws AS MATERIALIZED (SELECT i, (abs(random()) % {bank}) + 1 AS q, abs(random()) % 1000 AS r,
+                                  (i / {questions_per_quiz}) * 7919 % 301 - 150 AS ability FROM n)
+            SELECT printf('%08x', i / {questions_per_quiz}), i % {questions_per_quiz}, q,
+                   CASE WHEN r < 200 + q * 700 / {bank} + ability THEN 0 ELSE 1 + r % 3 END,
+                   r < 200 + q * 700 / {bank} + ability, 5 + r % 40
+            FROM draws''',
+        (attempts * questions_per_quiz,))
+    conn.execute('''UPDATE attempts SET score = (SELECT SUM(correct) FROM attempt_answers
+                                                 WHERE attempt_id = attempts.id)''')
+    conn.commit()
+    return attempts
+
+def _scan_raw(conn, course_name):
+    """What every view would cost without rollups: aggregate the raw log for one course."""
+    return conn.execute(
+        '''SELECT a.question_id, COUNT(*), SUM(a.correct), SUM(a.choice = 0), SUM(a.choice = 1),
+                  SUM(a.choice = 2), SUM(a.choice = 3), COUNT(a.seconds), TOTAL(a.seconds)
+           FROM attempts t JOIN attempt_answers a ON a.attempt_id = t.id
+           WHERE t.course = ? GROUP BY a.question_id''', (course_name,)).fetchall()
+
+def run_benchmark(answers=10_000_000, new_attempts=1000):
+    from dbpool import ConnectionPool
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "bench.db")
+    pool = ConnectionPool(db_path)
+    try:
+        start = time.perf_counter()
+        with pool.connection() as conn:
+            attempts = _generate(conn, answers)
+        print(f"Generated {attempts * 10:,} answers in {attempts:,} attempts in {time.perf_counter() - start:.1f}s "
+              f"(NumPy {'on' if np is not None else 'not installed, plain Python derive()'}).")
+
+        # The newest attempts are held back, then land as "a class's worth" of new results
+        latest = "SELECT rowid FROM attempts ORDER BY rowid DESC LIMIT ?"
+        pool.execute(f"UPDATE attempts SET analyzed = 1 WHERE rowid IN ({latest})", (new_attempts,))
+        analytics = ItemAnalytics(pool, batch_size=50_000)
+        start = time.perf_counter()
+        folded = analytics.refresh()
+        print(f"  first refresh (full history):      {time.perf_counter() - start:8.2f}s for {folded:,} attempts")
+
+        pool.execute(f"UPDATE attempts SET analyzed = 0 WHERE rowid IN ({latest})", (new_attempts,))
+        start = time.perf_counter()
+        folded = analytics.refresh()
+        incremental = time.perf_counter() - start
+        print(f"  incremental refresh:               {incremental * 1000:8.1f} ms for {folded:,} new attempts")
+
+        start = time.perf_counter()
+        stats = analytics.question_stats("course 0")
+        rollup = time.perf_counter() - start
+        with pool.connection() as conn:
+            start = time.perf_counter()
+            _scan_raw(conn, "course 0")
+            raw = time.perf_counter() - start
+        print(f"  course view from rollups:          {rollup * 1000:8.1f} ms ({len(stats)} questions)")
+        print(f"  course view scanning the raw log:  {raw * 1000:8.1f} ms")
+        sample = sorted(stats.items())[:3] + sorted(stats.items())[-3:]
+        for q_id, values in sample:
+            right, discrimination, distractor, seconds = format_stats(values, "A")
+            print(f"    question {q_id:>3}: {right:>4} right, discrimination {discrimination}, "
+                  f"top distractor {distractor}, {seconds}")
+    finally:
+        pool.close()
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+def print_report(analytics, store, course_name):
+    summary = analytics.course_summary(course_name)
+    if summary is None:
+        print(f"\n{course_name}: no finished attempts yet.")
+        return
+    attempts, mean, spread = summary
+    print(f"\n{course_name}: {attempts:,} attempts, mean score {mean:.0%} (sd {spread:.0%})")
+    stats = analytics.question_stats(course_name)
+    print(f"  {'id':>6}  {'right':>5}  {'discr':>6}  {'distractor':>10}  {'time':>6}  question")
+    for row in store.all_questions(course_name) or []:
+        right, discrimination, distractor, seconds = format_stats(stats.get(row[0]), row[6])
+        print(f"  {row[0]:>6}  {right:>5}  {discrimination:>6}  {distractor:>10}  {seconds:>6}  {row[1][:60]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Question and course analytics from recorded attempts.")
+    parser.add_argument("database", nargs="?", default="rharrellQuiz.db")
+    parser.add_argument("--course", help="only report this course")
+    parser.add_argument("--benchmark", action="store_true", help="time the rollups on a scratch database")
+    parser.add_argument("--answers", type=int, default=10_000_000, help="benchmark: synthetic answers to generate")
+    args = parser.parse_args()
+
+    try:
+        if args.benchmark:
+            run_benchmark(args.answers)
+        else:
+            from shards import open_pool
+            from questionstore import QuestionStore
+            db_pool = open_pool(args.database)
+            try:
+                analytics = ItemAnalytics(db_pool)
+                print(f"Folded in {analytics.refresh():,} new attempts.")
+                store = QuestionStore(db_pool.execute, shards=db_pool.shards)
+                for course_name in [args.course] if args.course else store.list_courses():
+                    print_report(analytics, store, course_name)
+            finally:
+                db_pool.close()
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        sys.exit(1)
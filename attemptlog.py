@@ -0,0 +1,406 @@
+"""Persistent record of every quiz attempt, written in batches.
+
+Usage: python attemptlog.py [--sessions N] [--questions K]   (benchmark on a scratch database)
+
+Answering a question never waits for the database: `AttemptLog` appends
+each event (attempt started, question answered, attempt finished) to an
+in-memory buffer and to a small append-only journal file, and a background
+thread writes the buffer to `attempts` / `attempt_answers` in one
+transaction every few seconds, straight away when an attempt finishes.
+Once a batch is committed it is cut from the journal; if the program dies
+first, `recover()` replays the journal on the next start. Every write is
+idempotent, so replaying events that did reach the database is harmless.
+
+Each process keeps its own journal, named after the configured path plus
+its pid (quiz_attempts-1234.journal), and holds an exclusive lock on a
+`.lock` file beside it while it runs. `recover()` only takes over journals
+whose lock it can get, i.e. those of programs that have exited, so two
+copies of the app never rewrite each other's pending events.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_FLUSH_INTERVAL = 2.0 # Seconds between background flushes
+DEFAULT_MAX_PENDING = 500 # Events buffered before a flush is triggered early
+
+ATTEMPT_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS attempts (
+           id TEXT PRIMARY KEY,
+           course TEXT NOT NULL,
+           source TEXT NOT NULL,
+           started_at REAL NOT NULL,
+           finished_at REAL,
+           score INTEGER,
+           total INTEGER NOT NULL
+       )''',
+    '''CREATE TABLE IF NOT EXISTS attempt_answers (
+           attempt_id TEXT NOT NULL,
+           position INTEGER NOT NULL,
+           question_id INTEGER NOT NULL,
+           choice INTEGER NOT NULL,
+           correct INTEGER NOT NULL,
+           seconds REAL,
+           PRIMARY KEY (attempt_id, position)
+       ) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS idx_attempts_course ON attempts(course, started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_attempt_answers_question ON attempt_answers(question_id)",
+]
+
+
+def create_schema(conn):
+    for statement in ATTEMPT_SCHEMA:
+        conn.execute(statement)
+
+
+# --- JOURNAL OWNERSHIP ---
+
+def _try_lock(path):
+    """Opens `path` and takes an exclusive lock on it. Returns the open file, or None if another process holds it."""
+    lock_file = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass # Already gone, or (on Windows) still open elsewhere
+
+def process_journal(journal_path, pid=None):
+    """The journal one process writes: quiz_attempts.journal -> quiz_attempts-<pid>.journal."""
+    stem, ext = os.path.splitext(journal_path)
+    return f"{stem}-{os.getpid() if pid is None else pid}{ext}"
+
+
+class AttemptLog:
+    """Buffers attempt events and writes them to the database in batches.
+
+    `start`, `answered` and `finish` are called from the GUI thread and only
+    touch memory and the journal. `flush()` does the database work; it runs
+    on the log's own thread, and once more from `close()` at exit.
+    `on_flush()`, if given, is called on that thread after each committed
+    batch, e.g. to roll the new attempts into analytics.py's tables.
+    `journal_path` names the journals of every process sharing it; this
+    log writes to its own, `journal_path` with the pid appended.
+    """
+    def __init__(self, pool, journal_path, source="desktop",
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_pending=DEFAULT_MAX_PENDING, on_flush=None):
+        self.pool = pool
+        self.shared_path = journal_path
+        self.journal_path = process_journal(journal_path)
+        self._owner = _try_lock(self.journal_path + ".lock") # Held until close(), so recover() elsewhere skips us
+        if self._owner is None:
+            raise OSError(f"Journal '{self.journal_path}' is already in use by this process")
+        self.source = source
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+        self.last_error = None # Most recent failed background flush, kept for retry
+        self._pending = []
+        self._journal = None
+        self._lock = threading.Lock() # Guards _pending and the journal file
+        self._flush_lock = threading.Lock() # One flush at a time
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = None
+        self._schema_ready = False
+
+    # --- RECORDING ---
+
+    def _record(self, event, urgent=False):
+        line = json.dumps(event, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write(line)
+            self._journal.flush() # In the OS's hands now, so it survives the program crashing
+            self._pending.append(event)
+            if len(self._pending) >= self.max_pending:
+                urgent = True
+            if self._thread is None and not self._stop:
+                self._thread = threading.Thread(target=self._run, name="attempt-log", daemon=True)
+                self._thread.start()
+        if urgent:
+            self._wake.set()
+
+    def start(self, session):
+        """Opens an attempt for a quizengine.QuizSession and gives it an id."""
+        session.attempt_id = uuid.uuid4().hex
+        source = f"{self.source}/adaptive" if session.adaptive else self.source
+        self._record(["start", session.attempt_id, session.course, source, time.time(), session.total])
+
+    def answered(self, session):
+        """Records the session's most recent answer."""
+        if session.attempt_id is None:
+            return
+        position = len(session.answers) - 1
+        question = session.questions[position]
+        choice = session.answers[position]
+        seconds = round(session.times[position], 3) if session.times else None
+        self._record(["answer", session.attempt_id, position, question.id, choice,
+                      int(choice == question.correct_index), seconds])
+
+    def finish(self, session):
+        """Closes the attempt with its final score and asks for a prompt flush."""
+        if session.attempt_id is None:
+            return
+        # The total is recorded again: an adaptive quiz only knows it at the end
+        self._record(["finish", session.attempt_id, time.time(), session.score, session.total], urgent=True)
+        session.attempt_id = None # A second call (e.g. the results screen shown again) is a no-op
+
+    def abandon(self, session):
+        """Closes an attempt the student walked away from, scored on the questions answered so far."""
+        if session.attempt_id is None:
+            return # Finished normally, or never started
+        # Recorded as a finished attempt of that many questions, so the statistics stay consistent
+        self._record(["finish", session.attempt_id, time.time(), session.score, len(session.answers)], urgent=True)
+        session.attempt_id = None
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    # --- WRITING ---
+
+    def _write(self, batch):
+        starts, answers, finishes = [], [], []
+        for event in batch:
+            if event[0] == "start":
+                starts.append(event[1:])
+            elif event[0] == "answer":
+                answers.append(event[1:])
+            elif event[0] == "finish":
+                finishes.append((event[2], event[3], event[4] if len(event) > 4 else None, event[1]))
+        with self.pool.transaction() as conn:
+            if not self._schema_ready: # Databases set up before migration 4 get the tables on first write
+                create_schema(conn)
+                self._schema_ready = True
+            conn.executemany('''INSERT OR IGNORE INTO attempts (id, course, source, started_at, total)
+                                VALUES (?, ?, ?, ?, ?)''', starts)
+            conn.executemany('''INSERT OR REPLACE INTO attempt_answers
+                                (attempt_id, position, question_id, choice, correct, seconds)
+                                VALUES (?, ?, ?, ?, ?, ?)''', answers)
+            conn.executemany("UPDATE attempts SET finished_at = ?, score = ?, total = COALESCE(?, total) WHERE id = ?",
+                             finishes)
+
+    def _rewrite_journal(self):
+        """Leaves only the still-pending events in the journal. Caller holds _lock."""
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if not self._pending:
+            self._journal.truncate(0)
+            return
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as temp:
+            temp.writelines(json.dumps(event, separators=(",", ":")) + "\n" for event in self._pending)
+        self._journal.close()
+        os.replace(temp_path, self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def flush(self):
+        """Writes everything buffered in one transaction. Returns the number of events written.
+
+        On a database error the events stay buffered (and journaled) and the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except BaseException:
+                with self._lock:
+                    self._pending[:0] = batch
+                raise
+            with self._lock:
+                self._rewrite_journal()
+            return len(batch)
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                if self.flush() and self.on_flush is not None:
+                    self.on_flush()
+                self.last_error = None
+            except Exception as e: # e.g. the database is locked, or on_flush failed; retried on the next tick
+                self.last_error = e # The thread keeps running: if it died, nothing more would be written
+
+    def _orphaned_journals(self):
+        """Journals left by processes that have exited: their lock is free. Yields (path, held lock or None)."""
+        stem, ext = os.path.splitext(self.shared_path)
+        for path in sorted(glob.glob(glob.escape(stem) + "-*" + ext)):
+            if path == self.journal_path:
+                continue
+            lock_file = _try_lock(path + ".lock")
+            if lock_file is not None:
+                yield path, lock_file
+        if os.path.exists(self.shared_path):
+            yield self.shared_path, None # Written by a version that kept one journal for every process
+
+    def recover(self):
+        """Replays events left in journals by runs that have exited. Returns how many were written.
+
+        Journals of copies of the program that are still running are left alone.
+        Our own journal is included: a run with the same pid may have left it.
+        """
+        events, taken = [], []
+        for path, lock_file in [(self.journal_path, None)] + list(self._orphaned_journals()):
+            try:
+                with open(path, encoding="utf-8") as journal:
+                    lines = journal.readlines()
+            except FileNotFoundError:
+                lines = []
+            for line in lines:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue # A line cut short by the crash
+            if path != self.journal_path:
+                taken.append((path, lock_file))
+        with self._lock:
+            self._pending[:0] = events
+            # Everything taken over is in our journal now, so the other files can go
+            self._rewrite_journal()
+        for path, lock_file in taken:
+            _remove(path)
+            if lock_file is not None:
+                lock_file.close()
+                _remove(path + ".lock")
+        return self.flush() if events else 0
+
+    def close(self):
+        """Stops the background thread and writes whatever is left."""
+        self._stop = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass # Still in the journal; recovered on the next start
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if not self._pending:
+                _remove(self.journal_path)
+            if self._owner is not None:
+                self._owner.close()
+                self._owner = None
+                _remove(self.journal_path + ".lock")
+
+
+# --- BENCHMARK ---
+
+def _bench_direct(pool, sessions):
+    """One committed INSERT per answer on the answering thread, the obvious unbuffered design."""
+    latencies = []
+    for course, attempt_id, answers in sessions:
+        pool.execute("INSERT INTO attempts (id, course, source, started_at, total) VALUES (?, ?, 'bench', ?, ?)",
+                     (attempt_id, course, time.time(), len(answers)))
+        for position, (q_id, choice, correct) in enumerate(answers):
+            start = time.perf_counter()
+            pool.execute('''INSERT INTO attempt_answers (attempt_id, position, question_id, choice, correct, seconds)
+                            VALUES (?, ?, ?, ?, ?, ?)''', (attempt_id, position, q_id, choice, correct, 1.0))
+            latencies.append(time.perf_counter() - start)
+        pool.execute("UPDATE attempts SET finished_at = ?, score = ? WHERE id = ?",
+                     (time.time(), sum(a[2] for a in answers), attempt_id))
+    return latencies
+
+def _bench_buffered(log, sessions):
+    from quizengine import QuestionRecord, QuizSession
+    latencies = []
+    for course, _, answers in sessions:
+        records = [QuestionRecord(q_id, "", ("a", "b", "c", "d"), choice if correct else (choice + 1) % 4)
+                   for q_id, choice, correct in answers]
+        session = QuizSession(course, records, timed=True)
+        log.start(session)
+        for _, choice, _ in answers:
+            start = time.perf_counter()
+            session.answer(choice)
+            log.answered(session)
+            latencies.append(time.perf_counter() - start)
+            session.advance()
+        log.finish(session)
+    return latencies
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    return (f"median {latencies[len(latencies) // 2] * 1e6:,.0f} us, "
+            f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:,.0f} us, max {latencies[-1] * 1e3:.1f} ms")
+
+def run_benchmark(sessions=500, questions=10, seed=1234):
+    from dbpool import ConnectionPool
+    rng = random.Random(seed)
+    plan = [(f"course {n % 4}", uuid.uuid4().hex,
+             [(rng.randrange(1, 1000), rng.randrange(4), rng.random() < 0.6) for _ in range(questions)])
+            for n in range(sessions)]
+    answers = sessions * questions
+    workdir = tempfile.mkdtemp()
+    pool = ConnectionPool(os.path.join(workdir, "bench.db"))
+    try:
+        with pool.transaction() as conn:
+            create_schema(conn)
+        start = time.perf_counter()
+        direct = _bench_direct(pool, plan)
+        direct_total = time.perf_counter() - start
+        with pool.transaction() as conn:
+            conn.execute("DELETE FROM attempt_answers")
+            conn.execute("DELETE FROM attempts")
+
+        log = AttemptLog(pool, os.path.join(workdir, "bench.journal"), source="bench")
+        start = time.perf_counter()
+        buffered = _bench_buffered(log, plan)
+        recorded = time.perf_counter() - start
+        log.close()
+        buffered_total = time.perf_counter() - start
+        stored = pool.execute("SELECT COUNT(*) FROM attempt_answers", fetch="one")[0]
+
+        print(f"{sessions:,} attempts of {questions} answers ({stored:,} answer rows stored):")
+        print(f"  commit per answer: {answers / direct_total:>10,.0f} answers/sec; per answer {_summary(direct)}")
+        print(f"  AttemptLog:        {answers / buffered_total:>10,.0f} answers/sec incl. final flush "
+              f"({recorded:.2f}s to record); per answer {_summary(buffered)}")
+    finally:
+        pool.close()
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched attempt logging on a scratch database.")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=10)
+    args = parser.parse_args()
+    try:
+        run_benchmark(args.sessions, args.questions)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        sys.exit(1)
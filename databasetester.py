@@ -1,11 +1,21 @@
 import tkinter as tk
 from tkinter import ttk
-import sqlite3
 import os
+import atexit
+from shards import open_pool
+from questionstore import QuestionStore
+from virtualtree import VirtualTreeview
+from dbworker import DBExecutor
 
 DATABASE_FILE = "rharrellQuiz.db"
 TABLE_NAMES = ["ds 3850", "ds 3860", "hist 4093", "mkt 4100"]
 
+db_pool = open_pool(DATABASE_FILE)
+atexit.register(db_pool.close)
+question_store = QuestionStore(db_pool.execute, shards=db_pool.shards) # Handles every layout
+db_executor = DBExecutor() # Pages are read on a worker thread while the window stays responsive
+atexit.register(db_executor.shutdown)
+
 class QuizDBViewer:
     def __init__(self, root):
         self.root = root
@@ -43,7 +53,17 @@ class QuizDBViewer:
         
         # Define columns
         columns = ("id", "question", "opt_a", "opt_b", "opt_c", "opt_d", "answer")
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+        # Rows are paged in as the user scrolls instead of all being inserted up front
+        self.current_table = None
+        self.status_var = tk.StringVar()
+        self.table_view = VirtualTreeview(
+            tree_frame, columns,
+            fetch_page=lambda after_id, limit: question_store.page_questions(self.current_table, after_id, limit),
+            count_rows=lambda: question_store.count_questions(self.current_table),
+            seek=lambda offset: question_store.question_id_before(self.current_table, offset),
+            status_var=self.status_var, executor=db_executor
+        )
+        self.tree = self.table_view.tree
         
         # Define headings
         self.tree.heading("id", text="ID")
@@ -63,15 +83,10 @@ class QuizDBViewer:
         self.tree.column("opt_d", width=120)
         self.tree.column("answer", width=60, stretch=tk.NO, anchor="center")
 
-        # Add a scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
-        
-        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # The virtual list brings its own scrollbar
+        self.table_view.pack(fill=tk.BOTH, expand=True)
 
         # --- Status Bar ---
-        self.status_var = tk.StringVar()
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W, padding=5)
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
@@ -87,32 +102,10 @@ class QuizDBViewer:
             self.status_var.set(f"Successfully connected to '{DATABASE_FILE}'. Please select a table.")
 
     def load_table_data(self, table_name):
-        """Fetches data from the selected table and displays it in the Treeview."""
-        # Clear previous data from the tree
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        try:
-            # Connect to the database
-            conn = sqlite3.connect(DATABASE_FILE)
-            cursor = conn.cursor()
-            
-            # Fetch all data from the selected table
-            # Using f-string with quotes to handle table names with spaces
-            cursor.execute(f'SELECT * FROM "{table_name}"')
-            rows = cursor.fetchall()
-            
-            # Insert new data into the tree
-            for row in rows:
-                self.tree.insert("", tk.END, values=row)
-                
-            self.status_var.set(f"Displaying {len(rows)} questions from the '{table_name}' table.")
-
-        except sqlite3.Error as e:
-            self.status_var.set(f"Database error: {e}")
-        finally:
-            if conn:
-                conn.close()
+        """Points the virtual list at the selected table; rows load as they scroll into view."""
+        # The status bar shows which rows are on screen and how many are held in memory
+        self.current_table = table_name
+        self.table_view.reload()
 
 if __name__ == "__main__":
     app_root = tk.Tk()
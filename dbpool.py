@@ -0,0 +1,247 @@
+import sqlite3
+import threading
+import queue
+import time
+import os
+import sys
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# --- POOL CONFIGURATION ---
+DEFAULT_POOL_SIZE = 4
+DEFAULT_STATEMENT_CACHE = 256 # Prepared statements kept per connection
+DEFAULT_TIMEOUT = 5.0 # Seconds to wait for a free connection / a database lock
+
+
+class PoolClosedError(sqlite3.Error):
+    """Raised when a connection is requested from a pool that has been shut down."""
+
+
+class ConnectionPool:
+    """A small pool of long-lived SQLite connections.
+
+    Connections are opened lazily (up to `size`), put in WAL mode once and
+    reused for every query, so callers no longer pay connect + schema parse
+    on each call. sqlite3's own statement cache (`cached_statements`) keeps
+    the prepared statements for repeated queries alive on each connection.
+    `trace`, if given, is called with the text of every statement run on a
+    pooled connection (e.g. instrument.Metrics.count_statement).
+    """
+    shards = None # The pool itself when it is a shards.ShardedPool, for QuestionStore(shards=...)
+
+    def __init__(self, db_path, size=DEFAULT_POOL_SIZE, statement_cache=DEFAULT_STATEMENT_CACHE,
+                 timeout=DEFAULT_TIMEOUT, wal=True, trace=None):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.statement_cache = statement_cache
+        self.timeout = timeout
+        self.wal = wal
+        self.trace = trace
+        self._idle = queue.LifoQueue() # LIFO keeps the hottest connection in use
+        self._all = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._watcher = None # Dedicated connection for PRAGMA data_version checks
+        self._watcher_lock = threading.Lock()
+        self._seen_version = None # data_version after the last commit this pool knows about
+        self._external = 0 # Commits noticed from other programs
+        self._changes = {} # connection -> its total_changes when it last committed through the pool
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               cached_statements=self.statement_cache,
+                               check_same_thread=False)
+        if self.wal:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        if self.trace is not None:
+            conn.set_trace_callback(self.trace)
+        return conn
+
+    def acquire(self):
+        """Takes a connection from the pool, opening a new one if there is room."""
+        if self._closed:
+            raise PoolClosedError("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._open()
+                self._all.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a free database connection")
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back anything left uncommitted."""
+        if conn.in_transaction:
+            conn.rollback()
+        if conn.total_changes != self._changes.get(conn, 0):
+            with self._watcher_lock: # The borrower committed by itself (or rolled back); either way it was us
+                self._note_own_write(conn)
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that lends out a pooled connection."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Lends out a connection and commits on success or rolls back on error."""
+        with self.connection() as conn:
+            try:
+                yield conn
+                self._commit(conn)
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def execute(self, query, params=(), fetch=None):
+        """Runs a single query. Mirrors the `fetch` convention of execute_db_query."""
+        with self.connection() as conn:
+            self._route(conn, query)
+            cursor = conn.execute(query, params)
+            if fetch == "all":
+                return cursor.fetchall()
+            if fetch == "one":
+                return cursor.fetchone()
+            self._commit(conn)
+            if fetch == "lastrowid":
+                return cursor.lastrowid
+            if fetch == "rowcount":
+                return cursor.rowcount
+            return True
+
+    def _route(self, conn, query):
+        """Prepares `conn` for `query`; shards.ShardedPool attaches the files it reads. Nothing to do here."""
+
+    # --- CHANGE TRACKING ---
+
+    def _read_version(self):
+        # The caller holds _watcher_lock
+        if self._closed:
+            raise PoolClosedError("Connection pool is closed")
+        if self._watcher is None:
+            self._watcher = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def _commit(self, conn):
+        """Commits `conn` and records the commit as this pool's own before anyone can see it as external."""
+        with self._watcher_lock:
+            conn.commit()
+            self._note_own_write(conn)
+
+    def _note_own_write(self, conn):
+        # The caller holds _watcher_lock
+        self._changes[conn] = conn.total_changes
+        self._absorb_locked()
+
+    def _absorb_locked(self):
+        if not self._closed:
+            self._seen_version = self._read_version()
+
+    def _absorb(self):
+        """Records a commit made to this file through another pool of this program (see shards.py)."""
+        with self._watcher_lock:
+            self._absorb_locked()
+
+    def data_version(self):
+        """Returns PRAGMA data_version as seen by a connection that never writes.
+
+        The value changes whenever any other connection (another process or
+        one of this pool's own connections) commits to the database.
+        """
+        with self._watcher_lock:
+            return self._read_version()
+
+    def external_version(self):
+        """A counter that moves only when another program commits to the database.
+
+        Every commit made through this pool is recorded as it happens, so a
+        cache keyed on this (QuestionCache) survives the writes of every
+        component sharing the pool, in whatever order they land.
+        """
+        with self._watcher_lock:
+            version = self._read_version()
+            if self._seen_version is not None and version != self._seen_version:
+                self._external += 1
+            self._seen_version = version
+            return self._external
+
+    def close(self):
+        """Closes every idle connection. Connections still lent out are closed on release."""
+        self._closed = True
+        with self._watcher_lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+            self._changes.clear()
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._all.clear()
+
+
+# --- MICRO-BENCHMARK ---
+
+def _bench_per_call_connect(db_path, table_name, ids):
+    """The old execute_db_query behaviour: a new connection for every lookup."""
+    start = time.perf_counter()
+    for q_id in ids:
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(f'SELECT * FROM "{table_name}" WHERE id = ?', (q_id,)).fetchone()
+    return time.perf_counter() - start
+
+def _bench_pooled(pool, table_name, ids):
+    start = time.perf_counter()
+    for q_id in ids:
+        pool.execute(f'SELECT * FROM "{table_name}" WHERE id = ?', (q_id,), fetch="one")
+    return time.perf_counter() - start
+
+def run_benchmark(db_path, lookups=10_000):
+    """Times a burst of single-row lookups with and without the pool, on a copy of the DB."""
+    workdir = tempfile.mkdtemp()
+    try:
+        bench_db = os.path.join(workdir, "bench.db")
+        shutil.copyfile(db_path, bench_db)
+        with sqlite3.connect(bench_db) as conn:
+            table_name = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' LIMIT 1"
+            ).fetchone()[0]
+            max_id = conn.execute(f'SELECT MAX(id) FROM "{table_name}"').fetchone()[0] or 1
+        ids = [(i % max_id) + 1 for i in range(lookups)]
+
+        before = _bench_per_call_connect(bench_db, table_name, ids)
+        pool = ConnectionPool(bench_db)
+        try:
+            after = _bench_pooled(pool, table_name, ids)
+        finally:
+            pool.close()
+
+        print(f"{lookups} lookups against '{table_name}':")
+        print(f"  per-call connect: {before:.3f}s  ({lookups / before:,.0f} queries/sec)")
+        print(f"  pooled:           {after:.3f}s  ({lookups / after:,.0f} queries/sec)")
+        print(f"  speed-up:         {before / after:.1f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    db_file = sys.argv[1] if len(sys.argv) > 1 else "rharrellQuiz.db"
+    run_benchmark(db_file)
@@ -0,0 +1,120 @@
+import sys
+import threading
+import queue
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox, TclError
+
+DEFAULT_WORKERS = 2
+POLL_MS = 15 # How often the Tk thread checks for finished work while anything is pending
+
+
+class DBTask:
+    """Handle for one piece of background work; cancel() drops its result."""
+    def __init__(self, owner, on_done, on_error):
+        self.owner = owner
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel() # Only succeeds if a worker has not picked it up yet
+
+
+def show_db_error(error):
+    messagebox.showerror("Database Error", f"An error occurred: {error}")
+
+
+class DBExecutor:
+    """Runs database calls on worker threads and hands results back to Tk.
+
+    Work is submitted from the Tk thread with a callback. Workers put the
+    finished future on a thread-safe queue, and the Tk thread drains it with
+    `after()` polling, so callbacks (and any messagebox) always run on the
+    main thread. Tasks are tagged with an owner (usually a frame) so
+    everything a frame started can be cancelled when the user leaves it.
+    """
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-worker")
+        self._results = queue.Queue()
+        self._tasks = set()
+        self._widget = None
+        self._polling = False
+        self._lock = threading.Lock()
+
+    def submit(self, widget, fn, *args, on_done=None, on_error=show_db_error, owner=None):
+        """Runs fn(*args) off the Tk thread; on_done(result) / on_error(exc) run on the Tk thread."""
+        task = DBTask(owner if owner is not None else widget, on_done, on_error)
+        task.future = self._pool.submit(fn, *args)
+        with self._lock:
+            self._tasks.add(task)
+        task.future.add_done_callback(lambda future, task=task: self._results.put(task))
+        self._widget = widget.nametowidget(".") # Poll on the root so closing a Toplevel can't stop it
+        if not self._polling:
+            self._polling = True
+            self._schedule()
+        return task
+
+    def cancel_owner(self, owner):
+        """Cancels every pending task started by `owner`."""
+        with self._lock:
+            tasks = [task for task in self._tasks if task.owner is owner]
+        for task in tasks:
+            task.cancel()
+
+    def pending(self, owner=None):
+        with self._lock:
+            return sum(1 for task in self._tasks
+                       if not task.cancelled and (owner is None or task.owner is owner))
+
+    def _schedule(self):
+        try:
+            self._widget.after(POLL_MS, self._poll)
+        except (TclError, RuntimeError): # Window already destroyed
+            self._polling = False
+
+    def _report(self):
+        """A callback raised: report it the way Tk reports errors in its own callbacks, and carry on."""
+        try:
+            self._widget.report_callback_exception(*sys.exc_info())
+        except Exception: # No window left to report to
+            traceback.print_exc()
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    task = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                with self._lock:
+                    self._tasks.discard(task)
+                if task.cancelled or task.future.cancelled():
+                    continue
+                try:
+                    error = task.future.exception()
+                    if error is not None:
+                        if task.on_error is not None:
+                            task.on_error(error)
+                    elif task.on_done is not None:
+                        task.on_done(task.future.result())
+                except Exception:
+                    self._report() # One broken callback must not stop later results from being delivered
+        finally:
+            with self._lock:
+                busy = bool(self._tasks) or not self._results.empty()
+            if busy:
+                self._schedule()
+            else:
+                self._polling = False
+
+    def shutdown(self):
+        """Cancels queued work and lets running queries finish in the background."""
+        with self._lock:
+            tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
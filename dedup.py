@@ -0,0 +1,279 @@
+"""Near-duplicate question detection with MinHash and locality-sensitive hashing.
+
+Usage: python dedup.py [database] [--threshold 0.6]
+
+Question text is normalized (case, accents, punctuation and spacing are
+ignored) and cut into 4-character shingles. Each question gets a 60-value
+MinHash signature, split into 20 bands of 3 values, and every band is
+stored as one row of `question_lsh`. Two questions whose shingle sets have
+Jaccard similarity s share at least one band with probability
+1 - (1 - s^3)^20: 99% at s = 0.6, 2% at s = 0.1. So only questions that
+share a band are ever compared, never every pair, and each candidate is
+confirmed with the exact Jaccard similarity of its shingles.
+"""
+import re
+import sys
+import time
+import random
+import sqlite3
+import hashlib
+import argparse
+import threading
+import unicodedata
+from array import array
+
+SHINGLE_SIZE = 4
+BANDS = 20
+ROWS_PER_BAND = 3
+NUM_PERM = BANDS * ROWS_PER_BAND
+DEFAULT_THRESHOLD = 0.6 # "What does SQL stand for?" vs "What does SQL stands for ?" is 0.71
+MAX_BUCKET = 50 # Bigger buckets (templated questions) are compared against their first member only
+
+# Fixed seed: band keys are stored, so the hash family must never change between runs
+_MASKS = [random.Random(3850 + i).getrandbits(64) for i in range(NUM_PERM)]
+
+LSH_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS question_lsh (
+           band_key INTEGER NOT NULL,
+           course TEXT NOT NULL,
+           question_id INTEGER NOT NULL,
+           PRIMARY KEY (band_key, course, question_id)
+       ) WITHOUT ROWID''',
+    # Finds (and removes) the bands of one question
+    "CREATE INDEX IF NOT EXISTS idx_question_lsh_question ON question_lsh(course, question_id)",
+]
+
+
+def create_schema(conn):
+    for statement in LSH_SCHEMA:
+        conn.execute(statement)
+
+
+# --- SIGNATURES ---
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKD", str(text)).casefold()
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", text))
+
+def shingles(text):
+    text = normalize_text(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def minhash(shingle_set):
+    """NUM_PERM minimums, one per XOR-mask permutation of a stable 64-bit shingle hash."""
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingle_set]
+    return [min([h ^ mask for h in hashes]) for mask in _MASKS]
+
+def band_keys(signature):
+    """One signed 64-bit key per band, so it fits an SQLite INTEGER."""
+    keys = []
+    for band in range(BANDS):
+        chunk = array("Q", signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]).tobytes()
+        digest = hashlib.blake2b(bytes([band]) + chunk, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+class DuplicateIndex:
+    """LSH index over the question text of every course, kept in `question_lsh`.
+
+    The index lives in the database, so nothing has to be rebuilt at
+    startup: `sync()` only signs questions it has not seen (e.g. after an
+    import or edits made by another program) and forgets deleted ones. It
+    runs once per process before the first lookup; the add/update/remove
+    hooks keep it current for edits made through the admin helpers.
+    """
+    def __init__(self, pool, store, threshold=DEFAULT_THRESHOLD):
+        self.pool = pool
+        self.store = store
+        self.threshold = threshold
+        self._synced = False
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    # --- MAINTENANCE ---
+
+    def _rows(self, course_name, q_id, text):
+        return [(key, course_name, q_id) for key in band_keys(minhash(shingles(text)))]
+
+    def _ensure_schema(self, conn):
+        """Databases set up before migration 3 get the table on first write."""
+        if not self._schema_ready:
+            create_schema(conn)
+            self._schema_ready = True
+
+    def sync(self):
+        """Brings the index in line with the question tables. Returns (added, removed)."""
+        added = removed = 0
+        with self.pool.transaction() as conn:
+            self._ensure_schema(conn)
+        courses = self.store.list_courses()
+        for course_name in courses:
+            with self.pool.connection() as conn:
+                indexed = {row[0] for row in conn.execute(
+                    "SELECT DISTINCT question_id FROM question_lsh WHERE course = ?", (course_name,))}
+            current = set(self.store.course_question_ids(course_name))
+            missing, gone = sorted(current - indexed), indexed - current
+            with self.pool.transaction() as conn:
+                conn.executemany("DELETE FROM question_lsh WHERE course = ? AND question_id = ?",
+                                 ((course_name, q_id) for q_id in gone))
+                for start in range(0, len(missing), 1000):
+                    rows = self.store.questions_by_ids(course_name, missing[start:start + 1000]) or []
+                    conn.executemany("INSERT OR IGNORE INTO question_lsh (band_key, course, question_id) VALUES (?, ?, ?)",
+                                     [band for row in rows for band in self._rows(course_name, row[0], row[1])])
+                    added += len(rows)
+            removed += len(gone)
+        with self.pool.transaction() as conn:
+            placeholders = ",".join("?" * len(courses))
+            cursor = conn.execute(f"DELETE FROM question_lsh WHERE course NOT IN ({placeholders})", tuple(courses))
+            removed += cursor.rowcount // BANDS
+        return added, removed
+
+    def ensure_synced(self):
+        with self._lock:
+            if not self._synced:
+                self.sync()
+                self._synced = True
+
+    def mark_stale(self):
+        """Makes the next lookup re-sync, e.g. after a bulk import."""
+        self._synced = False
+
+    def add(self, course_name, q_id, text):
+        with self.pool.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.executemany("INSERT OR IGNORE INTO question_lsh (band_key, course, question_id) VALUES (?, ?, ?)",
+                             self._rows(course_name, q_id, text))
+
+    def remove(self, course_name, q_id):
+        with self.pool.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.execute("DELETE FROM question_lsh WHERE course = ? AND question_id = ?", (course_name, q_id))
+
+    def update(self, course_name, q_id, text):
+        with self.pool.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.execute("DELETE FROM question_lsh WHERE course = ? AND question_id = ?", (course_name, q_id))
+            conn.executemany("INSERT INTO question_lsh (band_key, course, question_id) VALUES (?, ?, ?)",
+                             self._rows(course_name, q_id, text))
+
+    # --- LOOKUPS ---
+
+    def _fetch(self, keys):
+        """(course, id) -> row for the given keys, one query per course."""
+        by_course = {}
+        for course_name, q_id in keys:
+            by_course.setdefault(course_name, []).append(q_id)
+        rows = {}
+        for course_name, ids in by_course.items():
+            for row in self.store.questions_by_ids(course_name, ids) or []:
+                rows[(course_name, row[0])] = row
+        return rows
+
+    def find_similar(self, text, limit=5, exclude=None):
+        """Questions in any course that look like `text`, as (similarity, course, row), most similar first."""
+        self.ensure_synced()
+        keys = band_keys(minhash(shingles(text)))
+        with self.pool.connection() as conn:
+            candidates = conn.execute(
+                f"SELECT DISTINCT course, question_id FROM question_lsh WHERE band_key IN ({','.join('?' * len(keys))})",
+                keys).fetchall()
+        target = shingles(text)
+        hits = []
+        for (course_name, q_id), row in self._fetch(c for c in candidates if c != exclude).items():
+            similarity = jaccard(target, shingles(row[1]))
+            if similarity >= self.threshold:
+                hits.append((similarity, course_name, row))
+        hits.sort(key=lambda hit: -hit[0])
+        return hits[:limit]
+
+    def report(self):
+        """Groups of near-duplicate questions across the whole database.
+
+        Returns (groups, comparisons), where each group is a list of
+        (course, row) and comparisons is how many pairs were actually checked.
+        """
+        self.ensure_synced()
+        with self.pool.connection() as conn:
+            shared = conn.execute(
+                '''SELECT band_key, course, question_id FROM question_lsh WHERE band_key IN
+                       (SELECT band_key FROM question_lsh GROUP BY band_key HAVING COUNT(*) > 1)
+                   ORDER BY band_key''').fetchall()
+        buckets = {}
+        for band_key, course_name, q_id in shared:
+            buckets.setdefault(band_key, []).append((course_name, q_id))
+        pairs = set()
+        for members in buckets.values():
+            if len(members) > MAX_BUCKET:
+                pairs.update((members[0], other) for other in members[1:])
+            else:
+                pairs.update((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+
+        rows = self._fetch({key for pair in pairs for key in pair})
+        signed = {key: shingles(row[1]) for key, row in rows.items()}
+        parent = {}
+        def find(key):
+            while parent.get(key, key) != key:
+                key = parent[key]
+            return key
+        for a, b in pairs:
+            if a in signed and b in signed and jaccard(signed[a], signed[b]) >= self.threshold:
+                parent[find(a)] = find(b)
+
+        groups = {}
+        for key in parent:
+            groups.setdefault(find(key), []).append(key)
+        for root in list(groups):
+            if root not in groups[root]:
+                groups[root].append(root)
+        result = [[(key[0], rows[key]) for key in sorted(members)] for members in groups.values()]
+        result.sort(key=lambda group: (-len(group), group[0][0], group[0][1][0]))
+        return result, len(pairs)
+
+
+def format_report(groups, comparisons, total=None):
+    lines = [f"{len(groups)} groups of near-duplicate questions ({comparisons:,} pairs compared"
+             + (f" out of {total * (total - 1) // 2:,} possible)." if total else ").")]
+    for number, group in enumerate(groups, start=1):
+        lines.append(f"\nGroup {number}:")
+        for course_name, row in group:
+            lines.append(f"  [{course_name} #{row[0]}] {row[1]}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from shards import open_pool
+    from questionstore import QuestionStore
+
+    parser = argparse.ArgumentParser(description="Report near-duplicate questions across every course.")
+    parser.add_argument("database", nargs="?", default="rharrellQuiz.db")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="minimum Jaccard similarity of the shingled text (0-1)")
+    args = parser.parse_args()
+
+    db_pool = open_pool(args.database)
+    store = QuestionStore(db_pool.execute, shards=db_pool.shards)
+    index = DuplicateIndex(db_pool, store, threshold=args.threshold)
+    try:
+        start = time.perf_counter()
+        added, removed = index.sync()
+        print(f"Index synced in {time.perf_counter() - start:.2f}s ({added} questions signed, {removed} removed).")
+        start = time.perf_counter()
+        groups, comparisons = index.report()
+        total = sum(store.count_questions(course_name) for course_name in store.list_courses())
+        print(format_report(groups, comparisons, total))
+        print(f"\nReport built in {time.perf_counter() - start:.2f}s.")
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        sys.exit(1)
+    finally:
+        db_pool.close()
@@ -0,0 +1,263 @@
+"""Latency histograms and query counts for the desktop app, plus optional profiling.
+
+Usage: python instrument.py [--calls N]   (overhead and accuracy benchmark)
+       python instrument.py --show metrics.json   (print a saved report)
+
+`Metrics.timed()` / `Metrics.span()` record how long each call takes in a
+per-operation histogram. Statements are counted per frame through the
+connection pool's trace hook. Set these before starting newMainFile.py:
+
+    QUIZ_METRICS=metrics.json   write p50/p95/p99 per operation as JSON at exit
+    QUIZ_PROFILE=cpu            cProfile the Tk thread; stats saved to quiz_profile.pstats
+    QUIZ_PROFILE=memory         tracemalloc; top allocations saved to quiz_memory.txt
+
+Ctrl+Shift+M in the app opens the same figures in a window.
+"""
+import os
+import sys
+import json
+import math
+import time
+import atexit
+import random
+import argparse
+import functools
+import threading
+from contextlib import contextmanager
+
+MIN_SECONDS = 1e-6 # Anything faster lands in the first bucket
+GROWTH = 1.1 # Each bucket is 10% wider than the last, so percentiles are within 5%
+BUCKETS = 256 # 1 us up to about 4 hours
+PROFILE_FILE = "quiz_profile.pstats"
+MEMORY_FILE = "quiz_memory.txt"
+MEMORY_TOP = 40 # Allocation sites listed in the memory report
+
+_LOG_GROWTH = math.log(GROWTH)
+
+
+class Histogram:
+    """Counts of latencies in log-spaced buckets: constant memory and O(1) to record."""
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if seconds <= MIN_SECONDS:
+            self.buckets[0] += 1
+        else:
+            self.buckets[min(BUCKETS - 1, int(math.log(seconds / MIN_SECONDS) / _LOG_GROWTH) + 1)] += 1
+
+    def percentile(self, fraction):
+        """The latency `fraction` of calls came in under (midpoint of its bucket, capped at the max)."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * fraction))
+        seen = 0
+        for index, hits in enumerate(self.buckets):
+            seen += hits
+            if seen >= rank:
+                if index == 0:
+                    return min(MIN_SECONDS, self.max)
+                return min(MIN_SECONDS * GROWTH ** (index - 0.5), self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count,
+                "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+                "p50_ms": round(self.percentile(0.50) * 1000, 3),
+                "p95_ms": round(self.percentile(0.95) * 1000, 3),
+                "p99_ms": round(self.percentile(0.99) * 1000, 3),
+                "max_ms": round(self.max * 1000, 3)}
+
+
+class Metrics:
+    """Named latency histograms plus SQL statement counts per frame; safe to use from any thread.
+
+    `frame` is whatever the app says is on screen (see `set_frame`), so a
+    statement run by a worker thread is counted against the frame that was
+    showing when it ran.
+    """
+    def __init__(self):
+        self.frame = "startup"
+        self.started = time.time()
+        self._histograms = {}
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    # --- RECORDING ---
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.record(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Times the body of a `with` block, including when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name=None):
+        """Decorator that records every call under `name` (the function's qualified name by default)."""
+        def decorate(fn):
+            label = name or fn.__qualname__
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(label, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def set_frame(self, name):
+        self.frame = name
+
+    def count_statement(self, sql):
+        """Trace callback for sqlite3 connections (see ConnectionPool's `trace`)."""
+        frame = self.frame
+        with self._lock:
+            self._statements[frame] = self._statements.get(frame, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._statements.clear()
+        self.started = time.time()
+
+    # --- REPORTING ---
+
+    def report(self):
+        """{"operations": {name: summary}, "statements_per_frame": {frame: count}, ...}, slowest p99 first."""
+        with self._lock:
+            operations = {name: histogram.summary() for name, histogram in self._histograms.items()}
+            statements = dict(self._statements)
+        ordered = dict(sorted(operations.items(), key=lambda item: item[1]["p99_ms"], reverse=True))
+        return {"since": self.started, "seconds": round(time.time() - self.started, 1),
+                "operations": ordered,
+                "statements_per_frame": dict(sorted(statements.items(), key=lambda item: -item[1]))}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as out:
+            json.dump(self.report(), out, indent=2)
+        return path
+
+
+def format_report(report):
+    """The report as a plain-text table."""
+    lines = [f"{'operation':<40} {'calls':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+    for name, s in report["operations"].items():
+        lines.append(f"{name:<40} {s['count']:>8,} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} "
+                     f"{s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}")
+    if report["statements_per_frame"]:
+        lines.append("")
+        lines.append("SQL statements while each frame was shown:")
+        for frame, count in report["statements_per_frame"].items():
+            lines.append(f"  {frame:<38} {count:>8,}")
+    return "\n".join(lines)
+
+
+# --- PROFILING ---
+
+def _start_cpu_profile(path):
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    def stop():
+        profiler.disable()
+        profiler.dump_stats(path)
+    return stop
+
+def _start_memory_profile(path):
+    import tracemalloc
+    tracemalloc.start(10) # Frames kept per allocation
+    def stop():
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(path, "w", encoding="utf-8") as out:
+            out.write(f"current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n\n")
+            for stat in snapshot.statistics("lineno")[:MEMORY_TOP]:
+                out.write(f"{stat}\n")
+    return stop
+
+def enable_from_env(metrics, environ=os.environ):
+    """Turns on whatever QUIZ_PROFILE / QUIZ_METRICS ask for; the results are written at exit.
+
+    cProfile only sees the thread that calls this (the Tk thread). Returns
+    the list of files that will be written.
+    """
+    outputs = []
+    mode = environ.get("QUIZ_PROFILE", "").strip().lower()
+    if mode in ("cpu", "memory"):
+        path = PROFILE_FILE if mode == "cpu" else MEMORY_FILE
+        atexit.register(_start_cpu_profile(path) if mode == "cpu" else _start_memory_profile(path))
+        outputs.append(path)
+    elif mode:
+        print(f"QUIZ_PROFILE: unknown mode '{mode}' (use 'cpu' or 'memory')", file=sys.stderr)
+    metrics_path = environ.get("QUIZ_METRICS")
+    if metrics_path:
+        atexit.register(metrics.dump, metrics_path)
+        outputs.append(metrics_path)
+    return outputs
+
+
+# --- BENCHMARK ---
+
+def run_benchmark(calls=1_000_000, seed=1234):
+    """Overhead of timed() per call, and histogram percentiles against exact ones."""
+    metrics = Metrics()
+
+    def plain(x):
+        return x + 1
+    timed = metrics.timed("bench")(plain)
+
+    start = time.perf_counter()
+    for n in range(calls):
+        plain(n)
+    bare = time.perf_counter() - start
+    start = time.perf_counter()
+    for n in range(calls):
+        timed(n)
+    wrapped = time.perf_counter() - start
+    print(f"{calls:,} calls: {bare / calls * 1e9:,.0f} ns bare, {wrapped / calls * 1e9:,.0f} ns timed "
+          f"({(wrapped - bare) / calls * 1e9:,.0f} ns overhead per call)")
+
+    rng = random.Random(seed)
+    samples = [rng.lognormvariate(math.log(0.002), 1.0) for _ in range(100_000)] # ~2 ms median, long tail
+    histogram = Histogram()
+    for seconds in samples:
+        histogram.record(seconds)
+    samples.sort()
+    print("percentile   exact ms   histogram ms   error")
+    for fraction in (0.50, 0.95, 0.99):
+        exact = samples[math.ceil(len(samples) * fraction) - 1]
+        estimate = histogram.percentile(fraction)
+        print(f"  p{fraction * 100:<4.0f}    {exact * 1000:>8.3f}   {estimate * 1000:>12.3f}   "
+              f"{(estimate - exact) / exact:>+6.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the instrumentation overhead.")
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--show", metavar="FILE", help="print a report saved by QUIZ_METRICS or the app")
+    args = parser.parse_args()
+    if args.show:
+        with open(args.show, encoding="utf-8") as saved:
+            print(format_report(json.load(saved)))
+    else:
+        run_benchmark(args.calls)
@@ -0,0 +1,216 @@
+"""Moves the per-course tables into the unified `courses` + `questions` schema.
+
+Usage: python migrate.py [database] [--batch-size N] [--drop-legacy]
+
+The copy is online: rows are streamed out of each course table with keyset
+pagination and written in small batched transactions, so the quiz apps can
+keep reading and writing the old tables meanwhile. A final short
+transaction catches up on anything that changed during the copy and flips
+the layout flag in `quiz_meta`. The migration is resumable; re-running it
+continues from the last copied id. Running apps notice the flag on their
+next read (QuestionStore re-checks it whenever the database changes), and
+the kept course tables refuse writes from then on, so nothing written to
+the old layout after the switch can be lost.
+"""
+import sqlite3
+import sys
+import time
+import argparse
+
+from questionstore import (UNIFIED_SCHEMA, LIST_LEGACY_TABLES_SQL, LAYOUT_UNIFIED, LAYOUT_SHARDED,
+                           detect_layout, connection_execute, catalog_installed, install_catalog)
+import search
+
+DATABASE_FILE = "rharrellQuiz.db"
+DEFAULT_BATCH_SIZE = 500
+
+COPY_COLUMNS = "question, option_a, option_b, option_c, option_d, correct_answer"
+MOVED_MESSAGE = "this course has moved to the unified layout; reopen the program"
+
+
+def _block_legacy_writes(conn, course_name):
+    """Makes the kept course table read-only, so a writer that missed the switch fails loudly."""
+    for prefix, event in (("moved_bi", "INSERT"), ("moved_bu", "UPDATE"), ("moved_bd", "DELETE")):
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS "{prefix}_{course_name}" BEFORE {event} ON "{course_name}"
+                         BEGIN SELECT RAISE(ABORT, '{MOVED_MESSAGE}'); END''')
+
+
+def _course_id(conn, course_name):
+    conn.execute("INSERT OR IGNORE INTO courses (name) VALUES (?)", (course_name,))
+    return conn.execute("SELECT id FROM courses WHERE name = ?", (course_name,)).fetchone()[0]
+
+def copy_course(conn, course_name, batch_size=DEFAULT_BATCH_SIZE):
+    """Streams one course table into `questions`, one transaction per batch. Returns rows copied."""
+    with conn:
+        course_id = _course_id(conn, course_name)
+    last_id = conn.execute("SELECT COALESCE(MAX(legacy_id), 0) FROM questions WHERE course_id = ?",
+                           (course_id,)).fetchone()[0]
+    copied = 0
+    while True:
+        rows = conn.execute(
+            f'SELECT id, {COPY_COLUMNS} FROM "{course_name}" WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return copied
+        with conn:
+            conn.executemany(
+                f'INSERT INTO questions (course_id, legacy_id, {COPY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((course_id,) + row for row in rows)
+            )
+        copied += len(rows)
+        last_id = rows[-1][0]
+
+def _catch_up(conn, course_name):
+    """Applies inserts, edits and deletes made to a course table while it was being copied."""
+    course_id = _course_id(conn, course_name)
+    conn.execute(
+        f'''INSERT INTO questions (course_id, legacy_id, {COPY_COLUMNS})
+            SELECT ?, id, {COPY_COLUMNS} FROM "{course_name}"
+            WHERE id > (SELECT COALESCE(MAX(legacy_id), 0) FROM questions WHERE course_id = ?)''',
+        (course_id, course_id))
+    conn.execute(
+        f'''DELETE FROM questions WHERE course_id = ?
+            AND legacy_id NOT IN (SELECT id FROM "{course_name}")''', (course_id,))
+    conn.execute(
+        f'''UPDATE questions SET ({COPY_COLUMNS}) =
+                (SELECT {COPY_COLUMNS} FROM "{course_name}" l WHERE l.id = questions.legacy_id)
+            WHERE course_id = ? AND EXISTS (
+                SELECT 1 FROM "{course_name}" l WHERE l.id = questions.legacy_id
+                AND (l.question, l.option_a, l.option_b, l.option_c, l.option_d, l.correct_answer)
+                    IS NOT (questions.question, questions.option_a, questions.option_b,
+                            questions.option_c, questions.option_d, questions.correct_answer))''',
+        (course_id,))
+
+def _remap_seed_ids(conn):
+    """Points zdatabasesetup's seed tracking at the new question ids."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='seed_questions'").fetchone():
+        return
+    conn.execute(
+        '''UPDATE seed_questions SET question_id = COALESCE((
+               SELECT q.id FROM questions q JOIN courses c ON c.id = q.course_id
+               WHERE c.name = seed_questions.course AND q.legacy_id = seed_questions.question_id
+           ), question_id)''')
+
+def _remap_duplicate_index(conn):
+    """Points dedup.py's LSH buckets at the new question ids, so they need not be rebuilt."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='question_lsh'").fetchone():
+        return
+    # Rebuilt rather than updated in place: an old id can equal another question's new id.
+    # Rows without a copied question are dropped; dedup.py re-signs what is missing.
+    conn.execute(
+        '''CREATE TEMP TABLE lsh_remap AS
+           SELECT l.band_key, l.course, q.id AS question_id FROM question_lsh l
+           JOIN courses c ON c.name = l.course
+           JOIN questions q ON q.course_id = c.id AND q.legacy_id = l.question_id''')
+    conn.execute("DELETE FROM question_lsh")
+    conn.execute("INSERT OR IGNORE INTO question_lsh SELECT band_key, course, question_id FROM temp.lsh_remap")
+    conn.execute("DROP TABLE temp.lsh_remap")
+
+def _remap_attempt_answers(conn):
+    """Points attemptlog.py's recorded answers at the new question ids."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='attempt_answers'").fetchone():
+        return
+    # Updated in place: the key is (attempt_id, position), so new ids cannot collide
+    conn.execute(
+        '''UPDATE attempt_answers SET question_id = COALESCE((
+               SELECT q.id FROM attempts a
+               JOIN courses c ON c.name = a.course
+               JOIN questions q ON q.course_id = c.id AND q.legacy_id = attempt_answers.question_id
+               WHERE a.id = attempt_answers.attempt_id
+           ), question_id)''')
+
+def _remap_question_stats(conn):
+    """Points analytics.py's per-question rollups at the new question ids."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='question_stats'").fetchone():
+        return
+    # Rebuilt like the LSH buckets: the key includes the question id
+    conn.execute(
+        '''CREATE TEMP TABLE stats_remap AS
+           SELECT q.id AS new_id, s.* FROM question_stats s
+           JOIN courses c ON c.name = s.course
+           JOIN questions q ON q.course_id = c.id AND q.legacy_id = s.question_id''')
+    conn.execute("UPDATE temp.stats_remap SET question_id = new_id")
+    conn.execute("DELETE FROM question_stats")
+    columns = ", ".join(row[1] for row in conn.execute("PRAGMA table_info(question_stats)"))
+    conn.execute(f"INSERT INTO question_stats ({columns}) SELECT {columns} FROM temp.stats_remap")
+    conn.execute("DROP TABLE temp.stats_remap")
+
+def _reset_valid_index(conn):
+    """Forgets validindex.py's verdicts; they are keyed by the old ids and are re-checked on first use."""
+    for table in ("question_validity", "course_validity"):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (table,)).fetchone():
+            conn.execute(f"DELETE FROM {table}")
+
+def migrate(db_path, batch_size=DEFAULT_BATCH_SIZE, drop_legacy=False):
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL") # Readers keep going while we write
+        if detect_layout(connection_execute(conn)) == LAYOUT_SHARDED:
+            print("Database uses the sharded layout (see shards.py); its courses cannot be merged into one table.")
+            return
+        conn.executescript(UNIFIED_SCHEMA)
+        courses = [row[0] for row in conn.execute(LIST_LEGACY_TABLES_SQL)]
+        layout = conn.execute("SELECT value FROM quiz_meta WHERE key = 'layout'").fetchone()
+        if layout and layout[0] == LAYOUT_UNIFIED:
+            # Already switched over: the old tables may be stale, so never copy from them again
+            print("Database already uses the unified layout.")
+            if drop_legacy:
+                with conn:
+                    for course_name in courses:
+                        conn.execute(f'DROP TABLE "{course_name}"')
+                print(f"Dropped {len(courses)} old course tables.")
+            else:
+                with conn: # Databases migrated before the tables were locked
+                    for course_name in courses:
+                        _block_legacy_writes(conn, course_name)
+            return
+        start = time.perf_counter()
+        total = 0
+        for course_name in courses:
+            copied = copy_course(conn, course_name, batch_size)
+            total += copied
+            print(f"- '{course_name}': copied {copied} questions")
+
+        # Final switch-over: block writers briefly, reconcile and flip the layout flag
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for course_name in courses:
+                _catch_up(conn, course_name)
+                if drop_legacy:
+                    conn.execute(f'DROP TABLE "{course_name}"')
+                else:
+                    _block_legacy_writes(conn, course_name)
+            _remap_seed_ids(conn)
+            _remap_duplicate_index(conn)
+            _remap_attempt_answers(conn)
+            _remap_question_stats(conn)
+            _reset_valid_index(conn)
+            conn.execute("INSERT OR REPLACE INTO quiz_meta (key, value) VALUES ('layout', ?)", (LAYOUT_UNIFIED,))
+            if search.index_installed(conn):
+                search.install(conn) # Swap the per-table triggers for the ones on `questions`
+            if catalog_installed(connection_execute(conn)):
+                install_catalog(conn) # Same for the course catalog's triggers
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        elapsed = time.perf_counter() - start
+        print(f"\nMigrated {total} questions from {len(courses)} courses in {elapsed:.2f}s.")
+        if not drop_legacy:
+            print("The old course tables were kept; re-run with --drop-legacy to remove them.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate per-course tables into the unified question schema.")
+    parser.add_argument("database", nargs="?", default=DATABASE_FILE)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--drop-legacy", action="store_true", help="drop the per-course tables afterwards")
+    args = parser.parse_args()
+    try:
+        migrate(args.database, args.batch_size, args.drop_legacy)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        sys.exit(1)
@@ -1,84 +1,313 @@
 import tkinter as tk
-from tkinter import messagebox, simpledialog, ttk # Added simpledialog and ttk
+from tkinter import messagebox # ttk, simpledialog and filedialog are imported where the admin side uses them
 import sqlite3
-import random
+import os
+import time
+import atexit
+import logging
+import threading
+import functools
+from quizservices import DB_NAME, NUM_QUESTIONS, DB_POOL_SIZE
+from dbworker import DBExecutor, show_db_error
+from quizengine import QuizSession, InvalidQuestionError
+from instrument import Metrics, enable_from_env
+
+log = logging.getLogger("quizapp") # QUIZ_LOG_LEVEL=INFO shows per-question transition times
 
 # --- DATABASE CONFIGURATION ---
-DB_NAME = "rharrellQuiz.db"
-NUM_QUESTIONS = 10
+# DB_NAME, NUM_QUESTIONS and DB_POOL_SIZE are shared with the quiz server (see quizservices.py)
 ADMIN_PASSWORD = "admin" # The admin password
+QUIZ_SEED = None # Set to an int to make question sampling repeatable
+ADAPTIVE_QUIZ = False # Whether "Adaptive quiz" starts ticked (see adaptive.py)
+QUESTION_CACHE_ROWS = 100_000 # Upper bound on question rows the admin editor keeps in memory
+DB_WORKERS = 2 # Background threads that run queries so the window never freezes
+SEARCH_DELAY_MS = 120 # Pause in typing before the search box queries
+ATTEMPT_JOURNAL = "quiz_attempts.journal" # Attempts not yet written to the database (see attemptlog.py)
+SNAPSHOT_MODE = None # "memory" or "mmap" to draw quizzes from a read-only copy of the bank (see snapshot.py)
+QUIZ_PACK = None # A pack built by `python quizpack.py build`; when set, the quiz list and quizzes come from it
+COURSE_BUTTON_LIMIT = 10 # More courses than this are listed in a searchable box instead of as buttons
+LAZY_FRAMES = True # Build each screen the first time it is shown instead of all of them at start-up
+
+# Latency histograms and per-frame statement counts; Ctrl+Shift+M shows them (see instrument.py)
+metrics = Metrics()
+db_executor = DBExecutor(workers=DB_WORKERS)
+atexit.register(db_executor.shutdown)
+
+# --- LAZY START-UP ---
+# The pool, the services on it and the admin-only modules (search, dedup, analytics, adaptive,
+# quizpack, ...) are opened or imported the first time something needs them, so the login
+# screen is up before any of that work is done.
+
+_startup_lock = threading.RLock() # First use can come from the Tk thread or a db_executor worker
+
+def _once(build):
+    """Runs `build` on the first call and returns its result from then on; retried if it raised."""
+    built = []
+    @functools.wraps(build)
+    def get():
+        if not built:
+            with _startup_lock:
+                if not built:
+                    built.append(build())
+        return built[0]
+    return get
+
+@_once
+def get_db_pool():
+    """The connection pool; a shards.ShardedPool when the bank has been split into one file per department."""
+    from shards import open_pool
+    db_pool = open_pool(DB_NAME, size=DB_POOL_SIZE, trace=metrics.count_statement)
+    atexit.register(db_pool.close) # Registered first, so it runs after everything that uses the pool
+    return db_pool
+
+@_once
+def get_services():
+    """The store, sampler, valid-question index, cache and statistics, built the same way by the quiz server.
+
+    Admin reads and writes go through `question_cache`. With SNAPSHOT_MODE quizzes come from a
+    read-only copy of the bank; admin edits reach it on its next reload.
+    """
+    from quizservices import QuizServices
+    services = QuizServices(get_db_pool(), execute=execute_db_query, seed=QUIZ_SEED, snapshot_mode=SNAPSHOT_MODE,
+                            cache_rows=QUESTION_CACHE_ROWS)
+    atexit.register(services.close)
+    return services
+
+@_once
+def get_quiz_pack():
+    """The configured quiz pack, or None when there is none or it cannot be opened."""
+    if not QUIZ_PACK:
+        return None
+    from quizpack import open_pack, PackError
+    try:
+        return open_pack(QUIZ_PACK, seed=QUIZ_SEED)
+    except (PackError, OSError) as e:
+        print(f"Not using quiz pack '{QUIZ_PACK}': {e}")
+        return None
+
+@_once
+def get_duplicate_index():
+    """Near-duplicate lookups across every course without comparing every pair (see dedup.py)."""
+    from dedup import DuplicateIndex
+    return DuplicateIndex(get_db_pool(), get_services().question_store)
+
+@_once
+def get_question_selector():
+    """Adaptive quizzes: per-question difficulty, seeded from the item statistics."""
+    from adaptive import AdaptiveSelector
+    services = get_services()
+    return AdaptiveSelector(services.question_store, answer_counts=services.item_analytics.answer_counts,
+                            seed=QUIZ_SEED, id_source=services.valid_index.valid_ids)
+
+@_once
+def get_attempt_log():
+    """Every quiz attempt is recorded, in batches written off the Tk thread."""
+    from attemptlog import AttemptLog
+    attempt_log = AttemptLog(get_db_pool(), ATTEMPT_JOURNAL, on_flush=get_services().item_analytics.refresh)
+    attempt_log.recover() # Attempts a crash kept out of the database
+    atexit.register(attempt_log.close) # Runs before the pool is closed
+    return attempt_log
 
 # --- DATABASE HELPER FUNCTIONS (UPDATED & NEW) ---
 
+@metrics.timed("execute_db_query")
 def execute_db_query(query, params=(), fetch=None):
-    """A central function to execute database queries."""
+    """A central function to execute database queries on a pooled connection."""
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            if fetch == "all":
-                return cursor.fetchall()
-            if fetch == "one":
-                return cursor.fetchone()
-            conn.commit()
-            return True
+        return get_db_pool().execute(query, params, fetch)
     except sqlite3.Error as e:
+        if threading.current_thread() is not threading.main_thread():
+            raise # Tk is not thread-safe; db_executor reports the error on the main thread
         messagebox.showerror("Database Error", f"An error occurred: {e}")
         return False
 
+@metrics.timed()
 def get_quiz_tables():
-    """Fetches the names of all tables (quizzes) from the database."""
-    tables_data = execute_db_query(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'",
-        fetch="all"
-    )
-    return [table[0] for table in tables_data] if tables_data else []
-
+    """Fetches the names of all courses (quizzes); cached until the database changes."""
+    return get_services().quiz_tables()
+
+@metrics.timed()
+def get_course_catalog():
+    """(name, display name, questions, usable questions, modified at) per course; one read, cached."""
+    return get_services().question_cache.catalog()
+
+def current_quiz_pack():
+    """The quiz pack while it still matches the database; None once questions have changed since its build."""
+    quiz_pack = get_quiz_pack()
+    if quiz_pack is None or not quiz_pack.is_current(get_course_catalog()):
+        return None
+    return quiz_pack
+
+def get_quiz_courses():
+    """Catalog rows for the courses offered on the quiz list: the pack's when one is in use."""
+    pack = current_quiz_pack()
+    if pack is not None:
+        return [(name, name, pack.count(name), pack.count(name), None) for name in pack.courses()]
+    return get_course_catalog()
+
+def course_label(entry):
+    """How a catalog row is shown: its display name and the number of questions a quiz can use."""
+    name, display_name, count, valid_count, _ = entry
+    usable = valid_count if valid_count is not None else count
+    if usable is None:
+        return display_name
+    return f"{display_name} ({usable} question{'' if usable == 1 else 's'})"
+
+@metrics.timed()
 def get_questions(table_name):
     """Fetches a specified number of random questions from a given table."""
-    return execute_db_query(
-        f'SELECT * FROM "{table_name}" ORDER BY RANDOM() LIMIT {NUM_QUESTIONS}',
-        fetch="all"
-    )
+    return get_services().questions(table_name, NUM_QUESTIONS)
+
+@metrics.timed()
+def build_quiz_session(table_name, adaptive=False):
+    """Samples a quiz (or picks the first adaptive question) and prepares it for play; runs on a worker thread."""
+    get_attempt_log() # Opened (and any crashed attempts recovered) here rather than on the Tk thread
+    if adaptive:
+        return get_question_selector().start_session(table_name, get_services().question_cache.get_question, timed=True)
+    pack = current_quiz_pack()
+    if pack is not None and table_name in pack:
+        return pack.session(table_name, NUM_QUESTIONS, timed=True) # The pack's own rng, locked for worker threads
+    return QuizSession.from_rows(table_name, get_questions(table_name), timed=True)
 
 # --- NEW ADMIN DATABASE FUNCTIONS ---
 
-def create_new_course(table_name):
-    """Creates a new table in the database for a new course."""
-    query = f'''CREATE TABLE IF NOT EXISTS "{table_name}" (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT NOT NULL,
-                option_a TEXT NOT NULL,
-                option_b TEXT NOT NULL,
-                option_c TEXT NOT NULL,
-                option_d TEXT NOT NULL,
-                correct_answer TEXT NOT NULL
-            );'''
-    return execute_db_query(query)
+def _question_params(q_data):
+    return (q_data['question'], q_data['opt_a'], q_data['opt_b'], q_data['opt_c'], q_data['opt_d'], q_data['correct'])
 
+def create_new_course(table_name):
+    """Creates a new course in the database."""
+    created = get_services().question_cache.create_course(table_name)
+    if created:
+        import search
+        with get_db_pool().transaction() as conn:
+            search.sync_course(conn, table_name)
+    return created
+
+@metrics.timed()
 def add_question(table_name, q_data):
-    """Adds a new question to the specified table."""
-    query = f'''INSERT INTO "{table_name}" 
-               (question, option_a, option_b, option_c, option_d, correct_answer) 
-               VALUES (?, ?, ?, ?, ?, ?)'''
-    params = (q_data['question'], q_data['opt_a'], q_data['opt_b'], q_data['opt_c'], q_data['opt_d'], q_data['correct'])
-    return execute_db_query(query, params)
-
+    """Adds a new question to the specified course."""
+    services = get_services()
+    q_id = services.question_cache.add_question(table_name, _question_params(q_data))
+    if q_id:
+        if services.valid_index.record(table_name, q_id, _question_params(q_data)) is None:
+            services.question_sampler.add(table_name, q_id)
+            get_question_selector().add(table_name, q_id)
+        get_duplicate_index().add(table_name, q_id, q_data['question'])
+    return q_id
+
+@metrics.timed()
 def update_question(table_name, q_id, q_data):
     """Updates an existing question in the database."""
-    query = f'''UPDATE "{table_name}" SET 
-               question = ?, option_a = ?, option_b = ?, option_c = ?, option_d = ?, correct_answer = ?
-               WHERE id = ?'''
-    params = (q_data['question'], q_data['opt_a'], q_data['opt_b'], q_data['opt_c'], q_data['opt_d'], q_data['correct'], q_id)
-    return execute_db_query(query, params)
+    services = get_services()
+    updated = services.question_cache.update_question(table_name, int(q_id), _question_params(q_data))
+    if updated:
+        if services.valid_index.record(table_name, int(q_id), _question_params(q_data)) is None:
+            services.question_sampler.add(table_name, int(q_id)) # Back in quizzes if an edit fixed it
+            get_question_selector().add(table_name, int(q_id))
+        else:
+            services.question_sampler.discard(table_name, int(q_id))
+            get_question_selector().discard(table_name, int(q_id))
+        get_duplicate_index().update(table_name, int(q_id), q_data['question'])
+    return updated
 
+@metrics.timed()
 def delete_question(table_name, q_id):
     """Deletes a question from the database."""
-    return execute_db_query(f'DELETE FROM "{table_name}" WHERE id = ?', (q_id,))
+    q_id = int(q_id) # Treeview hands ids over as strings
+    services = get_services()
+    if services.question_cache.delete_question(table_name, q_id):
+        services.question_sampler.discard(table_name, q_id)
+        get_question_selector().discard(table_name, q_id)
+        services.valid_index.remove(table_name, q_id)
+        get_duplicate_index().remove(table_name, q_id)
+        return True
+    return False
+
+@metrics.timed()
+def get_question(table_name, q_id):
+    """Gets a single question by id, usually straight from the cache."""
+    return get_services().question_cache.get_question(table_name, int(q_id))
 
 def get_all_questions_for_course(table_name):
-    """Gets all questions from a table for editing."""
-    return execute_db_query(f'SELECT * FROM "{table_name}" ORDER BY id', fetch="all")
+    """Gets all questions from a course for editing."""
+    return get_services().question_cache.all_questions(table_name)
+
+def count_questions_for_course(table_name):
+    """Counts the questions in a course."""
+    return get_services().question_store.count_questions(table_name)
+
+@metrics.timed()
+def get_question_page(table_name, after_id, limit):
+    """Gets the next page of questions after `after_id` (keyset pagination)."""
+    services = get_services()
+    rows = services.question_store.page_questions(table_name, after_id, limit)
+    if rows:
+        services.question_cache.prime(table_name, rows) # Clicking a listed row is then a cache hit
+    return rows
+
+@metrics.timed()
+def refresh_question_stats():
+    """Folds attempts finished since the last refresh (e.g. by other programs) into the statistics."""
+    return get_services().item_analytics.refresh()
+
+@metrics.timed()
+def get_question_stats(table_name, q_ids):
+    """{id: (difficulty, discrimination, option shares, average seconds)} for the given questions."""
+    return get_services().item_analytics.question_stats(table_name, q_ids)
+
+@metrics.timed()
+def import_question_file(table_name, path):
+    """Bulk-loads a CSV/JSONL file into a course in one transaction; returns an ImportReport."""
+    from questionio import import_questions
+    services = get_services()
+    report = import_questions(get_db_pool(), services.question_store, table_name, path)
+    services.question_sampler.invalidate(table_name)
+    get_question_selector().invalidate(table_name)
+    services.question_cache.invalidate(table_name)
+    get_duplicate_index().mark_stale() # The new rows are signed on the next duplicate check
+    return report
+
+def export_question_file(table_name, path):
+    """Writes a course out as CSV/JSONL; returns the number of questions written."""
+    from questionio import export_questions
+    return export_questions(get_services().question_store, table_name, path)
+
+def get_question_id_before(table_name, offset):
+    """Gets the id just before position `offset`, so the list can jump straight to a page."""
+    return get_services().question_store.question_id_before(table_name, offset)
+
+def ensure_search_index():
+    """Builds the full-text index the first time it is needed (zdatabasesetup.py normally does this)."""
+    import search
+    with get_db_pool().transaction() as conn:
+        if search.index_installed(conn):
+            return True
+        if not search.fts5_available(conn):
+            raise sqlite3.OperationalError("this SQLite build has no FTS5 support, so search is unavailable")
+        search.install(conn)
+        return True
+
+def find_duplicate_questions(question_text):
+    """Existing questions in any course that read almost like `question_text`."""
+    return get_duplicate_index().find_similar(question_text)
+
+def excluded_question_report():
+    """The questions left out of quizzes (blank text or options, no valid answer), as printable text."""
+    from validindex import format_exclusions
+    valid_index = get_services().valid_index
+    return format_exclusions(valid_index.excluded(), valid_index.totals())
+
+def duplicate_report():
+    """Every group of near-duplicate questions in the database, as printable text."""
+    from dedup import format_report
+    groups, comparisons = get_duplicate_index().report()
+    return format_report(groups, comparisons)
+
+@metrics.timed()
+def search_question_bank(text):
+    """Ranked (course, id, question) hits for what the user has typed so far."""
+    import search
+    return search.search_questions(execute_db_query, text)
 
 
 # --- MAIN APPLICATION CLASS (UPDATED) ---
@@ -95,39 +324,69 @@ class QuizApp(tk.Tk):
         container.grid_rowconfigure(0, weight=1)
         container.grid_columnconfigure(0, weight=1)
 
-        self.frames = {}
-        self.quiz_data = {"table_name": None, "questions": [], "score": 0}
+        self.container = container
+        self.frames = {} # Page name -> frame, for the frames built so far
+        self.frame_classes = {F.__name__: F for F in (LoginFrame, QuizSelectionFrame, QuizFrame, ResultsFrame,
+                                                      AdminDashboardFrame, ManageCourseFrame)}
+        self.current_frame = None
+        self.quiz_data = {"table_name": None, "session": None}
 
-        # Add the new Admin frames to the loop
-        for F in (LoginFrame, QuizSelectionFrame, QuizFrame, ResultsFrame, AdminDashboardFrame, ManageCourseFrame):
-            frame = F(container, self)
-            self.frames[F.__name__] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
+        if not LAZY_FRAMES:
+            for page_name in self.frame_classes:
+                self.get_frame(page_name)
 
         self.show_frame("LoginFrame")
+        self.bind("<Control-Shift-M>", lambda event: MetricsWindow(self)) # Not on any menu
+
+    def get_frame(self, page_name):
+        """Returns the frame, building it first if this is the first time it is needed."""
+        frame = self.frames.get(page_name)
+        if frame is None:
+            with metrics.span(f"build {page_name}"):
+                frame = self.frame_classes[page_name](self.container, self)
+                frame.grid(row=0, column=0, sticky="nsew")
+            self.frames[page_name] = frame
+        return frame
 
     def show_frame(self, page_name, **kwargs):
-        """Shows the specified frame and passes optional data."""
+        """Shows the specified frame (building it on first use) and passes optional data."""
+        frame = self.get_frame(page_name)
         if page_name == "ManageCourseFrame":
-            self.frames[page_name].set_course(kwargs.get("course_name"))
-        
-        frame = self.frames[page_name]
-        frame.tkraise()
-        if hasattr(frame, 'on_show'): # Call on_show method if it exists
-            frame.on_show()
+            frame.set_course(kwargs.get("course_name"))
+
+        if self.current_frame is not None and self.current_frame is not frame:
+            db_executor.cancel_owner(self.current_frame) # Drop loads the user walked away from
+        self.current_frame = frame
+        metrics.set_frame(page_name)
+        with metrics.span(f"show_frame {page_name}"):
+            frame.tkraise()
+            if hasattr(frame, 'on_show'): # Call on_show method if it exists
+                frame.on_show()
 
     def start_quiz(self, table_name):
-        """Loads quiz data and shows the quiz frame."""
+        """Loads quiz data in the background, then shows the quiz frame."""
+        selection_frame = self.get_frame("QuizSelectionFrame")
+        if db_executor.pending(selection_frame):
+            return # A quiz is already loading
+        selection_frame.set_status(f"Loading '{table_name}'...")
+        started = time.perf_counter()
+        db_executor.submit(selection_frame, build_quiz_session, table_name, selection_frame.adaptive.get(),
+                           on_done=lambda session: self.begin_quiz(table_name, session, started),
+                           on_error=selection_frame.on_load_error)
+
+    def begin_quiz(self, table_name, session, started=None):
+        self.get_frame("QuizSelectionFrame").set_status("")
         self.quiz_data["table_name"] = table_name
-        self.quiz_data["questions"] = get_questions(table_name)
-        self.quiz_data["score"] = 0
+        self.quiz_data["session"] = session
         
-        if not self.quiz_data["questions"]:
+        if not session.total:
              messagebox.showerror("Error", "No questions could be loaded for this quiz.")
              return
 
-        self.frames["QuizFrame"].load_new_quiz()
+        self.get_frame("QuizFrame").load_new_quiz()
         self.show_frame("QuizFrame")
+        if started is not None: # From the quiz button to the first question, worker thread included
+            metrics.record("start_quiz", time.perf_counter() - started)
 
 
 # --- GUI FRAMES (SCREENS) ---
@@ -151,6 +410,7 @@ class LoginFrame(tk.Frame):
     
     def admin_login(self):
         """Prompts for admin password."""
+        from tkinter import simpledialog
         password = simpledialog.askstring("Password", "Enter Admin Password:", show='*')
         if password == ADMIN_PASSWORD:
             self.controller.show_frame("AdminDashboardFrame")
@@ -159,7 +419,13 @@ class LoginFrame(tk.Frame):
 
 
 class QuizSelectionFrame(tk.Frame):
-    """Screen for students to select a quiz."""
+    """Screen for students to select a quiz.
+
+    Course buttons are kept between visits. A refresh only adds or removes
+    buttons for courses that changed, reusing hidden buttons from a spare
+    pool. Past COURSE_BUTTON_LIMIT courses a searchable list replaces the
+    buttons; a Listbox is one widget and only draws the lines in view.
+    """
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
@@ -168,6 +434,19 @@ class QuizSelectionFrame(tk.Frame):
         
         self.quiz_buttons_frame = tk.Frame(self)
         self.quiz_buttons_frame.pack(pady=10)
+        self.empty_label = tk.Label(self.quiz_buttons_frame, text="No quizzes found.", font=("Arial", 14))
+        self.courses = None # Course names on screen, None until the first load
+        self.labels = {} # Course name -> text shown for it (see course_label)
+        self.buttons = {} # Course name -> its button, in display order
+        self.spare_buttons = [] # Hidden buttons waiting to be reused
+        self.course_list = None # Searchable list for many courses, built when first needed
+
+        self.adaptive = tk.BooleanVar(value=ADAPTIVE_QUIZ)
+        tk.Checkbutton(self, text="Adaptive quiz (questions match your level; stops once the score is reliable)",
+                       variable=self.adaptive, font=("Arial", 12)).pack(pady=(0, 10))
+
+        self.status_label = tk.Label(self, text="", font=("Arial", 12), fg="gray")
+        self.status_label.pack()
 
         back_button = tk.Button(self, text="< Back to Login", command=lambda: controller.show_frame("LoginFrame"))
         back_button.pack(pady=(20, 0))
@@ -176,85 +455,252 @@ class QuizSelectionFrame(tk.Frame):
         """Called every time the frame is shown to refresh the list."""
         self.update_quiz_list()
         
-    def update_quiz_list(self):
-        for widget in self.quiz_buttons_frame.winfo_children():
-            widget.destroy()
+    def set_status(self, text):
+        self.status_label.config(text=text)
 
-        tables = get_quiz_tables()
-        if not tables:
-             tk.Label(self.quiz_buttons_frame, text="No quizzes found.", font=("Arial", 14)).pack()
+    def on_load_error(self, error):
+        self.set_status("")
+        if isinstance(error, InvalidQuestionError):
+            messagebox.showerror("Data Error", str(error))
         else:
-            for table_name in tables:
-                button = tk.Button(self.quiz_buttons_frame, text=table_name, font=("Arial", 16),
-                                   command=lambda t=table_name: self.controller.start_quiz(t))
-                button.pack(pady=10)
-
+            show_db_error(error)
 
-class QuizFrame(tk.Frame):
-    """The main screen for taking the quiz."""
-    def __init__(self, parent, controller):
+    def update_quiz_list(self):
+        if self.courses is None:
+            self.set_status("Loading quizzes...")
+        db_executor.submit(self, get_quiz_courses, on_done=self.show_quiz_list, on_error=self.on_load_error)
+
+    def show_quiz_list(self, entries):
+        self.set_status("")
+        tables = [entry[0] for entry in entries]
+        labels = {entry[0]: course_label(entry) for entry in entries}
+        if tables == self.courses and labels == self.labels:
+            return # Nothing changed, so nothing is redrawn
+        self.courses, self.labels = tables, labels
+        if len(tables) > COURSE_BUTTON_LIMIT:
+            self.show_buttons([])
+            self.show_course_list()
+        else:
+            if self.course_list is not None:
+                self.course_list.pack_forget()
+            self.show_buttons(tables)
+        if tables:
+            self.empty_label.pack_forget()
+        else:
+            self.empty_label.pack()
+
+    def show_buttons(self, courses):
+        """Makes the buttons match `courses`, touching only those that changed."""
+        wanted = set(courses)
+        for name in [name for name in self.buttons if name not in wanted]:
+            self.recycle(self.buttons.pop(name))
+        if list(self.buttons) != [name for name in courses if name in self.buttons]:
+            for name in list(self.buttons): # Reordered, so pack them all again
+                self.recycle(self.buttons.pop(name))
+
+        first_kept = next(iter(self.buttons.values()), None)
+        buttons, previous = {}, None
+        for name in courses:
+            button = self.buttons.get(name)
+            if button is not None and button.label != self.labels[name]:
+                button.label = self.labels[name] # Only its question count changed
+                button.config(text=button.label)
+            if button is None:
+                button = self.spare_buttons.pop() if self.spare_buttons else self.new_button()
+                button.course, button.label = name, self.labels[name]
+                button.config(text=button.label)
+                if previous is not None:
+                    button.pack(pady=10, after=previous)
+                elif first_kept is not None:
+                    button.pack(pady=10, before=first_kept)
+                else:
+                    button.pack(pady=10)
+            buttons[name] = button
+            previous = button
+        self.buttons = buttons
+
+    def new_button(self):
+        button = tk.Button(self.quiz_buttons_frame, font=("Arial", 16))
+        # Reads the course when clicked, so a recycled button needs no new Tcl callback
+        button.config(command=lambda: self.controller.start_quiz(button.course))
+        return button
+
+    def recycle(self, button):
+        button.pack_forget()
+        self.spare_buttons.append(button)
+
+    # --- SEARCHABLE LIST (many courses) ---
+
+    def show_course_list(self):
+        if self.course_list is None:
+            self.build_course_list()
+        self.course_list.pack(after=self.quiz_buttons_frame, fill="both", expand=True, padx=60)
+        self.filter_courses()
+
+    def build_course_list(self):
+        self.course_list = tk.Frame(self)
+        self.course_filter = tk.StringVar(self)
+        tk.Entry(self.course_list, textvariable=self.course_filter, font=("Arial", 14)).pack(fill="x")
+        self.list_count = tk.Label(self.course_list, text="", font=("Arial", 10), fg="gray", anchor="w")
+        self.list_count.pack(fill="x")
+        box_frame = tk.Frame(self.course_list)
+        box_frame.pack(fill="both", expand=True)
+        self.course_box = tk.Listbox(box_frame, font=("Arial", 14), height=10, activestyle="dotbox")
+        scrollbar = tk.Scrollbar(box_frame, orient=tk.VERTICAL, command=self.course_box.yview)
+        self.course_box.config(yscrollcommand=scrollbar.set)
+        self.course_box.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        tk.Button(self.course_list, text="Start Quiz", font=("Arial", 14),
+                  command=self.start_selected).pack(pady=(5, 0))
+        self.course_box.bind("<Double-1>", lambda event: self.start_selected())
+        self.course_box.bind("<Return>", lambda event: self.start_selected())
+        self.listed = [] # Courses currently in the Listbox, in order
+        self.listed_labels = None # The labels they were listed with
+        self.course_filter.trace_add("write", lambda *_: self.filter_courses())
+
+    def filter_courses(self):
+        text = self.course_filter.get().strip().lower()
+        listed = [name for name in self.courses if text in self.labels[name].lower()] if text else self.courses
+        if listed != self.listed or self.listed_labels is not self.labels:
+            self.course_box.delete(0, tk.END)
+            if listed:
+                self.course_box.insert(tk.END, *(self.labels[name] for name in listed))
+            self.listed, self.listed_labels = listed, self.labels
+        self.list_count.config(text=f"{len(listed)} of {len(self.courses)} courses (type to search)")
+
+    def start_selected(self):
+        selection = self.course_box.curselection()
+        if selection:
+            self.controller.start_quiz(self.listed[selection[0]])
+
+
+class QuestionPanel(tk.Frame):
+    """One question and its four options. QuizFrame stacks two and fills the hidden one ahead of time."""
+    def __init__(self, parent, selected_option):
         super().__init__(parent)
-        self.controller = controller
-        
         self.question_number_label = tk.Label(self, text="", font=("Arial", 16))
         self.question_number_label.pack(pady=20)
 
         self.question_label = tk.Label(self, text="", font=("Arial", 18, "bold"), wraplength=700)
         self.question_label.pack(pady=20, padx=20)
 
-        self.selected_option = tk.StringVar()
         self.option_buttons = []
         options_frame = tk.Frame(self)
         options_frame.pack(pady=20)
 
         for i in range(4):
-            btn = tk.Radiobutton(options_frame, text="", variable=self.selected_option, 
-                                 value="", font=("Arial", 14), indicatoron=0, 
+            btn = tk.Radiobutton(options_frame, text="", variable=selected_option, 
+                                 value=i, font=("Arial", 14), indicatoron=0, 
                                  width=40, padx=20, pady=10)
             btn.pack(pady=5)
             self.option_buttons.append(btn)
+        self.shows = None # (session, index) currently drawn on this panel
+
+    def fill(self, session, index):
+        """Draws question `index` of `session`; only label texts change, so this is cheap."""
+        question = session.questions[index]
+        if session.adaptive:
+            self.question_number_label.config(text=f"Question {index + 1} (at most {session.total})")
+        else:
+            self.question_number_label.config(text=f"Question {index + 1}/{session.total}")
+        self.question_label.config(text=question.text)
+        for button, option_text in zip(self.option_buttons, question.options):
+            button.config(text=option_text)
+        self.shows = (session, index)
+
+
+class QuizFrame(tk.Frame):
+    """The main screen for taking the quiz.
+
+    Two QuestionPanels sit in the same grid cell. While the student reads
+    question N on the front one, N+1 is drawn on the hidden one, so moving
+    on is a tkraise() swap. Adaptive quizzes only know N+1 after the answer,
+    so the follow-up to either answer is picked and fetched on a worker
+    thread instead (AdaptiveSession.prepare_next).
+    """
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+
+        self.selected_option = tk.IntVar(value=-1) # Index of the chosen option, -1 for none
+        panels = tk.Frame(self)
+        panels.pack()
+        self.front = QuestionPanel(panels, self.selected_option)
+        self.back = QuestionPanel(panels, self.selected_option)
+        for panel in (self.front, self.back):
+            panel.grid(row=0, column=0, sticky="nsew")
 
         self.submit_button = tk.Button(self, text="Submit Answer", font=("Arial", 16), command=self.next_question)
         self.submit_button.pack(pady=30)
-        self.correct_answer_text = ""
+        self.session = None
+        self.transitions = [] # (question number, milliseconds from Submit to the next question drawn, how)
 
+    @metrics.timed()
     def load_new_quiz(self):
-        self.current_question_index = 0
+        self.session = self.controller.quiz_data["session"]
+        self.transitions = []
+        get_attempt_log().start(self.session)
+        self.front.shows = self.back.shows = None
         self.display_current_question()
 
     def display_current_question(self):
-        questions = self.controller.quiz_data["questions"]
-        if self.current_question_index < len(questions):
-            q_id, q_text, opt_a, opt_b, opt_c, opt_d, correct_letter = questions[self.current_question_index]
-            answer_map = {'A': opt_a, 'B': opt_b, 'C': opt_c, 'D': opt_d}
-            clean_letter = correct_letter.strip().upper()
-            self.correct_answer_text = answer_map.get(clean_letter)
-            
-            if self.correct_answer_text is None:
-                messagebox.showerror("Data Error", f"Invalid correct answer ('{correct_letter}')")
-                self.controller.show_frame("QuizSelectionFrame")
-                return
-
-            self.question_number_label.config(text=f"Question {self.current_question_index + 1}/{len(questions)}")
-            self.question_label.config(text=q_text)
-            options = [opt_a, opt_b, opt_c, opt_d]
-            self.selected_option.set(None)
-            for i, option_text in enumerate(options):
-                self.option_buttons[i].config(text=option_text, value=option_text)
-        else:
+        """Shows the current question, swapping in the pre-drawn panel when it is ready."""
+        if self.session.current is None:
+            self.log_summary()
             self.controller.show_frame("ResultsFrame")
+            return "finished"
+        how = "swapped"
+        if self.back.shows != (self.session, self.session.index):
+            how = "prefetched" if self.session.adaptive and self.session.used_prepared else "drawn"
+            self.back.fill(self.session, self.session.index)
+        self.front, self.back = self.back, self.front
+        self.front.tkraise()
+        self.selected_option.set(-1)
+        self.session.mark_shown()
+        self.after_idle(self.prepare_next) # Once the new question is on screen
+        return how
+
+    def prepare_next(self):
+        """Gets question N+1 ready while the student reads question N."""
+        session = self.session
+        if session is None or session.current is None:
+            return
+        if not session.adaptive:
+            if session.index + 1 < len(session.questions):
+                self.back.fill(session, session.index + 1)
+            return
+        db_executor.submit(self, session.prepare_next,
+                           on_done=lambda prepared: session.use_prepared(prepared),
+                           on_error=lambda error: None) # Falls back to picking after the answer
 
     def next_question(self):
-        selected_answer = self.selected_option.get()
-        if not selected_answer:
+        choice = self.selected_option.get()
+        if choice < 0:
             messagebox.showwarning("No Selection", "Please select an answer.")
             return
 
-        if selected_answer.strip().lower() == self.correct_answer_text.strip().lower():
-            self.controller.quiz_data["score"] += 1
-        
-        self.current_question_index += 1
-        self.display_current_question()
+        started = time.perf_counter()
+        self.session.answer(choice)
+        get_attempt_log().answered(self.session)
+        self.session.advance()
+        number = self.session.index + 1
+        how = self.display_current_question()
+        if how != "finished":
+            # Idle callbacks run after Tk has redrawn, so this times what the student waits for
+            self.after_idle(lambda: self.log_transition(number, started, how))
+
+    def log_transition(self, number, started, how):
+        elapsed = (time.perf_counter() - started) * 1000
+        self.transitions.append((number, elapsed, how))
+        metrics.record(f"next question ({how})", elapsed / 1000)
+        log.info("question %d shown %.1f ms after submit (%s)", number, elapsed, how)
+
+    def log_summary(self):
+        if not self.transitions:
+            return
+        times = sorted(elapsed for _, elapsed, _ in self.transitions)
+        log.info("quiz transitions: %d, median %.1f ms, slowest %.1f ms",
+                 len(times), times[len(times) // 2], times[-1])
 
 
 class ResultsFrame(tk.Frame):
@@ -268,10 +714,14 @@ class ResultsFrame(tk.Frame):
                   command=lambda: controller.show_frame("QuizSelectionFrame")).pack(pady=20)
     
     def on_show(self):
-        score = self.controller.quiz_data["score"]
-        total = len(self.controller.quiz_data["questions"])
-        score_out_of_10 = round((score / total) * 10, 1) if total > 0 else 0
-        self.score_label.config(text=f"You scored {score} out of {total}.\n\nYour final score is: {score_out_of_10} / 10")
+        session = self.controller.quiz_data["session"]
+        score, total = session.score, session.total
+        score_out_of_10 = session.score_out_of(10)
+        get_attempt_log().finish(session)
+        text = f"You scored {score} out of {total}.\n\nYour final score is: {score_out_of_10} / 10"
+        if session.adaptive: # Scored on the level reached, not the share right, which adapting keeps near half
+            text += "\n(estimated from your level across the whole course)"
+        self.score_label.config(text=text)
 
 
 # --- NEW ADMIN FRAMES ---
@@ -286,30 +736,159 @@ class AdminDashboardFrame(tk.Frame):
         tk.Button(self, text="Add New Course", font=("Arial", 16), command=self.add_course).pack(pady=10)
         tk.Button(self, text="Add New Question", font=("Arial", 16), command=self.add_question).pack(pady=10)
         tk.Button(self, text="Manage Existing Course", font=("Arial", 16), command=self.manage_course).pack(pady=10)
+        tk.Button(self, text="Search Questions", font=("Arial", 16), command=self.search_questions).pack(pady=10)
+        tk.Button(self, text="Duplicate Question Report", font=("Arial", 14), command=self.show_duplicates).pack(pady=5)
+        tk.Button(self, text="Excluded Question Report", font=("Arial", 14), command=self.show_excluded).pack(pady=5)
+        tk.Button(self, text="Import Questions (CSV/JSONL)", font=("Arial", 14), command=self.import_file).pack(pady=5)
+        tk.Button(self, text="Export Questions (CSV/JSONL)", font=("Arial", 14), command=self.export_file).pack(pady=5)
+        self.status_label = tk.Label(self, text="", font=("Arial", 12), fg="gray")
+        self.status_label.pack()
         tk.Button(self, text="< Logout", font=("Arial", 14), command=lambda: controller.show_frame("LoginFrame")).pack(pady=(30,0))
     
     def add_course(self):
+        from tkinter import simpledialog
         course_name = simpledialog.askstring("New Course", "Enter the name for the new course (table):")
         if course_name:
-            if create_new_course(course_name):
-                messagebox.showinfo("Success", f"Course '{course_name}' created successfully.")
-            else:
-                messagebox.showerror("Error", f"Could not create course '{course_name}'. It may already exist.")
+            db_executor.submit(self, create_new_course, course_name,
+                               on_done=lambda created: self.course_created(course_name, created))
+
+    def course_created(self, course_name, created):
+        if created:
+            messagebox.showinfo("Success", f"Course '{course_name}' created successfully.")
+        else:
+            messagebox.showerror("Error", f"Could not create course '{course_name}'. It may already exist.")
     
     def add_question(self):
         AddQuestionWindow(self) # Opens a new Toplevel window for adding a question
+
+    def search_questions(self):
+        SearchWindow(self, self.controller)
+
+    def show_duplicates(self):
+        self.status_label.config(text="Looking for duplicate questions...")
+        db_executor.submit(self, duplicate_report, on_done=self.duplicates_found, on_error=self.file_failed)
+
+    def duplicates_found(self, text):
+        self.show_report("Duplicate Question Report", text)
+
+    def show_excluded(self):
+        self.status_label.config(text="Checking questions...")
+        db_executor.submit(self, excluded_question_report,
+                           on_done=lambda text: self.show_report("Excluded Question Report", text),
+                           on_error=self.file_failed)
+
+    def show_report(self, title, text):
+        self.status_label.config(text="")
+        window = tk.Toplevel(self)
+        window.title(title)
+        report = tk.Text(window, wrap="word", width=90, height=30)
+        report.insert("1.0", text)
+        report.config(state="disabled")
+        report.pack(fill="both", expand=True)
+
+    def import_file(self):
+        from tkinter import simpledialog, filedialog
+        course = simpledialog.askstring("Import Questions", "Import into which course? (created if missing)")
+        if not course:
+            return
+        path = filedialog.askopenfilename(title="Choose a question file",
+                                          filetypes=[("Question files", "*.csv *.jsonl"), ("All files", "*.*")])
+        if path:
+            self.status_label.config(text=f"Importing into '{course}'...")
+            db_executor.submit(self, import_question_file, course, path,
+                               on_done=self.import_finished, on_error=self.file_failed)
+
+    def import_finished(self, report):
+        self.status_label.config(text="")
+        messagebox.showinfo("Import Complete", report.summary())
+
+    def export_file(self):
+        from tkinter import simpledialog, filedialog
+        course = simpledialog.askstring("Export Questions", "Export which course?")
+        if not course:
+            return
+        path = filedialog.asksaveasfilename(title="Save questions as", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if path:
+            self.status_label.config(text=f"Exporting '{course}'...")
+            db_executor.submit(self, export_question_file, course, path,
+                               on_done=lambda count: self.export_finished(count, path), on_error=self.file_failed)
+
+    def export_finished(self, count, path):
+        self.status_label.config(text="")
+        messagebox.showinfo("Export Complete", f"Exported {count} questions to '{path}'.")
+
+    def file_failed(self, error):
+        self.status_label.config(text="")
+        messagebox.showerror("Error", f"Could not complete the transfer: {error}")
     
     def manage_course(self):
-        courses = get_quiz_tables()
-        if not courses:
+        db_executor.submit(self, get_course_catalog, on_done=self.choose_course)
+
+    def choose_course(self, entries):
+        if not entries:
             messagebox.showinfo("No Courses", "There are no courses to manage yet. Please add a course first.")
             return
-        
-        course = simpledialog.askstring("Select Course", f"Enter course name to manage:\n({', '.join(courses)})")
-        if course and course in courses:
-            self.controller.show_frame("ManageCourseFrame", course_name=course)
-        elif course:
-            messagebox.showerror("Error", f"Course '{course}' not found.")
+        CourseChooser(self, entries,
+                      lambda course: self.controller.show_frame("ManageCourseFrame", course_name=course))
+
+
+class CourseChooser(tk.Toplevel):
+    """Picks a course to manage from the catalog, with its question counts and last change."""
+    def __init__(self, parent, entries, on_choose):
+        super().__init__(parent)
+        self.title("Select Course")
+        self.geometry("560x420")
+        self.entries = entries
+        self.on_choose = on_choose
+        self.filter_text = tk.StringVar(self)
+        entry = tk.Entry(self, textvariable=self.filter_text, font=("Arial", 12))
+        entry.pack(fill="x", padx=10, pady=(10, 0))
+        self.count_label = tk.Label(self, text="", font=("Arial", 10), fg="gray", anchor="w")
+        self.count_label.pack(fill="x", padx=10)
+        box_frame = tk.Frame(self)
+        box_frame.pack(fill="both", expand=True, padx=10)
+        self.box = tk.Listbox(box_frame, font=("Courier", 11), activestyle="dotbox")
+        scrollbar = tk.Scrollbar(box_frame, orient=tk.VERTICAL, command=self.box.yview)
+        self.box.config(yscrollcommand=scrollbar.set)
+        self.box.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        tk.Button(self, text="Manage Course", font=("Arial", 12), command=self.choose).pack(pady=10)
+        self.box.bind("<Double-1>", lambda event: self.choose())
+        self.box.bind("<Return>", lambda event: self.choose())
+        self.filter_text.trace_add("write", lambda *_: self.refresh())
+        self.listed = []
+        self.refresh()
+        entry.focus_set()
+
+    @staticmethod
+    def describe(entry):
+        name, display_name, count, valid_count, modified_at = entry
+        line = f"{display_name:<24}"
+        if count is not None:
+            line += f" {count:>6} question{'' if count == 1 else 's'}"
+        if valid_count is not None and valid_count != count:
+            line += f", {count - valid_count} excluded"
+        if modified_at:
+            line += f"  (changed {time.strftime('%Y-%m-%d', time.localtime(modified_at))})"
+        return line
+
+    def refresh(self):
+        text = self.filter_text.get().strip().lower()
+        self.listed = [entry for entry in self.entries
+                       if not text or text in entry[0].lower() or text in entry[1].lower()]
+        self.box.delete(0, tk.END)
+        if self.listed:
+            self.box.insert(tk.END, *(self.describe(entry) for entry in self.listed))
+            self.box.selection_set(0)
+        self.count_label.config(text=f"{len(self.listed)} of {len(self.entries)} courses (type to search)")
+
+    def choose(self):
+        selection = self.box.curselection()
+        if selection:
+            course = str(self.listed[selection[0]][0]) # Tk may hand back numbers
+            self.destroy()
+            self.on_choose(course)
 
 
 class ManageCourseFrame(tk.Frame):
@@ -324,13 +903,31 @@ class ManageCourseFrame(tk.Frame):
         left_frame.pack(side="left", fill="both", expand=True, padx=10, pady=10)
 
         tk.Label(left_frame, text="Questions", font=("Arial", 16)).pack()
-        cols = ('id', 'question')
-        self.tree = ttk.Treeview(left_frame, columns=cols, show='headings')
-        self.tree.heading('id', text='ID')
-        self.tree.heading('question', text='Question')
-        self.tree.column('id', width=50, anchor='center')
+        cols = ('id', 'question', 'right', 'discrimination', 'distractor', 'time')
+        # Only the visible rows are fetched and turned into Tk items, however big the course is
+        self.list_status = tk.StringVar()
+        self.stats = {} # Question id -> analytics for the rows fetched so far
+        from virtualtree import VirtualTreeview # Pulls in ttk, which students never need
+        from analytics import format_stats
+        self.tree = VirtualTreeview(left_frame, cols,
+                                    fetch_page=self.fetch_page,
+                                    count_rows=lambda: count_questions_for_course(self.course_name),
+                                    seek=lambda offset: get_question_id_before(self.course_name, offset),
+                                    row_values=lambda q: (q[0], q[1]) + format_stats(self.stats.get(q[0]), q[6]),
+                                    status_var=self.list_status,
+                                    executor=db_executor, owner=self)
+        self.tree.tree.heading('id', text='ID')
+        self.tree.tree.heading('question', text='Question')
+        self.tree.tree.heading('right', text='% Right')
+        self.tree.tree.heading('discrimination', text='Discrim.')
+        self.tree.tree.heading('distractor', text='Top Wrong')
+        self.tree.tree.heading('time', text='Avg Time')
+        self.tree.tree.column('id', width=50, anchor='center')
+        for col, width in (('right', 60), ('discrimination', 65), ('distractor', 75), ('time', 65)):
+            self.tree.tree.column(col, width=width, stretch=False, anchor='center')
         self.tree.pack(fill="both", expand=True)
-        self.tree.bind('<<TreeviewSelect>>', self.on_item_select)
+        self.tree.tree.bind('<<TreeviewSelect>>', self.on_item_select, add="+")
+        tk.Label(left_frame, textvariable=self.list_status, anchor='w').pack(fill='x')
 
         # --- Right side: Editor ---
         right_frame = tk.Frame(self)
@@ -361,38 +958,45 @@ class ManageCourseFrame(tk.Frame):
         self.course_name = course_name
 
     def on_show(self):
-        """Refreshes the question list when the frame is shown."""
+        """Refreshes the statistics, then the question list, when the frame is shown."""
         self.controller.title(f"Managing: {self.course_name}")
-        self.load_questions()
+        db_executor.submit(self, refresh_question_stats,
+                           on_done=lambda folded: self.load_questions(),
+                           on_error=lambda error: self.load_questions()) # Show the list, with older stats
 
+    @metrics.timed()
     def load_questions(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        
-        questions = get_all_questions_for_course(self.course_name)
-        if questions:
-            for q in questions:
-                self.tree.insert('', 'end', values=(q[0], q[1]), iid=q[0])
+        self.stats = {}
+        self.tree.reload()
         self.clear_entries()
 
+    @metrics.timed()
+    def fetch_page(self, after_id, limit):
+        """A page of questions plus their statistics; runs on a worker thread."""
+        course_name = self.course_name
+        rows = get_question_page(course_name, after_id, limit)
+        if rows:
+            self.stats.update(get_question_stats(course_name, [row[0] for row in rows]))
+        return rows
+
     def on_item_select(self, event):
         selected_items = self.tree.selection()
-        if not selected_items:
-            return
+        if not selected_items or selected_items[0] == self.selected_question_id:
+            return # Nothing new selected (the list re-selects rows as it scrolls)
         
         self.selected_question_id = selected_items[0]
-        question_data = get_all_questions_for_course(self.course_name)
-        
-        for q in question_data:
-            if str(q[0]) == self.selected_question_id:
-                # q is (id, question, opt_a, opt_b, opt_c, opt_d, correct)
-                self.entries["question"].delete(0, tk.END); self.entries["question"].insert(0, q[1])
-                self.entries["opt_a"].delete(0, tk.END); self.entries["opt_a"].insert(0, q[2])
-                self.entries["opt_b"].delete(0, tk.END); self.entries["opt_b"].insert(0, q[3])
-                self.entries["opt_c"].delete(0, tk.END); self.entries["opt_c"].insert(0, q[4])
-                self.entries["opt_d"].delete(0, tk.END); self.entries["opt_d"].insert(0, q[5])
-                self.entries["correct"].delete(0, tk.END); self.entries["correct"].insert(0, q[6])
-                break
+        db_executor.submit(self, get_question, self.course_name, self.selected_question_id,
+                           on_done=self.fill_entries)
+
+    def fill_entries(self, q):
+        if q and str(q[0]) == self.selected_question_id: # Ignore answers for a row no longer selected
+            # q is (id, question, opt_a, opt_b, opt_c, opt_d, correct)
+            self.entries["question"].delete(0, tk.END); self.entries["question"].insert(0, q[1])
+            self.entries["opt_a"].delete(0, tk.END); self.entries["opt_a"].insert(0, q[2])
+            self.entries["opt_b"].delete(0, tk.END); self.entries["opt_b"].insert(0, q[3])
+            self.entries["opt_c"].delete(0, tk.END); self.entries["opt_c"].insert(0, q[4])
+            self.entries["opt_d"].delete(0, tk.END); self.entries["opt_d"].insert(0, q[5])
+            self.entries["correct"].delete(0, tk.END); self.entries["correct"].insert(0, q[6])
 
     def save_changes(self):
         if not self.selected_question_id:
@@ -401,31 +1005,56 @@ class ManageCourseFrame(tk.Frame):
 
         q_data = {key: entry.get() for key, entry in self.entries.items()}
         if all(q_data.values()): # Check if any field is empty
-            if update_question(self.course_name, self.selected_question_id, q_data):
-                messagebox.showinfo("Success", "Question updated successfully.")
-                self.load_questions() # Refresh list
-            else:
-                messagebox.showerror("Error", "Failed to update question.")
+            q_id = self.selected_question_id
+            db_executor.submit(self, update_question, self.course_name, q_id, q_data,
+                               on_done=lambda updated: self.question_saved(q_id, q_data, updated))
         else:
             messagebox.showwarning("Warning", "All fields must be filled.")
 
+    def question_saved(self, q_id, q_data, updated):
+        if updated:
+            messagebox.showinfo("Success", "Question updated successfully.")
+            # Patch the one row in place instead of re-reading the whole course
+            self.tree.update_row((int(q_id),) + _question_params(q_data))
+        else:
+            self.question_missing(q_id)
+
     def delete_selected_question(self):
         if not self.selected_question_id:
             messagebox.showwarning("Warning", "No question selected to delete.")
             return
 
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this question?"):
-            if delete_question(self.course_name, self.selected_question_id):
-                messagebox.showinfo("Success", "Question deleted.")
-                self.load_questions() # Refresh list
-            else:
-                messagebox.showerror("Error", "Failed to delete question.")
+            q_id = self.selected_question_id
+            db_executor.submit(self, delete_question, self.course_name, q_id,
+                               on_done=lambda deleted: self.question_deleted(q_id, deleted))
+
+    def question_deleted(self, q_id, deleted):
+        if deleted:
+            messagebox.showinfo("Success", "Question deleted.")
+            self.tree.remove_row(int(q_id))
+            if self.selected_question_id == q_id:
+                self.clear_entries()
+        else:
+            self.question_missing(q_id)
+
+    def question_missing(self, q_id):
+        """The question was deleted elsewhere (another window or program) since it was listed."""
+        messagebox.showerror("Not Found", "That question no longer exists; it may have been deleted elsewhere.")
+        self.tree.remove_row(int(q_id))
+        if self.selected_question_id == q_id:
+            self.clear_entries()
     
     def clear_entries(self):
         for entry in self.entries.values():
             entry.delete(0, tk.END)
         self.selected_question_id = None
 
+    def edit_question(self, q_id):
+        """Opens one question in the editor, e.g. a search hit that is not on the visible page."""
+        self.selected_question_id = str(q_id)
+        db_executor.submit(self, get_question, self.course_name, q_id, on_done=self.fill_entries)
+
 
 class AddQuestionWindow(tk.Toplevel):
     """A Toplevel window for adding a new question."""
@@ -433,16 +1062,11 @@ class AddQuestionWindow(tk.Toplevel):
         super().__init__(parent)
         self.title("Add New Question")
 
-        courses = get_quiz_tables()
-        if not courses:
-            messagebox.showerror("Error", "No courses exist. Please create a course first.", parent=self)
-            self.destroy()
-            return
-            
         tk.Label(self, text="Select Course:").pack(padx=10, pady=(10,0))
         self.course_var = tk.StringVar(self)
-        self.course_var.set(courses[0])
-        tk.OptionMenu(self, self.course_var, *courses).pack(padx=10, pady=5)
+        self.course_frame = tk.Frame(self)
+        self.course_frame.pack(padx=10, pady=5)
+        tk.Label(self.course_frame, text="Loading courses...", fg="gray").pack()
         
         self.entries = {}
         fields = ["Question", "Option A", "Option B", "Option C", "Option D", "Correct Answer (A-D)"]
@@ -453,24 +1077,269 @@ class AddQuestionWindow(tk.Toplevel):
             entry.pack(padx=10, pady=2, fill='x')
             self.entries[keys[i]] = entry
             
-        tk.Button(self, text="Submit Question", command=self.submit).pack(pady=20)
+        self.submit_button = tk.Button(self, text="Submit Question", command=self.submit, state="disabled")
+        self.submit_button.pack(pady=(20, 0))
+        self.status_label = tk.Label(self, text="", fg="gray")
+        self.status_label.pack(pady=(0, 10))
+        db_executor.submit(self, get_quiz_tables, on_done=self.show_courses)
+        # Catch the duplicate index up now, so the check on submit is instant
+        db_executor.submit(self, get_duplicate_index().ensure_synced, on_error=None)
+
+    def show_courses(self, courses):
+        if not self.winfo_exists():
+            return
+        if not courses:
+            messagebox.showerror("Error", "No courses exist. Please create a course first.", parent=self)
+            self.destroy()
+            return
+
+        for widget in self.course_frame.winfo_children():
+            widget.destroy()
+        self.course_var.set(courses[0])
+        tk.OptionMenu(self.course_frame, self.course_var, *courses).pack()
+        self.submit_button.config(state="normal")
 
     def submit(self):
         q_data = {key: entry.get() for key, entry in self.entries.items()}
         table_name = self.course_var.get()
         
         if all(q_data.values()):
-            if add_question(table_name, q_data):
-                messagebox.showinfo("Success", "Question added successfully.", parent=self)
-                self.destroy()
-            else:
-                messagebox.showerror("Error", "Failed to add question.", parent=self)
+            self.submit_button.config(state="disabled")
+            self.status_label.config(text="Checking for similar questions...")
+            db_executor.submit(self, find_duplicate_questions, q_data['question'],
+                               on_done=lambda hits: self.confirm_unique(table_name, q_data, hits),
+                               on_error=self.add_failed)
         else:
             messagebox.showwarning("Incomplete", "All fields are required.", parent=self)
 
+    def confirm_unique(self, table_name, q_data, hits):
+        if not self.winfo_exists():
+            return
+        self.status_label.config(text="")
+        if hits:
+            listing = "\n".join(f"- [{course} #{row[0]}] {row[1]} ({similarity:.0%} alike)"
+                                for similarity, course, row in hits)
+            if not messagebox.askyesno("Possible Duplicate",
+                                       f"These questions already look very similar:\n\n{listing}\n\nAdd it anyway?",
+                                       parent=self):
+                self.submit_button.config(state="normal")
+                return
+        db_executor.submit(self, add_question, table_name, q_data,
+                           on_done=self.question_added, on_error=self.add_failed)
+
+    def add_failed(self, error):
+        if self.winfo_exists():
+            self.submit_button.config(state="normal")
+            self.status_label.config(text="")
+        show_db_error(error)
+
+    def question_added(self, q_id):
+        if not self.winfo_exists():
+            return
+        if q_id:
+            messagebox.showinfo("Success", "Question added successfully.", parent=self)
+            self.destroy()
+        else:
+            self.submit_button.config(state="normal")
+            messagebox.showerror("Error", "Failed to add question.", parent=self)
+
+
+class SearchWindow(tk.Toplevel):
+    """Search-as-you-type over every course; double-click a hit to edit it."""
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.title("Search Questions")
+        self.geometry("700x400")
+        self.pending_search = None
+        from tkinter import ttk
+
+        self.query_var = tk.StringVar(self)
+        self.entry = tk.Entry(self, textvariable=self.query_var, font=("Arial", 14), state="disabled")
+        self.entry.pack(fill='x', padx=10, pady=10)
+        self.status_label = tk.Label(self, text="Preparing search index...", fg="gray", anchor='w')
+        self.status_label.pack(fill='x', padx=10)
+
+        self.results = ttk.Treeview(self, columns=('course', 'id', 'question'), show='headings')
+        self.results.heading('course', text='Course')
+        self.results.heading('id', text='ID')
+        self.results.heading('question', text='Question')
+        self.results.column('course', width=100)
+        self.results.column('id', width=50, anchor='center')
+        self.results.column('question', width=500)
+        self.results.pack(fill='both', expand=True, padx=10, pady=10)
+        self.results.bind('<Double-1>', self.open_hit)
+
+        self.query_var.trace_add('write', self.on_type)
+        db_executor.submit(self, ensure_search_index, on_done=self.index_ready, on_error=self.search_failed)
+
+    def index_ready(self, _):
+        if self.winfo_exists():
+            self.entry.config(state="normal")
+            self.entry.focus_set()
+            self.status_label.config(text="Type to search questions and options in every course.")
+
+    def on_type(self, *_):
+        # Wait for a pause in typing instead of querying on every keystroke
+        if self.pending_search is not None:
+            self.after_cancel(self.pending_search)
+        self.pending_search = self.after(SEARCH_DELAY_MS, self.run_search)
+
+    def run_search(self):
+        self.pending_search = None
+        text = self.query_var.get()
+        db_executor.cancel_owner(self) # Older keystrokes are no longer interesting
+        if not text.strip():
+            self.show_hits(text, [], 0)
+            return
+        def timed_search():
+            start = time.perf_counter()
+            return search_question_bank(text), time.perf_counter() - start
+        db_executor.submit(self, timed_search, on_done=lambda result: self.show_hits(text, *result),
+                           on_error=self.search_failed)
+
+    def show_hits(self, text, hits, seconds):
+        if not self.winfo_exists() or text != self.query_var.get():
+            return # The user kept typing; a newer search is on its way
+        self.results.delete(*self.results.get_children())
+        for course, q_id, question in hits:
+            self.results.insert('', 'end', values=(course, q_id, question))
+        if getattr(hits, "capped", False):
+            from search import RANK_CAP
+            self.status_label.config(text=f"Best {len(hits)} of the first {RANK_CAP:,} matches "
+                                          f"({seconds * 1000:.1f} ms); type another word to rank them all")
+        elif text.strip():
+            self.status_label.config(text=f"{len(hits)} matches in {seconds * 1000:.1f} ms")
+        else:
+            self.status_label.config(text="")
+
+    def search_failed(self, error):
+        if self.winfo_exists():
+            self.status_label.config(text=f"Search failed: {error}")
+
+    def open_hit(self, event):
+        item = self.results.focus()
+        if not item:
+            return
+        course, q_id, _ = self.results.item(item, 'values')
+        self.controller.show_frame("ManageCourseFrame", course_name=course)
+        self.controller.get_frame("ManageCourseFrame").edit_question(int(q_id))
+        self.controller.lift()
+
+
+class MetricsWindow(tk.Toplevel):
+    """Latency percentiles per operation and statements per frame (Ctrl+Shift+M)."""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("Performance")
+        self.geometry("760x420")
+        from tkinter import ttk
+
+        cols = ('operation', 'calls', 'p50', 'p95', 'p99', 'max')
+        self.table = ttk.Treeview(self, columns=cols, show='headings')
+        for col, text, width in zip(cols, ('Operation', 'Calls', 'p50 ms', 'p95 ms', 'p99 ms', 'Max ms'),
+                                    (300, 70, 80, 80, 80, 80)):
+            self.table.heading(col, text=text)
+            self.table.column(col, width=width, anchor='w' if col == 'operation' else 'e')
+        self.table.pack(fill='both', expand=True, padx=10, pady=(10, 0))
+        self.statements_label = tk.Label(self, text="", anchor='w', justify='left', fg="gray")
+        self.statements_label.pack(fill='x', padx=10, pady=5)
+
+        btn_frame = tk.Frame(self)
+        btn_frame.pack(pady=(0, 10))
+        tk.Button(btn_frame, text="Refresh", command=self.refresh).pack(side="left", padx=5)
+        tk.Button(btn_frame, text="Reset", command=self.reset).pack(side="left", padx=5)
+        tk.Button(btn_frame, text="Save JSON...", command=self.save).pack(side="left", padx=5)
+        self.refresh()
+
+    def refresh(self):
+        report = metrics.report()
+        self.table.delete(*self.table.get_children())
+        for name, s in report["operations"].items():
+            self.table.insert('', 'end', values=(name, f"{s['count']:,}", f"{s['p50_ms']:.2f}",
+                                                 f"{s['p95_ms']:.2f}", f"{s['p99_ms']:.2f}", f"{s['max_ms']:.2f}"))
+        counts = ", ".join(f"{frame} {count:,}" for frame, count in report["statements_per_frame"].items())
+        self.statements_label.config(text=f"SQL statements per frame over {report['seconds']:.0f}s: {counts or 'none yet'}")
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def save(self):
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(parent=self, title="Save metrics", defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")])
+        if path:
+            metrics.dump(path)
+
+
+# --- STARTUP BENCHMARK ---
+
+def first_paint():
+    """Opens the app, waits until the login screen is on screen and prints the timings as JSON."""
+    import json
+    start = time.perf_counter()
+    app = QuizApp()
+    built = time.perf_counter()
+    while not app.winfo_ismapped():
+        app.update()
+    app.update() # Handles the Expose events, i.e. actually draws
+    painted = time.perf_counter()
+    print(json.dumps({"build": built - start, "paint": painted - start}), flush=True)
+    app.destroy()
+
+def run_startup_benchmark(runs=10):
+    """Launches the app `runs` times with eager and lazy frames and reports time to first paint.
+
+    The wall-clock figure runs from starting the interpreter to the login
+    screen being drawn, so it includes Python's own start-up and every import.
+    """
+    import sys
+    import json
+    import subprocess
+    def percentile(values, fraction):
+        return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+    print(f"{runs} launches each, median / p95 in ms:")
+    for label, flags in (("eager frames", ["--eager"]), ("lazy frames", [])):
+        walls, builds, paints = [], [], []
+        for _ in range(runs):
+            start = time.perf_counter()
+            child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--first-paint"] + flags,
+                                     stdout=subprocess.PIPE, text=True)
+            line = child.stdout.readline()
+            walls.append(time.perf_counter() - start)
+            child.wait()
+            if child.returncode or not line:
+                raise RuntimeError(f"the app exited with status {child.returncode} before drawing a window")
+            timings = json.loads(line)
+            builds.append(timings["build"])
+            paints.append(timings["paint"])
+        print(f"  {label:<13} launch to first paint {percentile(walls, 0.5) * 1000:6.0f} / "
+              f"{percentile(walls, 0.95) * 1000:4.0f}   QuizApp() {percentile(builds, 0.5) * 1000:5.1f} / "
+              f"{percentile(builds, 0.95) * 1000:5.1f}   window drawn {percentile(paints, 0.5) * 1000:5.1f} / "
+              f"{percentile(paints, 0.95) * 1000:5.1f}")
+
 
 # --- RUN THE APPLICATION ---
 
 if __name__ == "__main__":
-    app = QuizApp()
-    app.mainloop()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Quiz Bowl desktop app.")
+    parser.add_argument("--startup-benchmark", type=int, metavar="RUNS", nargs="?", const=10,
+                        help="launch the app repeatedly and report time to first paint")
+    parser.add_argument("--first-paint", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help="build every screen at start-up")
+    args = parser.parse_args()
+    if args.eager:
+        LAZY_FRAMES = False
+
+    if args.startup_benchmark:
+        run_startup_benchmark(args.startup_benchmark)
+    elif args.first_paint:
+        first_paint()
+    else:
+        logging.basicConfig(level=os.environ.get("QUIZ_LOG_LEVEL", "WARNING"),
+                            format="%(asctime)s %(name)s %(levelname)s %(message)s")
+        enable_from_env(metrics) # QUIZ_PROFILE=cpu|memory, QUIZ_METRICS=file.json
+        app = QuizApp()
+        app.mainloop()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ROWS = 100_000 # Enough to keep a 50k-question course fully resident
+
+
+class QuestionCache:
+    """Size-bounded LRU cache of question rows, keyed by (course, id).
+
+    Sits in front of a QuestionStore for the admin editor. Single-question
+    lookups are O(1) dict hits, writes made through this process are applied
+    write-through, and `data_version` (a callable that moves only when
+    another program commits, e.g. ConnectionPool.external_version) is used
+    to notice edits made by other processes, in which case everything is
+    dropped and re-read.
+    The course catalog (names and question counts) is cached the same way.
+    """
+    def __init__(self, store, max_rows=DEFAULT_MAX_ROWS, data_version=None):
+        self.store = store
+        self.max_rows = max_rows
+        self.data_version = data_version
+        self._rows = OrderedDict() # (course_name, id) -> row, least recently used first
+        self._complete = set() # Courses whose every row is currently cached
+        self._catalog = None # QuestionStore.catalog() rows by course name, once read
+        self._version = None
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    # --- CONSISTENCY ---
+
+    def _check_version(self):
+        """Drops everything if the database was changed outside this cache."""
+        if self.data_version is None:
+            return
+        version = self.data_version()
+        if version != self._version:
+            if self._version is not None:
+                self._rows.clear()
+                self._complete.clear()
+                self._catalog = None
+            self._version = version
+
+    def invalidate(self, course_name=None):
+        """Forgets one course, or the whole cache."""
+        with self._lock:
+            self._catalog = None # The course may be new (e.g. created by an import)
+            if course_name is None:
+                self._rows.clear()
+                self._complete.clear()
+                return
+            for key in [key for key in self._rows if key[0] == course_name]:
+                del self._rows[key]
+            self._complete.discard(course_name)
+
+    # --- LRU BOOKKEEPING ---
+
+    def _put(self, course_name, row):
+        key = (course_name, row[0])
+        self._rows[key] = row
+        self._rows.move_to_end(key)
+        while len(self._rows) > self.max_rows:
+            (evicted_course, _), _ = self._rows.popitem(last=False)
+            self._complete.discard(evicted_course)
+
+    # --- READS ---
+
+    def catalog(self):
+        """Returns QuestionStore.catalog(), re-reading it only after the database has changed."""
+        with self._lock:
+            self._check_version()
+            if self._catalog is None:
+                self._catalog = self.store.catalog()
+            else:
+                self.hits += 1
+            return list(self._catalog)
+
+    def list_courses(self):
+        """Returns the course names, re-reading them only after the database has changed."""
+        return [entry[0] for entry in self.catalog()]
+
+    def get_question(self, course_name, q_id):
+        """Returns one row, from memory when possible."""
+        with self._lock:
+            self._check_version()
+            key = (course_name, q_id)
+            row = self._rows.get(key)
+            if row is not None:
+                self._rows.move_to_end(key)
+                self.hits += 1
+                return row
+            self.misses += 1
+            row = self.store.get_question(course_name, q_id)
+            if row:
+                self._put(course_name, row)
+            return row
+
+    def all_questions(self, course_name):
+        """Returns every row of a course ordered by id; served from memory once fully cached."""
+        with self._lock:
+            self._check_version()
+            if course_name in self._complete:
+                self.hits += 1
+                return sorted((row for (course, _), row in self._rows.items() if course == course_name),
+                              key=lambda row: row[0])
+            self.misses += 1
+            rows = self.store.all_questions(course_name)
+            if rows:
+                for row in rows:
+                    self._put(course_name, row)
+                if len(rows) <= self.max_rows:
+                    self._complete.add(course_name)
+            elif rows == []:
+                self._complete.add(course_name)
+            return rows
+
+    def prime(self, course_name, rows):
+        """Adds rows read elsewhere (e.g. a list page) so later single lookups hit memory."""
+        with self._lock:
+            self._check_version()
+            for row in rows:
+                self._put(course_name, row)
+
+    # --- WRITE-THROUGH ---
+
+    def create_course(self, course_name):
+        with self._lock:
+            created = self.store.create_course(course_name)
+            if created:
+                self._catalog = None # One indexed read brings the new course in with its counts
+            return created
+
+    def add_question(self, course_name, params):
+        with self._lock:
+            q_id = self.store.add_question(course_name, params)
+            if q_id:
+                self._put(course_name, (q_id,) + tuple(params))
+                self._catalog = None # Its question count moved
+            return q_id
+
+    def update_question(self, course_name, q_id, params):
+        with self._lock:
+            result = self.store.update_question(course_name, q_id, params)
+            if result:
+                self._put(course_name, (q_id,) + tuple(params))
+                self._catalog = None # Its modified_at moved (quiz packs compare it)
+            else:
+                self._rows.pop((course_name, q_id), None) # Deleted elsewhere; stop serving the old copy
+            return result
+
+    def delete_question(self, course_name, q_id):
+        with self._lock:
+            result = self.store.delete_question(course_name, q_id)
+            self._rows.pop((course_name, q_id), None) # Gone either way
+            if result:
+                self._catalog = None
+            return result
@@ -0,0 +1,157 @@
+"""Bulk question import/export for CSV and JSONL files.
+
+Usage:
+    python questionio.py import "ds 3850" questions.csv [--batch-size N] [--db FILE]
+    python questionio.py export "ds 3850" questions.jsonl [--db FILE]
+
+Files are streamed row by row, so memory use does not grow with file size.
+Every row is checked with questionstore.validate_question (non-empty text
+and options, correct answer A-D); bad rows are skipped and reported.
+Imports are written with executemany in batches inside one transaction,
+so a failed import leaves the course untouched.
+"""
+import csv
+import json
+import os
+import sys
+import time
+import argparse
+import sqlite3
+
+from questionstore import QuestionStore, validate_question
+from search import bulk_load
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 20 # Only the first few rejects are kept, to stay constant-memory
+
+FIELDS = ["question", "option_a", "option_b", "option_c", "option_d", "correct_answer"]
+
+
+class ImportReport:
+    """Summary of one import run."""
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = [] # (line number, reason), capped at MAX_REPORTED_ERRORS
+        self.seconds = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.imported / self.seconds if self.seconds else 0.0
+
+    def reject(self, line_no, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_no, reason))
+
+    def summary(self):
+        text = (f"Imported {self.imported} questions in {self.seconds:.2f}s "
+                f"({self.rows_per_sec:,.0f} rows/sec); rejected {self.rejected}.")
+        for line_no, reason in self.errors:
+            text += f"\n  line {line_no}: {reason}"
+        if self.rejected > len(self.errors):
+            text += f"\n  ... and {self.rejected - len(self.errors)} more"
+        return text
+
+
+def _file_format(path):
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".json", ".ndjson") else "csv"
+
+def iter_question_rows(path):
+    """Yields (line number, row tuple or None, error) for each record in a CSV or JSONL file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if _file_format(path) == "jsonl":
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, None, f"invalid JSON ({e.msg})"
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, None, "expected a JSON object"
+                    continue
+                yield line_no, tuple(record.get(field) for field in FIELDS), None
+        else:
+            reader = csv.DictReader(f)
+            missing = [field for field in FIELDS if field not in (reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+            for record in reader:
+                yield reader.line_num, tuple(record.get(field) for field in FIELDS), None
+
+def _clean(row):
+    question, opt_a, opt_b, opt_c, opt_d, correct = (str(value).strip() for value in row)
+    return (question, opt_a, opt_b, opt_c, opt_d, correct.upper())
+
+def import_questions(pool, store, course_name, path, batch_size=DEFAULT_BATCH_SIZE):
+    """Streams a file into a course in one transaction. Returns an ImportReport."""
+    report = ImportReport()
+    store.create_course(course_name)
+    start = time.perf_counter()
+    with pool.transaction() as conn, bulk_load(conn, course_name):
+        batch = []
+        for line_no, row, error in iter_question_rows(path):
+            error = error or validate_question(row)
+            if error:
+                report.reject(line_no, error)
+                continue
+            batch.append(_clean(row))
+            if len(batch) >= batch_size:
+                store.insert_many(conn, course_name, batch)
+                report.imported += len(batch)
+                batch = []
+        if batch:
+            store.insert_many(conn, course_name, batch)
+            report.imported += len(batch)
+    report.seconds = time.perf_counter() - start
+    return report
+
+def export_questions(store, course_name, path, page_size=DEFAULT_BATCH_SIZE):
+    """Writes a course to CSV or JSONL page by page. Returns the number of rows written."""
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        jsonl = _file_format(path) == "jsonl"
+        writer = None if jsonl else csv.writer(f)
+        if writer:
+            writer.writerow(FIELDS)
+        after_id = 0
+        while True:
+            rows = store.page_questions(course_name, after_id, page_size)
+            if not rows:
+                return written
+            for row in rows:
+                if jsonl:
+                    f.write(json.dumps(dict(zip(FIELDS, row[1:])), ensure_ascii=False) + "\n")
+                else:
+                    writer.writerow(row[1:])
+            written += len(rows)
+            after_id = rows[-1][0]
+
+
+if __name__ == "__main__":
+    from shards import open_pool
+
+    parser = argparse.ArgumentParser(description="Import or export quiz questions as CSV/JSONL.")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("course")
+    parser.add_argument("file")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--db", default="rharrellQuiz.db")
+    args = parser.parse_args()
+
+    db_pool = open_pool(args.db)
+    store = QuestionStore(db_pool.execute, shards=db_pool.shards)
+    try:
+        if args.action == "import":
+            print(import_questions(db_pool, store, args.course, args.file, args.batch_size).summary())
+        else:
+            start = time.perf_counter()
+            count = export_questions(store, args.course, args.file)
+            print(f"Exported {count} questions to '{args.file}' in {time.perf_counter() - start:.2f}s.")
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        db_pool.close()
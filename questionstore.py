@@ -0,0 +1,473 @@
+import sqlite3
+
+# --- LAYOUTS ---
+LAYOUT_LEGACY = "legacy" # One table per course, named after the course
+LAYOUT_UNIFIED = "unified" # A single `questions` table keyed by `course_id`
+LAYOUT_SHARDED = "sharded" # Legacy course tables spread over several files (see shards.py)
+
+# Tables that belong to the app itself and must never be listed as courses.
+SYSTEM_TABLES = {"courses", "questions", "quiz_meta", "seed_questions", "question_search", "search_courses",
+                 "question_lsh", "attempts", "attempt_answers",
+                 "question_stats", "course_stats", "question_validity", "course_validity", "course_catalog",
+                 "course_shards"}
+
+# Column order every caller expects: (id, question, option_a, option_b, option_c, option_d, correct_answer)
+QUESTION_COLUMNS = "id, question, option_a, option_b, option_c, option_d, correct_answer"
+
+# SQLite's default limit on host parameters is 999 on older builds, so IN (...) lists are chunked.
+MAX_IN_PARAMS = 900
+
+LEGACY_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS "{table_name}" (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT NOT NULL,
+                option_a TEXT NOT NULL,
+                option_b TEXT NOT NULL,
+                option_c TEXT NOT NULL,
+                option_d TEXT NOT NULL,
+                correct_answer TEXT NOT NULL
+            );'''
+
+UNIFIED_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    course_id INTEGER NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    question TEXT NOT NULL,
+    option_a TEXT NOT NULL,
+    option_b TEXT NOT NULL,
+    option_c TEXT NOT NULL,
+    option_d TEXT NOT NULL,
+    correct_answer TEXT NOT NULL,
+    legacy_id INTEGER
+);
+-- Covers id listing and keyset paging per course without touching the row data
+CREATE INDEX IF NOT EXISTS idx_questions_course ON questions(course_id, id);
+-- Lets the migration find what it has already copied
+CREATE INDEX IF NOT EXISTS idx_questions_legacy ON questions(course_id, legacy_id);
+CREATE TABLE IF NOT EXISTS quiz_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+LIST_LEGACY_TABLES_SQL = f'''SELECT m.name FROM sqlite_master m
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+      AND m.name NOT IN ({",".join(repr(t) for t in sorted(SYSTEM_TABLES))})
+      AND EXISTS (SELECT 1 FROM pragma_table_info(m.name) WHERE name = 'correct_answer')
+    ORDER BY m.name'''
+
+
+def validate_question(params):
+    """Checks (question, opt_a, opt_b, opt_c, opt_d, correct) against the rules the quiz screen relies on.
+
+    Returns None for a usable question, otherwise a short reason.
+    """
+    if len(params) != 6:
+        return f"expected 6 fields, got {len(params)}"
+    question, opt_a, opt_b, opt_c, opt_d, correct = params
+    if question is None or not str(question).strip():
+        return "question text is empty"
+    for letter, option in zip("ABCD", (opt_a, opt_b, opt_c, opt_d)):
+        if option is None or not str(option).strip():
+            return f"option {letter} is empty"
+    if str(correct or "").strip().upper() not in ("A", "B", "C", "D"):
+        return f"correct answer '{correct}' is not A-D"
+    return None
+
+
+# The rules of validate_question as an SQL expression over a question row: NULL when the
+# question is usable, otherwise the same reason validate_question would give.
+_BLANK = "trim(ifnull({0}, ''), char(32, 9, 10, 11, 12, 13)) = ''"
+PROBLEM_SQL = f"""CASE
+        WHEN {_BLANK.format("question")} THEN 'question text is empty'
+        WHEN {_BLANK.format("option_a")} THEN 'option A is empty'
+        WHEN {_BLANK.format("option_b")} THEN 'option B is empty'
+        WHEN {_BLANK.format("option_c")} THEN 'option C is empty'
+        WHEN {_BLANK.format("option_d")} THEN 'option D is empty'
+        WHEN upper(trim(ifnull(correct_answer, ''), char(32, 9, 10, 11, 12, 13))) NOT IN ('A', 'B', 'C', 'D')
+            THEN 'correct answer ''' || ifnull(correct_answer, 'None') || ''' is not A-D'
+    END"""
+
+
+def connection_execute(conn):
+    """An execute_db_query-style callable that runs inside the caller's transaction on `conn`."""
+    def execute(query, params=(), fetch=None):
+        cursor = conn.execute(query, params)
+        if fetch == "all":
+            return cursor.fetchall()
+        if fetch == "one":
+            return cursor.fetchone()
+        if fetch == "lastrowid":
+            return cursor.lastrowid
+        if fetch == "rowcount":
+            return cursor.rowcount
+        return True
+    return execute
+
+
+def detect_layout(execute):
+    """Returns LAYOUT_UNIFIED once a migration has been completed, LAYOUT_LEGACY otherwise."""
+    has_meta = execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='quiz_meta'", fetch="one")
+    if not has_meta:
+        return LAYOUT_LEGACY
+    row = execute("SELECT value FROM quiz_meta WHERE key = 'layout'", fetch="one")
+    return row[0] if row else LAYOUT_LEGACY
+
+
+# --- COURSE CATALOG ---
+# One row per course with its question count, kept current by triggers, so the course
+# list and counts are a single read of a small table however many courses there are.
+# valid_count is written by validindex.py and stays NULL until a course is checked.
+
+CATALOG_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS course_catalog (
+           name TEXT PRIMARY KEY,
+           display_name TEXT NOT NULL,
+           question_count INTEGER NOT NULL DEFAULT 0,
+           valid_count INTEGER,
+           modified_at REAL NOT NULL
+       ) WITHOUT ROWID''',
+]
+CATALOG_COLUMNS = "name, display_name, question_count, valid_count, modified_at"
+
+# Unix time in SQL; unixepoch('subsec') needs SQLite 3.42
+_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+
+UNIFIED_CATALOG_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS catalog_ai_courses AFTER INSERT ON courses BEGIN
+           INSERT OR IGNORE INTO course_catalog (name, display_name, question_count, modified_at)
+           VALUES (NEW.name, NEW.name, 0, {_NOW});
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS catalog_ad_courses AFTER DELETE ON courses BEGIN
+           DELETE FROM course_catalog WHERE name = OLD.name;
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS catalog_ai_questions AFTER INSERT ON questions BEGIN
+           UPDATE course_catalog SET question_count = question_count + 1, modified_at = {_NOW}
+           WHERE name = (SELECT name FROM courses WHERE id = NEW.course_id);
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS catalog_ad_questions AFTER DELETE ON questions BEGIN
+           UPDATE course_catalog SET question_count = question_count - 1, modified_at = {_NOW}
+           WHERE name = (SELECT name FROM courses WHERE id = OLD.course_id);
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS catalog_au_questions AFTER UPDATE ON questions BEGIN
+           UPDATE course_catalog SET question_count = question_count - 1
+           WHERE OLD.course_id != NEW.course_id AND name = (SELECT name FROM courses WHERE id = OLD.course_id);
+           UPDATE course_catalog SET question_count = question_count + (OLD.course_id != NEW.course_id),
+                                     modified_at = {_NOW}
+           WHERE name = (SELECT name FROM courses WHERE id = NEW.course_id);
+       END''',
+]
+
+def _legacy_catalog_triggers(course_name):
+    """Triggers that keep one legacy course table's catalog row current."""
+    name = course_name.replace("'", "''")
+    return [
+        f'''CREATE TRIGGER IF NOT EXISTS "catalog_ai_{course_name}" AFTER INSERT ON "{course_name}" BEGIN
+               UPDATE course_catalog SET question_count = question_count + 1, modified_at = {_NOW} WHERE name = '{name}';
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS "catalog_ad_{course_name}" AFTER DELETE ON "{course_name}" BEGIN
+               UPDATE course_catalog SET question_count = question_count - 1, modified_at = {_NOW} WHERE name = '{name}';
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS "catalog_au_{course_name}" AFTER UPDATE ON "{course_name}" BEGIN
+               UPDATE course_catalog SET modified_at = {_NOW} WHERE name = '{name}';
+           END''',
+    ]
+
+def register_legacy_course(execute, course_name):
+    """Adds a legacy course table to the catalog (with its current row count) and installs its triggers."""
+    for statement in _legacy_catalog_triggers(course_name):
+        execute(statement)
+    execute(f'''INSERT OR IGNORE INTO course_catalog (name, display_name, question_count, modified_at)
+                SELECT ?, ?, COUNT(*), {_NOW} FROM "{course_name}"''', (course_name, course_name))
+
+def catalog_installed(execute):
+    return bool(execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='course_catalog'", fetch="one"))
+
+def install_catalog(conn):
+    """Creates the catalog and the triggers for the current layout, then recounts every course.
+
+    Safe to re-run, e.g. after migrate.py switches layouts; display names
+    are kept. Returns the number of courses.
+    """
+    for statement in CATALOG_SCHEMA:
+        conn.execute(statement)
+    # Start from a clean slate so triggers from the other layout never linger
+    triggers = conn.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND name GLOB 'catalog_a[idu]_*'").fetchall()
+    for (name,) in triggers:
+        conn.execute(f'DROP TRIGGER "{name}"')
+    if detect_layout(connection_execute(conn)) == LAYOUT_UNIFIED:
+        for statement in UNIFIED_CATALOG_TRIGGERS:
+            conn.execute(statement)
+        counts = conn.execute('''SELECT c.name, COUNT(q.id) FROM courses c
+                                LEFT JOIN questions q ON q.course_id = c.id GROUP BY c.id''').fetchall()
+    else:
+        counts = []
+        for (course_name,) in conn.execute(LIST_LEGACY_TABLES_SQL).fetchall():
+            for statement in _legacy_catalog_triggers(course_name):
+                conn.execute(statement)
+            counts.append((course_name, conn.execute(f'SELECT COUNT(*) FROM "{course_name}"').fetchone()[0]))
+    current = {name for name, _ in counts}
+    conn.executemany("DELETE FROM course_catalog WHERE name = ?",
+                     [row for row in conn.execute("SELECT name FROM course_catalog") if row[0] not in current])
+    conn.executemany(f'''INSERT INTO course_catalog (name, display_name, question_count, modified_at)
+                         VALUES (?, ?, ?, {_NOW})
+                         ON CONFLICT (name) DO UPDATE SET question_count = excluded.question_count''',
+                     [(name, name, count) for name, count in counts])
+    return len(counts)
+
+
+class QuestionStore:
+    """Data-access layer that hides which database layout is in use.
+
+    `execute` is an execute_db_query-style callable: (query, params=(), fetch=None).
+    Every method returns rows in QUESTION_COLUMNS order, so the GUIs do not
+    care whether a course is its own table or a slice of `questions`.
+    A sharded bank also needs `shards`, the shards.ShardedPool behind
+    `execute`; its course tables are otherwise read like legacy ones.
+    With `data_version` (e.g. ConnectionPool.external_version), a legacy
+    layout is re-detected whenever another program commits, so a store
+    that is already running follows migrate.py onto the unified tables.
+    """
+    def __init__(self, execute, layout=None, shards=None, data_version=None):
+        self.execute = execute
+        self.shards = shards
+        self.data_version = data_version
+        self.on_layout_change = None # Called after a re-detection found a new layout
+        self._layout = layout
+        self._layout_version = None
+        self._course_ids = {} # Unified layout only: course name -> courses.id
+        self._has_catalog = None
+
+    @property
+    def layout(self):
+        if self._layout == LAYOUT_LEGACY and self.data_version is not None:
+            version = self.data_version()
+            if version != self._layout_version:
+                self._layout_version = version
+                if detect_layout(self.execute) != LAYOUT_LEGACY: # Migrated while we were running
+                    self.refresh_layout()
+                    if self.on_layout_change is not None:
+                        self.on_layout_change()
+        if self._layout is None:
+            self._layout = detect_layout(self.execute)
+        return self._layout
+
+    @property
+    def has_catalog(self):
+        if self._has_catalog is None:
+            self._has_catalog = catalog_installed(self.execute)
+        return self._has_catalog
+
+    def refresh_layout(self):
+        """Forgets the detected layout, e.g. after running migrate.py."""
+        self._layout = None
+        self._has_catalog = None
+        self._course_ids.clear()
+
+    def _course_id(self, course_name):
+        course_id = self._course_ids.get(course_name)
+        if course_id is None:
+            row = self.execute("SELECT id FROM courses WHERE name = ?", (course_name,), fetch="one")
+            if not row:
+                return None
+            course_id = self._course_ids[course_name] = row[0]
+        return course_id
+
+    # --- COURSES ---
+
+    def _sharded(self):
+        if self.layout != LAYOUT_SHARDED:
+            return False
+        if self.shards is None:
+            raise sqlite3.OperationalError("this question bank is sharded; open it with shards.open_pool")
+        return True
+
+    def list_courses(self):
+        if self.layout == LAYOUT_SHARDED:
+            rows = self.execute("SELECT course FROM course_shards ORDER BY course", fetch="all")
+        elif self.has_catalog:
+            rows = self.execute("SELECT name FROM course_catalog ORDER BY name", fetch="all")
+        elif self.layout == LAYOUT_UNIFIED:
+            rows = self.execute("SELECT name FROM courses ORDER BY name", fetch="all")
+        else:
+            rows = self.execute(LIST_LEGACY_TABLES_SQL, fetch="all")
+        return [row[0] for row in rows] if rows else []
+
+    def create_course(self, course_name):
+        """Creates an empty course. Returns False if it already exists (or on a database error)."""
+        if self.layout == LAYOUT_UNIFIED:
+            # The catalog row is added by a trigger on `courses`
+            return bool(self.execute("INSERT OR IGNORE INTO courses (name) VALUES (?)", (course_name,), fetch="rowcount"))
+        if self._sharded():
+            return self.shards.create_course(course_name)
+        if self.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (course_name,), fetch="one"):
+            return False
+        created = self.execute(LEGACY_TABLE_SQL.format(table_name=course_name))
+        if created and self.has_catalog:
+            register_legacy_course(self.execute, course_name)
+        return created
+
+    def catalog(self):
+        """(name, display name, questions, usable questions, modified at) per course, by name.
+
+        One read of course_catalog. Databases set up before it existed get
+        the names alone, with None for everything else. A sharded bank
+        reads the catalog of every shard file at once.
+        """
+        if self._sharded():
+            return self.shards.catalog()
+        if self.has_catalog:
+            return self.execute(f"SELECT {CATALOG_COLUMNS} FROM course_catalog ORDER BY name", fetch="all") or []
+        return [(name, name, None, None, None) for name in self.list_courses()]
+
+    # --- READS ---
+
+    def course_question_ids(self, course_name):
+        if self.layout == LAYOUT_UNIFIED:
+            rows = self.execute("SELECT id FROM questions WHERE course_id = ?",
+                                (self._course_id(course_name),), fetch="all")
+        else:
+            rows = self.execute(f'SELECT id FROM "{course_name}"', fetch="all")
+        return [row[0] for row in rows] if rows else []
+
+    def course_signature(self, course_name):
+        """(row count, highest id) of a course: changes whenever rows are added or deleted."""
+        if self.layout == LAYOUT_UNIFIED:
+            row = self.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM questions WHERE course_id = ?",
+                               (self._course_id(course_name),), fetch="one")
+        else:
+            row = self.execute(f'SELECT COUNT(*), COALESCE(MAX(id), 0) FROM "{course_name}"', fetch="one")
+        return tuple(row) if row else (0, 0)
+
+    def question_problems(self, course_name):
+        """(id, problem) for every question in a course; problem is None for usable ones (see PROBLEM_SQL)."""
+        if self.layout == LAYOUT_UNIFIED:
+            return self.execute(f"SELECT id, {PROBLEM_SQL} FROM questions WHERE course_id = ?",
+                                (self._course_id(course_name),), fetch="all")
+        return self.execute(f'SELECT id, {PROBLEM_SQL} FROM "{course_name}"', fetch="all")
+
+    def all_questions(self, course_name):
+        if self.layout == LAYOUT_UNIFIED:
+            return self.execute(f"SELECT {QUESTION_COLUMNS} FROM questions WHERE course_id = ? ORDER BY id",
+                                (self._course_id(course_name),), fetch="all")
+        return self.execute(f'SELECT {QUESTION_COLUMNS} FROM "{course_name}" ORDER BY id', fetch="all")
+
+    def count_questions(self, course_name):
+        if self.layout == LAYOUT_UNIFIED:
+            row = self.execute("SELECT COUNT(*) FROM questions WHERE course_id = ?",
+                               (self._course_id(course_name),), fetch="one")
+        else:
+            row = self.execute(f'SELECT COUNT(*) FROM "{course_name}"', fetch="one")
+        return row[0] if row else 0
+
+    def page_questions(self, course_name, after_id, limit):
+        """Keyset pagination: the next `limit` rows with an id greater than `after_id`."""
+        if self.layout == LAYOUT_UNIFIED:
+            return self.execute(
+                f"SELECT {QUESTION_COLUMNS} FROM questions WHERE course_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (self._course_id(course_name), after_id, limit), fetch="all")
+        return self.execute(f'SELECT {QUESTION_COLUMNS} FROM "{course_name}" WHERE id > ? ORDER BY id LIMIT ?',
+                            (after_id, limit), fetch="all")
+
+    def question_id_before(self, course_name, offset):
+        """Id of the row just before position `offset` (0 for the start), read from the id index only."""
+        if offset <= 0:
+            return 0
+        if self.layout == LAYOUT_UNIFIED:
+            row = self.execute("SELECT id FROM questions WHERE course_id = ? ORDER BY id LIMIT 1 OFFSET ?",
+                               (self._course_id(course_name), offset - 1), fetch="one")
+        else:
+            row = self.execute(f'SELECT id FROM "{course_name}" ORDER BY id LIMIT 1 OFFSET ?',
+                               (offset - 1,), fetch="one")
+        return row[0] if row else None
+
+    def get_question(self, course_name, q_id):
+        if self.layout == LAYOUT_UNIFIED:
+            return self.execute(f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id = ? AND course_id = ?",
+                                (q_id, self._course_id(course_name)), fetch="one")
+        return self.execute(f'SELECT {QUESTION_COLUMNS} FROM "{course_name}" WHERE id = ?', (q_id,), fetch="one")
+
+    def question_id_by_text(self, course_name, question_text):
+        """Id of the first question with exactly this wording, or None."""
+        if self.layout == LAYOUT_UNIFIED:
+            row = self.execute("SELECT id FROM questions WHERE course_id = ? AND question = ? ORDER BY id LIMIT 1",
+                               (self._course_id(course_name), question_text), fetch="one")
+        else:
+            row = self.execute(f'SELECT id FROM "{course_name}" WHERE question = ? ORDER BY id LIMIT 1',
+                               (question_text,), fetch="one")
+        return row[0] if row else None
+
+    def questions_by_ids(self, course_name, ids):
+        """Fetches the given ids with primary-key lookups; the order of the result is unspecified."""
+        rows = []
+        for start in range(0, len(ids), MAX_IN_PARAMS):
+            chunk = tuple(ids[start:start + MAX_IN_PARAMS])
+            placeholders = ",".join("?" * len(chunk))
+            if self.layout == LAYOUT_UNIFIED:
+                result = self.execute(
+                    f"SELECT {QUESTION_COLUMNS} FROM questions WHERE id IN ({placeholders}) AND course_id = ?",
+                    chunk + (self._course_id(course_name),), fetch="all")
+            else:
+                result = self.execute(
+                    f'SELECT {QUESTION_COLUMNS} FROM "{course_name}" WHERE id IN ({placeholders})',
+                    chunk, fetch="all")
+            if result is False:
+                return False
+            rows.extend(result)
+        return rows
+
+    # --- WRITES ---
+
+    def add_question(self, course_name, params):
+        """Inserts (question, opt_a, opt_b, opt_c, opt_d, correct) and returns the new id."""
+        if self.layout == LAYOUT_UNIFIED:
+            return self.execute(
+                '''INSERT INTO questions (course_id, question, option_a, option_b, option_c, option_d, correct_answer)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (self._course_id(course_name),) + tuple(params), fetch="lastrowid")
+        return self.execute(
+            f'''INSERT INTO "{course_name}"
+               (question, option_a, option_b, option_c, option_d, correct_answer)
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            tuple(params), fetch="lastrowid")
+
+    def insert_many(self, conn, course_name, rows):
+        """Bulk-inserts question tuples with executemany on a connection the caller controls."""
+        if self.layout == LAYOUT_UNIFIED:
+            course_id = self._course_id(course_name)
+            conn.executemany(
+                '''INSERT INTO questions (course_id, question, option_a, option_b, option_c, option_d, correct_answer)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                [(course_id,) + tuple(row) for row in rows])
+        else:
+            if self._sharded():
+                self.shards.attach_course(conn, course_name) # Only the pool's own execute routes by itself
+            conn.executemany(
+                f'''INSERT INTO "{course_name}"
+                   (question, option_a, option_b, option_c, option_d, correct_answer)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                rows)
+
+    def update_question(self, course_name, q_id, params):
+        """Rewrites one question. Returns False if it does not exist (or on a database error)."""
+        if self.layout == LAYOUT_UNIFIED:
+            return bool(self.execute(
+                '''UPDATE questions SET
+                   question = ?, option_a = ?, option_b = ?, option_c = ?, option_d = ?, correct_answer = ?
+                   WHERE id = ? AND course_id = ?''',
+                tuple(params) + (q_id, self._course_id(course_name)), fetch="rowcount"))
+        return bool(self.execute(
+            f'''UPDATE "{course_name}" SET
+               question = ?, option_a = ?, option_b = ?, option_c = ?, option_d = ?, correct_answer = ?
+               WHERE id = ?''',
+            tuple(params) + (q_id,), fetch="rowcount"))
+
+    def delete_question(self, course_name, q_id):
+        """Deletes one question. Returns False if it does not exist (or on a database error)."""
+        if self.layout == LAYOUT_UNIFIED:
+            return bool(self.execute("DELETE FROM questions WHERE id = ? AND course_id = ?",
+                                     (q_id, self._course_id(course_name)), fetch="rowcount"))
+        return bool(self.execute(f'DELETE FROM "{course_name}" WHERE id = ?', (q_id,), fetch="rowcount"))
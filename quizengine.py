@@ -0,0 +1,176 @@
+"""Quiz logic with no Tk dependency: answer mapping, scoring and progression.
+
+Both GUIs drive a QuizSession; it can also be run headless, e.g. by the
+benchmark below or a server. Usage:
+
+    python quizengine.py [--sessions N] [--questions K] [--min-rate R]
+
+`--min-rate` makes the benchmark exit with status 1 when fewer than R
+sessions per second are simulated, so it can guard the hot path in CI.
+"""
+import sys
+import time
+import random
+import argparse
+
+LETTERS = "ABCD"
+
+
+class InvalidQuestionError(ValueError):
+    """A stored question cannot be asked, e.g. its correct answer is not A-D."""
+
+
+class QuestionRecord:
+    """One question, ready to ask. The correct answer is resolved once, when the record is built."""
+    __slots__ = ("id", "text", "options", "correct_index")
+
+    def __init__(self, q_id, text, options, correct_index):
+        self.id = q_id
+        self.text = text
+        self.options = options # Tuple of the four option texts, A-D
+        self.correct_index = correct_index
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a record from (id, question, opt_a, opt_b, opt_c, opt_d, correct_letter)."""
+        q_id, text, opt_a, opt_b, opt_c, opt_d, correct_letter = row
+        letter = str(correct_letter or "").strip().upper()
+        if len(letter) != 1 or letter not in LETTERS:
+            raise InvalidQuestionError(f"Invalid correct answer ('{correct_letter}') for question {q_id}")
+        return cls(q_id, text, (opt_a, opt_b, opt_c, opt_d), LETTERS.index(letter))
+
+    @property
+    def correct_letter(self):
+        return LETTERS[self.correct_index]
+
+    @property
+    def correct_text(self):
+        return self.options[self.correct_index]
+
+
+class QuizSession:
+    """One pass through a list of questions.
+
+    Answers are option indexes (0-3 for A-D), so checking one is a single
+    integer comparison. Records are never modified and can be shared by
+    any number of sessions.
+
+    With `timed=True` the seconds spent on each question are kept in
+    `times`; it is off by default because it costs a clock read per answer.
+    """
+    __slots__ = ("course", "questions", "index", "score", "answers", "times", "attempt_id", "_shown_at")
+    adaptive = False # Questions fixed up front (see adaptive.AdaptiveSession for the other kind)
+
+    def __init__(self, course, questions, timed=False):
+        self.course = course
+        self.questions = questions # List of QuestionRecord
+        self.index = 0
+        self.score = 0
+        self.answers = [] # Chosen option index per answered question
+        self.times = [] if timed else None # Seconds spent on each answered question
+        self.attempt_id = None # Set by attemptlog.AttemptLog when the attempt is recorded
+        self._shown_at = time.perf_counter() if timed else None
+
+    @classmethod
+    def from_rows(cls, course, rows, shuffle=False, rng=random, timed=False):
+        """Builds a session from database rows; raises InvalidQuestionError for unusable data."""
+        questions = [QuestionRecord.from_row(row) for row in rows]
+        if shuffle:
+            rng.shuffle(questions)
+        return cls(course, questions, timed=timed)
+
+    @property
+    def total(self):
+        return len(self.questions)
+
+    @property
+    def finished(self):
+        return self.index >= len(self.questions)
+
+    @property
+    def current(self):
+        """The question being asked, or None once the session is finished."""
+        return self.questions[self.index] if self.index < len(self.questions) else None
+
+    def mark_shown(self):
+        """Starts the clock for the current question once it is on screen.
+
+        Without it, each answer is timed from the previous one.
+        """
+        if self.times is not None:
+            self._shown_at = time.perf_counter()
+
+    def answer(self, choice):
+        """Records the chosen option index for the current question. Returns True if it was right."""
+        correct = choice == self.questions[self.index].correct_index
+        if correct:
+            self.score += 1
+        self.answers.append(choice)
+        if self.times is not None:
+            now = time.perf_counter()
+            self.times.append(now - self._shown_at)
+            self._shown_at = now
+        return correct
+
+    def advance(self):
+        """Moves on to the next question. Returns False once there are none left."""
+        self.index += 1
+        return self.index < len(self.questions)
+
+    def score_out_of(self, points=10):
+        return round(self.score / len(self.questions) * points, 1) if self.questions else 0
+
+
+# --- BENCHMARK ---
+
+def _legacy_session(questions, choices):
+    """The scoring loop the GUIs used to run: rebuild the answer map and compare strings per question."""
+    score = 0
+    for row, choice in zip(questions, choices):
+        q_id, q_text, opt_a, opt_b, opt_c, opt_d, correct_letter = row
+        answer_map = {'A': opt_a, 'B': opt_b, 'C': opt_c, 'D': opt_d}
+        correct_answer_text = answer_map.get(correct_letter.strip().upper())
+        selected_answer = (opt_a, opt_b, opt_c, opt_d)[choice]
+        if selected_answer.strip().lower() == correct_answer_text.strip().lower():
+            score += 1
+    return score
+
+def run_benchmark(sessions=200_000, questions=10, seed=1234):
+    """Simulates complete sessions headlessly. Returns sessions per second for the engine."""
+    rng = random.Random(seed)
+    rows = [(i, f"Question {i}?", f"a{i}", f"b{i}", f"c{i}", f"d{i}", rng.choice(LETTERS)) for i in range(questions)]
+    # Pre-drawn answers so the random number generator is not what gets timed
+    choices = [[rng.randrange(4) for _ in range(questions)] for _ in range(1000)]
+
+    start = time.perf_counter()
+    for n in range(sessions):
+        _legacy_session(rows, choices[n % 1000])
+    legacy = sessions / (time.perf_counter() - start)
+
+    records = [QuestionRecord.from_row(row) for row in rows]
+    total = 0
+    start = time.perf_counter()
+    for n in range(sessions):
+        session = QuizSession("bench", records)
+        for choice in choices[n % 1000]:
+            session.answer(choice)
+            session.advance()
+        total += session.score
+    engine = sessions / (time.perf_counter() - start)
+
+    print(f"{sessions:,} sessions of {questions} questions (average score {total / sessions:.2f})")
+    print(f"  string-matching loop: {legacy:>12,.0f} sessions/sec")
+    print(f"  QuizSession:          {engine:>12,.0f} sessions/sec ({engine * questions:,.0f} answers/sec)")
+    return engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the headless quiz engine.")
+    parser.add_argument("--sessions", type=int, default=200_000)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--min-rate", type=float, default=None, help="fail if fewer sessions/sec than this")
+    args = parser.parse_args()
+    rate = run_benchmark(args.sessions, args.questions)
+    if args.min_rate is not None and rate < args.min_rate:
+        print(f"FAIL: {rate:,.0f} sessions/sec is below the required {args.min_rate:,.0f}")
+        sys.exit(1)
@@ -0,0 +1,434 @@
+"""Compiled, memory-mappable question packs for machines that only take quizzes.
+
+Usage:
+    python quizpack.py build [--db FILE] [--out FILE] [--course NAME ...]
+    python quizpack.py info [FILE]
+    python quizpack.py benchmark [--questions N]
+
+A pack holds every course's questions in one read-only file: a header, a
+course directory, fixed-width arrays (question ids, correct option, string
+offsets) and one UTF-8 string table. `QuizPack` maps the file and reads
+the arrays in place through memoryviews, so opening a pack parses nothing
+but the directory, and drawing a quiz decodes only the strings of the
+questions drawn. The header records a stamp of the packed courses' rows in
+course_catalog, whose triggers touch them on every add, edit and delete;
+`is_current()` compares it with the live catalog so the apps can go back
+to SQLite once the pack is out of date. Rebuild the pack after editing
+questions.
+
+Layout (little-endian, every array 4-byte aligned):
+
+    header      magic "QPAK", format version, course count, build time,
+                source stamp, directory offset, string table offset,
+                CRC-32 of the rest
+    directory   per course: name (string table start, length), question
+                count, offsets of its ids / correct / spans arrays
+    ids         uint32 per question, ascending
+    correct     uint8 option index (0-3 for A-D) per question
+    spans       uint32 * (5 * count + 1): question text and options A-D of
+                question i are strings 5i .. 5i+4, string j runs from
+                spans[j] to spans[j+1] in the string table
+"""
+import os
+import sys
+import mmap
+import time
+import zlib
+import random
+import struct
+import threading
+from array import array
+
+from quizengine import QuestionRecord, QuizSession, InvalidQuestionError
+# sqlite3 is only imported to build packs, so loading one never pulls it in
+
+MAGIC = b"QPAK"
+FORMAT_VERSION = 2
+DEFAULT_PACK = "quizbank.qpack"
+# magic, format version, reserved, course count, built at, source stamp, directory, strings, crc
+HEADER = struct.Struct("<4sHHIdIIII")
+COURSE = struct.Struct("<IIIIII") # name start, name length, count, ids offset, correct offset, spans offset
+FIELDS_PER_QUESTION = 5 # Question text and options A-D
+
+
+class PackError(ValueError):
+    """A file is not a quiz pack this version can read."""
+
+
+# --- BUILDING ---
+
+class PackReport:
+    """Summary of one build."""
+    def __init__(self):
+        self.courses = 0
+        self.questions = 0
+        self.skipped = [] # (course, question id, reason)
+        self.size = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        text = (f"Packed {self.questions:,} questions from {self.courses} courses into "
+                f"{self.size / 1024:,.1f} KB in {self.seconds:.2f}s; skipped {len(self.skipped)}.")
+        for course, q_id, reason in self.skipped[:20]:
+            text += f"\n  {course} #{q_id}: {reason}"
+        return text
+
+
+def _pad(buffer):
+    buffer.extend(b"\0" * (-len(buffer) % 4))
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def source_stamp(catalog, courses):
+    """CRC-32 of the catalog rows (name, question count, modified at) of `courses`.
+
+    0 when the bank has no course_catalog, in which case a pack cannot tell
+    that it is out of date.
+    """
+    rows = sorted((name, count, modified_at) for name, _, count, _, modified_at in catalog if name in courses)
+    if any(modified_at is None for _, _, modified_at in rows):
+        return 0
+    return zlib.crc32(repr(rows).encode("utf-8")) or 1
+
+def build_pack(store, path, courses=None):
+    """Compiles the given courses (all by default) from a QuestionStore into a pack at `path`.
+
+    Questions the quiz screens would refuse (blank text or options, a
+    correct answer that is not A-D) are left out and listed in the returned
+    PackReport, exactly as the valid-question index leaves them out of
+    SQLite quizzes. The file is written next to `path` and renamed into
+    place, so a running kiosk never sees half a pack.
+    """
+    from questionstore import validate_question
+    report = PackReport()
+    start = time.perf_counter()
+    courses = courses if courses is not None else store.list_courses()
+    # Read before the questions: an edit made during the build leaves the pack looking stale, not current
+    stamp = source_stamp(store.catalog(), set(courses))
+    strings = bytearray()
+    arrays = bytearray()
+    entries = []
+    for course in courses:
+        ids, correct, spans = array("I"), array("B"), array("I")
+        name = course.encode("utf-8")
+        name_start = len(strings)
+        strings += name
+        for row in store.all_questions(course) or []:
+            problem = validate_question(row[1:])
+            if problem is not None:
+                report.skipped.append((course, row[0], problem))
+                continue
+            try:
+                record = QuestionRecord.from_row(row)
+            except InvalidQuestionError as e:
+                report.skipped.append((course, row[0], str(e)))
+                continue
+            if not 0 <= record.id < 2 ** 32:
+                report.skipped.append((course, record.id, "id does not fit in 32 bits"))
+                continue
+            ids.append(record.id)
+            correct.append(record.correct_index)
+            for text in (record.text,) + tuple(record.options):
+                spans.append(len(strings))
+                strings += str(text).encode("utf-8")
+        spans.append(len(strings))
+        offsets = []
+        for values in (ids, correct, spans):
+            offsets.append(len(arrays))
+            arrays += _little_endian(values)
+            _pad(arrays)
+        entries.append((name_start, len(name), len(ids), offsets))
+        report.courses += 1
+        report.questions += len(ids)
+    if len(strings) >= 2 ** 32:
+        raise PackError("the question bank is too large for a pack (4 GB of text)")
+
+    directory = HEADER.size
+    arrays_start = directory + COURSE.size * len(entries)
+    strings_start = arrays_start + len(arrays)
+    body = bytearray()
+    for name_start, name_length, count, (ids_at, correct_at, spans_at) in entries:
+        body += COURSE.pack(name_start, name_length, count, arrays_start + ids_at,
+                            arrays_start + correct_at, arrays_start + spans_at)
+    body += arrays
+    body += strings
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(entries), time.time(), stamp, directory, strings_start,
+                         zlib.crc32(body))
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as out:
+        out.write(header)
+        out.write(body)
+    os.replace(temp_path, path)
+    report.size = len(header) + len(body)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+# --- READING ---
+
+class _Course:
+    __slots__ = ("name", "ids", "correct", "spans")
+
+    def __init__(self, name, ids, correct, spans):
+        self.name = name
+        self.ids = ids
+        self.correct = correct
+        self.spans = spans
+
+
+class QuizPack:
+    """A pack opened read-only with mmap; everything is read in place.
+
+    With `verify=True` the CRC is checked, which reads the whole file once.
+    Quizzes are drawn with the pack's own random generator (seeded with
+    `seed`), which is safe to share between worker threads.
+    """
+    def __init__(self, path, verify=False, seed=None):
+        self.path = path
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Empty file
+            self._file.close()
+            raise PackError(f"'{path}' is empty")
+        self._view = memoryview(self._map)
+        self._courses = {}
+        try:
+            self._open(verify)
+        except (PackError, struct.error, TypeError, UnicodeDecodeError) as e:
+            self.close()
+            raise e if isinstance(e, PackError) else PackError(f"'{path}' is damaged: {e}")
+
+    def _open(self, verify):
+        if len(self._map) < HEADER.size:
+            raise PackError(f"'{self.path}' is too short to be a quiz pack")
+        magic, version, _, count, self.built_at, self.source_stamp, directory, self._strings, crc = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise PackError(f"'{self.path}' is not a quiz pack")
+        if version != FORMAT_VERSION:
+            raise PackError(f"'{self.path}' is pack format {version}; this program reads format {FORMAT_VERSION}. "
+                            "Rebuild it with python quizpack.py build")
+        if self._strings > len(self._map):
+            raise PackError(f"'{self.path}' is truncated")
+        if verify and zlib.crc32(self._view[HEADER.size:]) != crc:
+            raise PackError(f"'{self.path}' is damaged (checksum mismatch)")
+        for n in range(count):
+            name_start, name_length, size, ids_at, correct_at, spans_at = \
+                COURSE.unpack_from(self._map, directory + n * COURSE.size)
+            for offset, length in ((ids_at, size * 4), (correct_at, size),
+                                   (spans_at, (FIELDS_PER_QUESTION * size + 1) * 4)):
+                if offset + length > self._strings: # Checked before any view is taken, so close() can unmap
+                    raise PackError(f"'{self.path}' is truncated")
+            name = self._text(name_start, name_start + name_length)
+            course = self._courses[name] = _Course(name, self._array(ids_at, size, "I"),
+                                                   self._view[correct_at:correct_at + size],
+                                                   self._array(spans_at, FIELDS_PER_QUESTION * size + 1, "I"))
+            if self._strings + course.spans[-1] > len(self._map):
+                raise PackError(f"'{self.path}' is truncated")
+
+    def _array(self, offset, length, typecode):
+        view = self._view[offset:offset + length * 4]
+        if sys.byteorder == "little":
+            return view.cast(typecode) # No copy: indexes straight into the mapped file
+        values = array(typecode, view) # Big-endian machines pay one copy per array
+        values.byteswap()
+        return values
+
+    def _text(self, start, end):
+        return str(self._view[self._strings + start:self._strings + end], "utf-8")
+
+    # --- QUERIES ---
+
+    def courses(self):
+        return sorted(self._courses)
+
+    def __contains__(self, course_name):
+        return course_name in self._courses
+
+    def is_current(self, catalog):
+        """Whether the packed courses are unchanged in `catalog` (QuestionStore.catalog() rows) since the build."""
+        return not self.source_stamp or source_stamp(catalog, self._courses) == self.source_stamp
+
+    def count(self, course_name):
+        course = self._courses.get(course_name)
+        return len(course.ids) if course else 0
+
+    def question(self, course_name, index):
+        """The index-th question of a course (in id order) as a QuestionRecord."""
+        course = self._courses[course_name]
+        first = FIELDS_PER_QUESTION * index
+        q, a, b, c, d, end = course.spans[first:first + FIELDS_PER_QUESTION + 1].tolist()
+        view, base = self._view, self._strings
+        return QuestionRecord(course.ids[index], str(view[base + q:base + a], "utf-8"),
+                              (str(view[base + a:base + b], "utf-8"), str(view[base + b:base + c], "utf-8"),
+                               str(view[base + c:base + d], "utf-8"), str(view[base + d:base + end], "utf-8")),
+                              course.correct[index])
+
+    def sample(self, course_name, k, rng=None):
+        """Up to k distinct questions in random order; only those k are decoded."""
+        size = self.count(course_name)
+        if rng is None:
+            with self._rng_lock:
+                indexes = self._rng.sample(range(size), min(k, size))
+        else:
+            indexes = rng.sample(range(size), min(k, size))
+        return [self.question(course_name, index) for index in indexes]
+
+    def session(self, course_name, k=None, rng=None, timed=False):
+        """A QuizSession of k random questions, or the whole course shuffled when k is None."""
+        size = self.count(course_name)
+        return QuizSession(course_name, self.sample(course_name, size if k is None else k, rng), timed=timed)
+
+    def close(self):
+        for course in self._courses.values():
+            for values in (course.ids, course.correct, course.spans):
+                if isinstance(values, memoryview):
+                    values.release()
+        self._courses.clear()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+
+def open_pack(path, verify=False, seed=None):
+    """Opens the pack at `path`, or returns None when no path is configured or the file is missing."""
+    if not path or not os.path.exists(path):
+        return None
+    return QuizPack(path, verify=verify, seed=seed)
+
+
+# --- BENCHMARK ---
+
+def _build_bank(db_path, questions, courses=8):
+    import sqlite3
+    rng = random.Random(1234)
+    with sqlite3.connect(db_path) as conn:
+        for c in range(courses):
+            conn.execute(f'''CREATE TABLE "course {c}" (id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL,
+                             option_a TEXT NOT NULL, option_b TEXT NOT NULL, option_c TEXT NOT NULL,
+                             option_d TEXT NOT NULL, correct_answer TEXT NOT NULL)''')
+            conn.executemany(f'INSERT INTO "course {c}" (question, option_a, option_b, option_c, option_d, correct_answer) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             ((f"Question {n} of course {c}: " + "lorem ipsum " * rng.randrange(3, 12),
+                               f"option a {n}", f"option b {n}", f"option c {n}", f"option d {n}", rng.choice("ABCD"))
+                              for n in range(questions // courses)))
+
+def _launch(code, runs):
+    """Median wall time of a fresh interpreter running `code`."""
+    import subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=here)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+def run_benchmark(questions=100_000, quizzes=2000, runs=10):
+    import tempfile
+    from dbpool import ConnectionPool
+    from sampler import QuestionSampler
+    from questionstore import QuestionStore
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        pack_path = os.path.join(workdir, "bench.qpack")
+        _build_bank(db_path, questions)
+        pool = ConnectionPool(db_path)
+        report = build_pack(QuestionStore(pool.execute), pack_path)
+        pool.close()
+        print(report.summary())
+        print(f"  database file {os.path.getsize(db_path) / 1024:,.0f} KB")
+
+        # What a kiosk does at launch: open the bank, draw one 10-question quiz
+        sqlite_code = (f"from dbpool import ConnectionPool; from questionstore import QuestionStore; "
+                       f"from sampler import QuestionSampler; from quizengine import QuizSession; "
+                       f"s = QuestionSampler(QuestionStore(ConnectionPool({db_path!r}).execute)); "
+                       f"QuizSession.from_rows('course 3', s.sample('course 3', 10))")
+        pack_code = f"from quizpack import QuizPack; QuizPack({pack_path!r}).session('course 3', 10)"
+        baseline = _launch("import quizengine", runs)
+        sqlite_launch, pack_launch = _launch(sqlite_code, runs), _launch(pack_code, runs)
+        print(f"launch to first quiz (median of {runs}, minus {baseline * 1000:.0f} ms interpreter start):")
+        print(f"  SQLite + sampler: {(sqlite_launch - baseline) * 1000:7.1f} ms")
+        print(f"  quiz pack:        {(pack_launch - baseline) * 1000:7.1f} ms")
+
+        rng = random.Random(1)
+        start = time.perf_counter()
+        for _ in range(runs * 10):
+            fresh = ConnectionPool(db_path)
+            QuestionSampler(QuestionStore(fresh.execute)).sample("course 3", 10)
+            fresh.close()
+        sqlite_open = (time.perf_counter() - start) / (runs * 10)
+        start = time.perf_counter()
+        for _ in range(runs * 10):
+            pack = QuizPack(pack_path)
+            pack.session("course 3", 10, rng)
+            pack.close()
+        pack_open = (time.perf_counter() - start) / (runs * 10)
+        print(f"open + first quiz in-process: SQLite {sqlite_open * 1000:.2f} ms, pack {pack_open * 1000:.3f} ms")
+
+        pool = ConnectionPool(db_path)
+        sampler = QuestionSampler(QuestionStore(pool.execute), seed=1)
+        courses = [f"course {c}" for c in range(8)]
+        for course in courses:
+            sampler.sample(course, 10) # Id lists loaded, as in a running app
+        start = time.perf_counter()
+        for n in range(quizzes):
+            QuizSession.from_rows(courses[n % 8], sampler.sample(courses[n % 8], 10))
+        sqlite_rate = quizzes / (time.perf_counter() - start)
+        pool.close()
+        pack = QuizPack(pack_path)
+        start = time.perf_counter()
+        for n in range(quizzes):
+            pack.session(courses[n % 8], 10, rng)
+        pack_rate = quizzes / (time.perf_counter() - start)
+        pack.close()
+        print(f"steady state, 10-question quizzes: SQLite sampler {sqlite_rate:,.0f}/sec, pack {pack_rate:,.0f}/sec")
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    import sqlite3
+    import argparse
+    from questionstore import QuestionStore
+    parser = argparse.ArgumentParser(description="Compile the question bank into a quiz pack.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile courses from the database into a pack")
+    build.add_argument("--db", default="rharrellQuiz.db")
+    build.add_argument("--out", default=DEFAULT_PACK)
+    build.add_argument("--course", action="append", help="only this course (repeatable)")
+    info = commands.add_parser("info", help="list the courses in a pack")
+    info.add_argument("path", nargs="?", default=DEFAULT_PACK)
+    bench = commands.add_parser("benchmark", help="compare packs with the SQLite path on a scratch bank")
+    bench.add_argument("--questions", type=int, default=100_000)
+    args = parser.parse_args()
+    try:
+        if args.command == "build":
+            from shards import open_pool
+            pool = open_pool(args.db)
+            try:
+                print(build_pack(QuestionStore(pool.execute, shards=pool.shards), args.out, args.course).summary())
+            finally:
+                pool.close()
+        elif args.command == "info":
+            pack = QuizPack(args.path, verify=True)
+            print(f"{args.path}: format {FORMAT_VERSION}, built {time.ctime(pack.built_at)}"
+                  + ("" if pack.source_stamp else " (from a bank without a course catalog; staleness is not detected)"))
+            for course in pack.courses():
+                print(f"  {course}: {pack.count(course):,} questions")
+            pack.close()
+        else:
+            run_benchmark(args.questions)
+    except (sqlite3.Error, PackError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,336 @@
+"""Serves quizzes to a whole lab over a small HTTP/JSON API.
+
+Usage:
+    python quizserver.py serve [--host 127.0.0.1] [--port 8765]
+    python quizserver.py loadtest [--host ...] [--port ...] [--students 2000] [--concurrency 500]
+
+API (every body is JSON):
+    GET  /quizzes                    -> {"quizzes": [course, ...]}
+    POST /sessions {"course": ...}   -> {"session": id, "total": n, "question": {...}}
+    GET  /sessions/<id>              -> {"score": ..., "answered": ..., "question": {...} or null}
+    POST /sessions/<id>/answer {"choice": 0-3 or "A"-"D"}
+                                     -> {"correct": bool, "correct_answer": "B", "score": ...,
+                                         "finished": bool, "question": next question or null}
+    GET  /sessions/<id>/score        -> {"score": ..., "total": ..., "out_of_10": ...}
+
+One asyncio event loop handles every connection. Quiz state lives in
+memory as quizengine.QuizSession objects, so answering never touches the
+database. The only DB work is listing quizzes and sampling a new quiz,
+which uses the helpers the desktop app uses too (quizservices.QuizServices)
+on a small thread pool sized to the connection pool. Finished and
+in-progress attempts are recorded through the server's own
+attemptlog.AttemptLog, which batches the writes on its own thread.
+"""
+import sys
+import json
+import time
+import asyncio
+import secrets
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from quizengine import QuizSession, InvalidQuestionError, LETTERS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+SESSION_TTL = 30 * 60 # Seconds a session may sit idle before it is dropped
+QUIZ_LIST_TTL = 5.0 # Seconds the course list is reused before asking the database again
+MAX_BODY = 64 * 1024
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def question_payload(session):
+    """The current question without its answer, or None at the end of the quiz."""
+    question = session.current
+    if question is None:
+        return None
+    return {"id": question.id, "number": session.index + 1, "total": session.total,
+            "text": question.text, "options": list(question.options)}
+
+
+class QuizServer:
+    """Holds the live sessions and answers API requests."""
+    def __init__(self, list_quizzes, sample_questions, db_threads=4, attempt_log=None):
+        self.list_quizzes = list_quizzes
+        self.sample_questions = sample_questions
+        self.attempt_log = attempt_log # Optional; None records nothing
+        self.db = ThreadPoolExecutor(max_workers=db_threads, thread_name_prefix="quiz-db")
+        self.sessions = {} # id -> [QuizSession, last used]
+        self._quizzes = None
+        self._quizzes_at = 0.0
+        self.requests = 0
+
+    # --- DATABASE (thread pool) ---
+
+    async def _run_db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.db, fn, *args)
+
+    async def quizzes(self):
+        now = time.monotonic()
+        if self._quizzes is None or now - self._quizzes_at > QUIZ_LIST_TTL:
+            self._quizzes = await self._run_db(self.list_quizzes)
+            self._quizzes_at = now
+        return self._quizzes
+
+    # --- SESSIONS ---
+
+    def _session(self, session_id):
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            raise HTTPError(404, "no such session (it may have expired)")
+        entry[1] = time.monotonic()
+        return entry[0]
+
+    async def expire_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            cutoff = time.monotonic() - SESSION_TTL
+            for session_id in [sid for sid, (_, used) in self.sessions.items() if used < cutoff]:
+                session, _ = self.sessions.pop(session_id)
+                if self.attempt_log is not None:
+                    self.attempt_log.abandon(session) # No-op for a quiz that was finished
+
+    async def start_session(self, body):
+        course = body.get("course")
+        if course not in await self.quizzes(): # Also keeps arbitrary names away from the SQL
+            raise HTTPError(404, f"no quiz named {course!r}")
+        rows = await self._run_db(self.sample_questions, course)
+        try:
+            session = QuizSession.from_rows(course, rows or [], timed=self.attempt_log is not None)
+        except InvalidQuestionError as e:
+            raise HTTPError(500, str(e))
+        if not session.total:
+            raise HTTPError(404, f"quiz {course!r} has no questions")
+        session_id = secrets.token_urlsafe(12)
+        self.sessions[session_id] = [session, time.monotonic()]
+        if self.attempt_log is not None:
+            self.attempt_log.start(session)
+        return 201, {"session": session_id, "total": session.total, "question": question_payload(session)}
+
+    def answer(self, session_id, body):
+        session = self._session(session_id)
+        if session.finished:
+            raise HTTPError(400, "the quiz is already finished")
+        choice = body.get("choice")
+        if isinstance(choice, str) and len(choice) == 1 and choice.upper() in LETTERS:
+            choice = LETTERS.index(choice.upper())
+        if not isinstance(choice, int) or isinstance(choice, bool) or not 0 <= choice < 4:
+            raise HTTPError(400, "choice must be 0-3 or A-D")
+        question = session.current
+        correct = session.answer(choice)
+        session.advance()
+        if self.attempt_log is not None:
+            self.attempt_log.answered(session)
+            if session.finished:
+                self.attempt_log.finish(session)
+        return 200, {"correct": correct, "correct_answer": question.correct_letter, "score": session.score,
+                     "finished": session.finished, "question": question_payload(session)}
+
+    def state(self, session_id):
+        session = self._session(session_id)
+        return 200, {"course": session.course, "score": session.score, "answered": len(session.answers),
+                     "total": session.total, "question": question_payload(session)}
+
+    def score(self, session_id):
+        session = self._session(session_id)
+        return 200, {"course": session.course, "score": session.score, "total": session.total,
+                     "finished": session.finished, "out_of_10": session.score_out_of(10)}
+
+    # --- HTTP ---
+
+    async def route(self, method, path, body):
+        parts = [part for part in path.split("?", 1)[0].split("/") if part]
+        if parts == ["quizzes"]:
+            if method != "GET":
+                raise HTTPError(405, "use GET")
+            return 200, {"quizzes": await self.quizzes()}
+        if parts == ["sessions"]:
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            return await self.start_session(body)
+        if len(parts) == 2 and parts[0] == "sessions" and method == "GET":
+            return self.state(parts[1])
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "answer" and method == "POST":
+            return self.answer(parts[1], body)
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "score" and method == "GET":
+            return self.score(parts[1])
+        raise HTTPError(404, f"no route for {method} {path}")
+
+    async def handle_connection(self, reader, writer):
+        """Serves requests on one keep-alive connection until the client closes it."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, path, version = lines[0].split(" ", 2)
+                except ValueError:
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+                self.requests += 1
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                    if length > MAX_BODY:
+                        raise HTTPError(413, "request body too large")
+                    raw = await reader.readexactly(length) if length else b""
+                    try:
+                        body = json.loads(raw) if raw else {}
+                    except ValueError:
+                        raise HTTPError(400, "body is not valid JSON")
+                    if not isinstance(body, dict):
+                        raise HTTPError(400, "body must be a JSON object")
+                    status, payload = await self.route(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except Exception as e: # A database error must not take the server down
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=2048)
+        print(f"Quiz server listening on http://{host}:{port}/ (Ctrl+C to stop)")
+        expiry = asyncio.create_task(self.expire_sessions())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            expiry.cancel()
+            self.db.shutdown(wait=False, cancel_futures=True)
+
+
+# --- LOAD TEST CLIENT ---
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: quiz\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    data = await reader.readexactly(length) if length else b""
+    return status, json.loads(data) if data else None
+
+async def _student(host, port, latencies, errors, rng):
+    """One simulated student: list quizzes, start one, answer every question, read the score."""
+    reader, writer = await asyncio.open_connection(host, port)
+    async def timed(name, method, path, payload=None):
+        start = time.perf_counter()
+        status, body = await _request(reader, writer, method, path, payload)
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+        if status >= 400:
+            errors.append((name, status, body))
+        return body
+    try:
+        quizzes = (await timed("list", "GET", "/quizzes"))["quizzes"]
+        started = await timed("start", "POST", "/sessions", {"course": rng.choice(quizzes)})
+        if not started or "session" not in started:
+            return
+        session_id = started["session"]
+        question = started["question"]
+        while question is not None:
+            result = await timed("answer", "POST", f"/sessions/{session_id}/answer", {"choice": rng.randrange(4)})
+            question = result.get("question") if result else None
+        await timed("score", "GET", f"/sessions/{session_id}/score")
+    finally:
+        writer.close()
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run_load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, students=2000, concurrency=500, seed=1234):
+    """Runs `students` complete quizzes with up to `concurrency` at once and prints latency percentiles."""
+    import random
+    rng = random.Random(seed)
+    latencies, errors = {}, []
+    gate = asyncio.Semaphore(concurrency)
+    async def one():
+        async with gate:
+            try:
+                await _student(host, port, latencies, errors, rng)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                errors.append(("connection", 0, str(e)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(students)))
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{students:,} students ({concurrency} at a time): {total:,} requests in {elapsed:.2f}s "
+          f"= {total / elapsed:,.0f} requests/sec, {len(errors)} errors")
+    print(f"{'request':<10} {'count':>8} {'p50':>9} {'p99':>9} {'max':>9}")
+    for name in ("list", "start", "answer", "score"):
+        ordered = sorted(latencies.get(name, []))
+        if ordered:
+            print(f"{name:<10} {len(ordered):>8,} {_percentile(ordered, 0.50) * 1000:>6.2f} ms "
+                  f"{_percentile(ordered, 0.99) * 1000:>6.2f} ms {ordered[-1] * 1000:>6.2f} ms")
+    for error in errors[:5]:
+        print(f"  error: {error}")
+    return latencies, errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-student quiz server and load tester.")
+    parser.add_argument("mode", choices=["serve", "loadtest"])
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--students", type=int, default=2000, help="loadtest: quizzes to run in total")
+    parser.add_argument("--concurrency", type=int, default=500, help="loadtest: students at the same time")
+    args = parser.parse_args()
+
+    try:
+        if args.mode == "serve":
+            # The desktop app's helpers, so the server samples quizzes exactly like QuizApp does;
+            # the journal is the server's own, never the desktop app's
+            import atexit
+            from shards import open_pool
+            from attemptlog import AttemptLog
+            from quizservices import QuizServices, DB_NAME, DB_POOL_SIZE
+            db_pool = open_pool(DB_NAME, size=DB_POOL_SIZE)
+            atexit.register(db_pool.close)
+            services = QuizServices(db_pool)
+            atexit.register(services.close)
+            attempt_log = AttemptLog(db_pool, "server_attempts.journal", source="server",
+                                     on_flush=services.item_analytics.refresh)
+            attempt_log.recover()
+            atexit.register(attempt_log.close) # Runs before db_pool.close
+            server = QuizServer(services.quiz_tables, services.questions, db_threads=DB_POOL_SIZE,
+                                attempt_log=attempt_log)
+            asyncio.run(server.serve(args.host, args.port))
+        else:
+            latencies, errors = asyncio.run(run_load_test(args.host, args.port, args.students, args.concurrency))
+            sys.exit(1 if errors else 0)
+    except KeyboardInterrupt:
+        pass
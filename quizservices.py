@@ -0,0 +1,74 @@
+"""The question-bank helpers the desktop app and the quiz server share.
+
+Importing this module opens nothing and loads nothing else, so a program
+can read the configuration below before its first screen is up. Each
+program opens its own pool and builds a QuizServices on it, so the course
+list and quiz sampling behave the same in both, while each keeps its own
+attempt journal and whatever else belongs to its front end (newMainFile.py,
+quizserver.py).
+"""
+
+# --- SHARED CONFIGURATION ---
+DB_NAME = "rharrellQuiz.db"
+NUM_QUESTIONS = 10
+DB_POOL_SIZE = 4 # Long-lived connections per program (see dbpool.py)
+
+
+class QuizServices:
+    """Store, sampler, valid-question index, cache and statistics over one pool.
+
+    `execute` is the query callable the store uses (the pool's own unless
+    the front end wraps it, e.g. to report errors in a dialog). With
+    `snapshot_mode`, quizzes are drawn from a read-only copy of the bank
+    (see snapshot.py); a sharded bank is always read directly.
+    """
+    def __init__(self, db_pool, execute=None, seed=None, snapshot_mode=None, cache_rows=None):
+        from sampler import QuestionSampler
+        from snapshot import Snapshot
+        from questionstore import QuestionStore
+        from questioncache import QuestionCache, DEFAULT_MAX_ROWS
+        from analytics import ItemAnalytics
+        from validindex import ValidIndex
+        self.db_pool = db_pool
+        # Works against either the per-course tables or the unified schema (see migrate.py),
+        # and switches over if the bank is migrated while this program is running
+        self.question_store = QuestionStore(execute or db_pool.execute, shards=db_pool.shards,
+                                            data_version=db_pool.external_version)
+        self.question_store.on_layout_change = self.layout_changed
+        # A copy of the main file alone would have no questions in a sharded bank
+        self.question_bank = (Snapshot(db_pool.db_path, mode=snapshot_mode)
+                              if snapshot_mode and not db_pool.shards else None)
+        self.quiz_store = QuestionStore(self.question_bank.execute) if self.question_bank else self.question_store
+        # Questions that fail validate_question are never sampled (see validindex.py)
+        self.valid_index = ValidIndex(db_pool, self.question_store, workers=db_pool.size)
+        self.question_sampler = QuestionSampler(self.quiz_store, seed=seed, id_source=self.valid_index.valid_ids)
+        if self.question_bank:
+            self.question_bank.on_reload = self.bank_reloaded
+        # external_version catches edits made by other processes
+        self.question_cache = QuestionCache(self.question_store, max_rows=cache_rows or DEFAULT_MAX_ROWS,
+                                            data_version=db_pool.external_version)
+        # Difficulty, discrimination and distractor statistics, rolled up as attempts are written
+        self.item_analytics = ItemAnalytics(db_pool)
+
+    def bank_reloaded(self):
+        """A newer copy of the bank is in: re-detect its layout and re-read the question id lists."""
+        self.quiz_store.refresh_layout()
+        self.question_sampler.invalidate()
+
+    def layout_changed(self):
+        """The bank was migrated under us: question ids changed, so drop everything cached by id."""
+        self.question_cache.invalidate()
+        self.question_sampler.invalidate()
+
+    def quiz_tables(self):
+        """The names of all courses (quizzes); cached until the database changes."""
+        return self.question_cache.list_courses()
+
+    def questions(self, course_name, count=NUM_QUESTIONS):
+        """`count` random usable questions from a course."""
+        return self.question_sampler.sample(course_name, count)
+
+    def close(self):
+        """Stops the snapshot's reloads; the pool is closed by whoever opened it."""
+        if self.question_bank:
+            self.question_bank.close()
@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+import sys
+import os
+import tempfile
+import shutil
+import sqlite3
+
+
+class QuestionSampler:
+    """Draws k random questions from a course in O(k) instead of ORDER BY RANDOM().
+
+    Keeps an in-memory list of question ids per course (loaded the first time
+    the course is sampled) plus an id -> position map, so adds and deletes
+    are O(1) swap-removes. Sampled ids are fetched through the QuestionStore
+    with a single `WHERE id IN (...)` primary-key lookup.
+
+    `id_source(table_name)` lists the ids a course is sampled from; every id
+    in the course by default (validindex.ValidIndex.valid_ids leaves out
+    unusable questions).
+    """
+    def __init__(self, store, seed=None, id_source=None):
+        self.store = store
+        self.id_source = id_source or store.course_question_ids
+        self.rng = random.Random(seed)
+        self._ids = {} # table_name -> [id, ...]
+        self._pos = {} # table_name -> {id: index into _ids[table_name]}
+        self._lock = threading.Lock()
+
+    def reseed(self, seed):
+        """Resets the random stream so the same seed gives the same quizzes."""
+        self.rng.seed(seed)
+
+    def _index(self, table_name):
+        """Returns the id list for a course, loading it on first use."""
+        ids = self._ids.get(table_name)
+        if ids is None:
+            ids = list(self.id_source(table_name) or [])
+            self._ids[table_name] = ids
+            self._pos[table_name] = {q_id: i for i, q_id in enumerate(ids)}
+        return ids
+
+    def add(self, table_name, q_id):
+        """Registers a newly inserted question id."""
+        with self._lock:
+            if table_name not in self._ids: # Not loaded yet; it will be read fresh later
+                return
+            pos = self._pos[table_name]
+            if q_id not in pos:
+                pos[q_id] = len(self._ids[table_name])
+                self._ids[table_name].append(q_id)
+
+    def discard(self, table_name, q_id):
+        """Removes a deleted question id by swapping it with the last one."""
+        with self._lock:
+            if table_name not in self._ids:
+                return
+            ids, pos = self._ids[table_name], self._pos[table_name]
+            i = pos.pop(q_id, None)
+            if i is None:
+                return
+            last = ids.pop()
+            if i < len(ids):
+                ids[i] = last
+                pos[last] = i
+
+    def invalidate(self, table_name=None):
+        """Drops the cached index for one course, or for all of them."""
+        with self._lock:
+            if table_name is None:
+                self._ids.clear()
+                self._pos.clear()
+            else:
+                self._ids.pop(table_name, None)
+                self._pos.pop(table_name, None)
+
+    def sample_ids(self, table_name, k):
+        """Picks up to k distinct question ids without touching the table."""
+        with self._lock:
+            ids = self._index(table_name)
+            return self.rng.sample(ids, min(k, len(ids)))
+
+    def sample(self, table_name, k):
+        """Returns up to k full question rows in random order."""
+        ids = self.sample_ids(table_name, k)
+        if not ids:
+            return []
+        rows = self.store.questions_by_ids(table_name, ids)
+        if rows is False:
+            return []
+        rows_by_id = {row[0]: row for row in rows}
+        # Ids deleted behind our back are skipped; keep the sampled order otherwise
+        return [rows_by_id[q_id] for q_id in ids if q_id in rows_by_id]
+
+
+# --- BENCHMARK ---
+
+def _build_bank(db_path, table_name, size):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        conn.execute(f'''CREATE TABLE "{table_name}" (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT NOT NULL,
+                option_a TEXT NOT NULL,
+                option_b TEXT NOT NULL,
+                option_c TEXT NOT NULL,
+                option_d TEXT NOT NULL,
+                correct_answer TEXT NOT NULL
+            )''')
+        conn.executemany(
+            f'INSERT INTO "{table_name}" (question, option_a, option_b, option_c, option_d, correct_answer) VALUES (?, ?, ?, ?, ?, ?)',
+            ((f"Question {i}?", f"a{i}", f"b{i}", f"c{i}", f"d{i}", "ABCD"[i % 4]) for i in range(size))
+        )
+
+def run_benchmark(sizes=(100, 1_000, 10_000, 100_000), k=10, rounds=200, seed=1234):
+    """Compares ORDER BY RANDOM() against QuestionSampler across bank sizes."""
+    from dbpool import ConnectionPool
+    from questionstore import QuestionStore
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        pool = ConnectionPool(db_path)
+        try:
+            print(f"{'bank size':>10} {'ORDER BY RANDOM()':>20} {'sampler':>12} {'index load':>12}")
+            for size in sizes:
+                table_name = f"bench {size}"
+                _build_bank(db_path, table_name, size)
+
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    pool.execute(f'SELECT * FROM "{table_name}" ORDER BY RANDOM() LIMIT {k}', fetch="all")
+                old = (time.perf_counter() - start) / rounds
+
+                sampler = QuestionSampler(QuestionStore(pool.execute), seed=seed)
+                start = time.perf_counter()
+                sampler.sample_ids(table_name, k)
+                load = time.perf_counter() - start
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    sampler.sample(table_name, k)
+                new = (time.perf_counter() - start) / rounds
+
+                print(f"{size:>10,} {old * 1000:>17.3f} ms {new * 1000:>9.3f} ms {load * 1000:>9.3f} ms")
+        finally:
+            pool.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run_benchmark(*([tuple(int(n) for n in sys.argv[1].split(","))] if len(sys.argv) > 1 else []))
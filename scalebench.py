@@ -0,0 +1,229 @@
+"""Scale benchmarks for the database helpers, with a saved baseline that catches regressions.
+
+Usage: python scalebench.py [--sizes small medium large] [--threshold 0.25]
+       python scalebench.py --save          (make this run the new baseline)
+       SCALEBENCH_TEST=1 python -m pytest test_scalebench.py  (the small bank against the baseline, as a test)
+
+Every helper is timed against synthetic banks of each size (see
+synthbank.py; banks are built once and kept in scalebench_banks/). Each
+size runs in a fresh interpreter whose working directory holds that bank
+as rharrellQuiz.db, so newMainFile.py and databasetester.py are imported
+unchanged and time exactly what the apps run. Results are compared with
+scalebench_baseline.json, which is committed; the exit status is 1 when
+any helper's median is more than `threshold` slower than its baseline, and
+2 when there is no baseline to compare with.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import sqlite3
+import platform
+import argparse
+import subprocess
+
+# name -> (courses, questions)
+SIZES = {
+    "small": (4, 40), # The seed bank
+    "medium": (100, 10_000),
+    "large": (1000, 100_000),
+}
+BANK_DIR = "scalebench_banks"
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(HERE, "scalebench_baseline.json")
+DEFAULT_THRESHOLD = 0.25 # A median this much slower than the baseline is a regression
+NOISE_FLOOR_MS = 0.05 # Differences smaller than this are never reported
+DEFAULT_ROUNDS = 50
+BUDGET_SECONDS = 2.0 # Per benchmark; slow ones stop early, after at least MIN_ROUNDS
+MIN_ROUNDS = 5
+SEED = 1234
+
+
+# --- MEASURING (runs inside the per-size interpreter) ---
+
+def _measure(fn, setup=None, rounds=DEFAULT_ROUNDS, budget=BUDGET_SECONDS):
+    """Times `fn()` after one warm-up call; `setup()` runs untimed before every call."""
+    if setup:
+        setup()
+    fn()
+    times = []
+    started = time.perf_counter()
+    while len(times) < rounds and (len(times) < MIN_ROUNDS or time.perf_counter() - started < budget):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return _stats(times)
+
+def _stats(times):
+    """pytest-benchmark style figures, in milliseconds."""
+    times = sorted(times)
+    count = len(times)
+    mean = sum(times) / count
+    stddev = math.sqrt(sum((t - mean) ** 2 for t in times) / (count - 1)) if count > 1 else 0.0
+    middle = count // 2
+    median = times[middle] if count % 2 else (times[middle - 1] + times[middle]) / 2
+    return {"rounds": count,
+            "min_ms": round(times[0] * 1000, 4),
+            "median_ms": round(median * 1000, 4),
+            "mean_ms": round(mean * 1000, 4),
+            "stddev_ms": round(stddev * 1000, 4),
+            "max_ms": round(times[-1] * 1000, 4),
+            "ops": round(1 / mean, 1) if mean else 0.0}
+
+def run_size(rounds=DEFAULT_ROUNDS):
+    """Times the helpers against ./rharrellQuiz.db. Returns {benchmark: stats}."""
+    sys.path.insert(0, HERE)
+    import newMainFile as app
+    import databasetester as viewer
+    from virtualtree import DEFAULT_PAGE_SIZE
+    courses = app.get_services().question_store.list_courses()
+    rng = random.Random(SEED)
+    picked = [rng.choice(courses)] # Warm benchmarks keep hitting this one
+
+    def pick():
+        picked[0] = rng.choice(courses)
+
+    def pick_cold():
+        pick()
+        app.get_services().question_sampler.invalidate()
+        app.get_services().question_cache.invalidate()
+
+    def load_table_data():
+        # What QuizDBViewer.load_table_data sets off: a row count, then the first page
+        viewer.question_store.count_questions(picked[0])
+        viewer.question_store.page_questions(picked[0], 0, DEFAULT_PAGE_SIZE)
+
+    benchmarks = [
+        ("get_quiz_tables (cold)", app.get_quiz_tables, app.get_services().question_cache.invalidate),
+        ("get_quiz_tables (cached)", app.get_quiz_tables, None),
+        ("get_course_catalog (cold)", app.get_course_catalog, app.get_services().question_cache.invalidate),
+        ("get_questions (cold)", lambda: app.get_questions(picked[0]), pick_cold),
+        ("get_questions (warm)", lambda: app.get_questions(picked[0]), None),
+        ("get_all_questions_for_course (cold)", lambda: app.get_all_questions_for_course(picked[0]), pick_cold),
+        ("count_questions_for_course", lambda: app.count_questions_for_course(picked[0]), pick),
+        ("QuizDBViewer.load_table_data", load_table_data, pick),
+    ]
+    return {name: _measure(fn, setup, rounds) for name, fn, setup in benchmarks}
+
+
+# --- DRIVING ---
+
+def bank_dir(size):
+    courses, questions = SIZES[size]
+    return os.path.join(HERE, BANK_DIR, f"{size}-{courses}x{questions}-seed{SEED}")
+
+def ensure_bank(size):
+    """Builds the bank for `size` unless an earlier run already did. Returns its directory.
+
+    A bank kept from an earlier run gets any migrations added since, so it
+    matches what zdatabasesetup.py would leave.
+    """
+    from synthbank import build_bank
+    from zdatabasesetup import apply_migrations
+    directory = bank_dir(size)
+    path = os.path.join(directory, "rharrellQuiz.db")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        courses, questions = SIZES[size]
+        partial = path + ".partial"
+        for name in (partial, partial + "-wal", partial + "-shm"):
+            if os.path.exists(name):
+                os.remove(name)
+        print(build_bank(partial, courses, questions, seed=SEED).summary())
+        os.replace(partial, path) # build_bank closes cleanly, so the WAL is already folded in
+    else:
+        conn = sqlite3.connect(path)
+        try:
+            apply_migrations(conn)
+        finally:
+            conn.close()
+    return directory
+
+def measure_size(size, rounds=DEFAULT_ROUNDS):
+    """Runs run_size in a fresh interpreter inside the size's bank directory."""
+    directory = ensure_bank(size)
+    code = f"import sys, json; sys.path.insert(0, {HERE!r}); import scalebench; print(json.dumps(scalebench.run_size({rounds})))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=directory, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"benchmarks for '{size}' failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Lists (size, benchmark, baseline ms, current ms) for every median past the threshold."""
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, stats in benchmarks.items():
+            before = baseline.get(size, {}).get(name)
+            if not before:
+                continue
+            now, then = stats["median_ms"], before["median_ms"]
+            if now > then * (1 + threshold) and now - then > NOISE_FLOOR_MS:
+                regressions.append((size, name, then, now))
+    return regressions
+
+def format_results(results, baseline=None):
+    lines = []
+    for size, benchmarks in results.items():
+        courses, questions = SIZES[size]
+        lines.append(f"{size}: {courses:,} courses, {questions:,} questions")
+        lines.append(f"  {'benchmark':<38} {'rounds':>6} {'min ms':>9} {'median ms':>10} {'stddev':>8} {'ops/s':>10} {'vs base':>8}")
+        for name, s in benchmarks.items():
+            before = (baseline or {}).get(size, {}).get(name)
+            change = f"{s['median_ms'] / before['median_ms'] - 1:+.0%}" if before and before["median_ms"] else ""
+            lines.append(f"  {name:<38} {s['rounds']:>6} {s['min_ms']:>9.3f} {s['median_ms']:>10.3f} "
+                         f"{s['stddev_ms']:>8.3f} {s['ops']:>10,.0f} {change:>8}")
+    return "\n".join(lines)
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as saved:
+        return json.load(saved)
+
+def save_baseline(results, path=BASELINE_FILE):
+    """Merges `results` into the baseline, so saving one size keeps the others."""
+    saved = load_baseline(path) or {"results": {}}
+    saved["results"].update(results)
+    saved.update({"saved_at": time.time(), "python": platform.python_version(),
+                  "machine": platform.platform(), "seed": SEED})
+    with open(path, "w", encoding="utf-8") as out:
+        json.dump(saved, out, indent=2)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the database helpers across bank sizes.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail when a median is this fraction slower than the baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+    try:
+        results = {size: measure_size(size, args.rounds) for size in args.sizes}
+    except (RuntimeError, OSError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+    baseline = load_baseline(args.baseline)
+    print(format_results(results, baseline["results"] if baseline else None))
+    if args.save:
+        print(f"\nSaved as the baseline in '{save_baseline(results, args.baseline)}'.")
+    elif baseline is None:
+        print(f"\nNo baseline in '{args.baseline}'; run with --save to record one.")
+        sys.exit(2)
+    else:
+        missing = [size for size in results if size not in baseline["results"]]
+        if missing:
+            print(f"\nNo baseline for {', '.join(missing)}; run with --save --sizes {' '.join(missing)} to add one.")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for size, name, then, now in regressions:
+                print(f"  {size} / {name}: {then:.3f} ms -> {now:.3f} ms")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} of the baseline.")
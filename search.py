@@ -0,0 +1,327 @@
+"""Full-text search over every course's questions and options (SQLite FTS5).
+
+Usage: python search.py [rows]    benchmarks the index against a LIKE '%term%' scan
+
+The index is a single FTS5 table, `question_search`, covering the question
+text and options A-D of every course. It is kept in sync by triggers: one
+set per course table in the legacy layout, one set on `questions` in the
+unified layout, so imports and edits from any tool are picked up. Legacy
+rows are stored under rowid (course number << 32 | question id), with the
+course numbers kept in `search_courses`; unified rows use the question id.
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+from questionstore import LAYOUT_UNIFIED, LAYOUT_SHARDED, LIST_LEGACY_TABLES_SQL, detect_layout, connection_execute
+
+DEFAULT_LIMIT = 50
+MIN_PREFIX = 2 # Shorter trailing fragments are matched as whole words, not prefixes
+RANK_CAP = 1000 # Searches with more matches than this are ranked within their first RANK_CAP matches
+COURSE_SHIFT = 32
+
+SEARCH_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS question_search USING fts5(
+           question, option_a, option_b, option_c, option_d,
+           course UNINDEXED, question_id UNINDEXED,
+           tokenize = 'unicode61 remove_diacritics 2',
+           prefix = '2 3 4'
+       )''',
+    # Hits in the question text count four times as much as hits in an option
+    "INSERT INTO question_search (question_search, rank) VALUES ('rank', 'bm25(4.0, 1.0, 1.0, 1.0, 1.0)')",
+    '''CREATE TABLE IF NOT EXISTS search_courses (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           name TEXT NOT NULL UNIQUE
+       )''',
+]
+
+INDEX_COLUMNS = "question, option_a, option_b, option_c, option_d, course, question_id"
+TEXT_COLUMNS = "question, option_a, option_b, option_c, option_d"
+
+UNIFIED_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS search_ai_questions AFTER INSERT ON questions BEGIN
+           INSERT INTO question_search (rowid, question, option_a, option_b, option_c, option_d, course, question_id)
+           VALUES (NEW.id, NEW.question, NEW.option_a, NEW.option_b, NEW.option_c, NEW.option_d,
+                   (SELECT name FROM courses WHERE id = NEW.course_id), NEW.id);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS search_ad_questions AFTER DELETE ON questions BEGIN
+           DELETE FROM question_search WHERE rowid = OLD.id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS search_au_questions
+       AFTER UPDATE OF question, option_a, option_b, option_c, option_d, course_id ON questions BEGIN
+           DELETE FROM question_search WHERE rowid = OLD.id;
+           INSERT INTO question_search (rowid, question, option_a, option_b, option_c, option_d, course, question_id)
+           VALUES (NEW.id, NEW.question, NEW.option_a, NEW.option_b, NEW.option_c, NEW.option_d,
+                   (SELECT name FROM courses WHERE id = NEW.course_id), NEW.id);
+       END''',
+]
+
+
+def _legacy_triggers(course_name, course_no):
+    rowid = f"({course_no} << {COURSE_SHIFT}) | "
+    literal = "'" + course_name.replace("'", "''") + "'"
+    insert = f'''INSERT INTO question_search (rowid, {INDEX_COLUMNS})
+               VALUES ({rowid}NEW.id, NEW.question, NEW.option_a, NEW.option_b, NEW.option_c, NEW.option_d,
+                       {literal}, NEW.id);'''
+    return [
+        f'''CREATE TRIGGER IF NOT EXISTS "search_ai_{course_name}" AFTER INSERT ON "{course_name}" BEGIN
+               {insert}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS "search_ad_{course_name}" AFTER DELETE ON "{course_name}" BEGIN
+               DELETE FROM question_search WHERE rowid = {rowid}OLD.id;
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS "search_au_{course_name}"
+           AFTER UPDATE OF {TEXT_COLUMNS} ON "{course_name}" BEGIN
+               DELETE FROM question_search WHERE rowid = {rowid}OLD.id;
+               {insert}
+           END''',
+    ]
+
+
+# --- INSTALLATION ---
+# These take a sqlite3 connection and never commit, so they can run inside
+# a migration or any other transaction the caller controls.
+
+def _begin(conn):
+    """The sqlite3 module only opens transactions for DML; the DDL below must not autocommit."""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+def fts5_available(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def index_installed(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='question_search'").fetchone() is not None
+
+def _course_no(conn, course_name):
+    conn.execute("INSERT OR IGNORE INTO search_courses (name) VALUES (?)", (course_name,))
+    return conn.execute("SELECT id FROM search_courses WHERE name = ?", (course_name,)).fetchone()[0]
+
+def _index_course(conn, course_name):
+    """Creates one legacy course's triggers and (re)indexes its current rows."""
+    course_no = _course_no(conn, course_name)
+    for statement in _legacy_triggers(course_name, course_no):
+        conn.execute(statement)
+    conn.execute("DELETE FROM question_search WHERE rowid BETWEEN ? AND ?",
+                 (course_no << COURSE_SHIFT, ((course_no + 1) << COURSE_SHIFT) - 1))
+    conn.execute(
+        f'''INSERT INTO question_search (rowid, {INDEX_COLUMNS})
+            SELECT ({course_no} << {COURSE_SHIFT}) | id, {TEXT_COLUMNS}, ?, id FROM "{course_name}"''',
+        (course_name,))
+
+def install(conn):
+    """Creates the index and the triggers for the current layout, then rebuilds it. Returns rows indexed."""
+    layout = detect_layout(connection_execute(conn))
+    if layout == LAYOUT_SHARDED:
+        # Triggers in a shard file cannot write to an index in the main file
+        raise sqlite3.OperationalError("search is not available for a sharded question bank")
+    _begin(conn)
+    for statement in SEARCH_SCHEMA:
+        conn.execute(statement)
+    # Start from a clean slate so triggers from the other layout never linger
+    triggers = conn.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND name GLOB 'search_a[idu]_*'").fetchall()
+    for (name,) in triggers:
+        conn.execute(f'DROP TRIGGER "{name}"')
+    conn.execute("DELETE FROM question_search")
+
+    if layout == LAYOUT_UNIFIED:
+        for statement in UNIFIED_TRIGGERS:
+            conn.execute(statement)
+        conn.execute(
+            f'''INSERT INTO question_search (rowid, {INDEX_COLUMNS})
+                SELECT q.id, q.question, q.option_a, q.option_b, q.option_c, q.option_d, c.name, q.id
+                FROM questions q JOIN courses c ON c.id = q.course_id''')
+    else:
+        for (course_name,) in conn.execute(LIST_LEGACY_TABLES_SQL).fetchall():
+            _index_course(conn, course_name)
+    return conn.execute("SELECT COUNT(*) FROM question_search").fetchone()[0]
+
+def sync_course(conn, course_name):
+    """Makes sure a (possibly new) course is covered by the index; a no-op if search is not installed."""
+    if not index_installed(conn) or detect_layout(connection_execute(conn)) == LAYOUT_UNIFIED:
+        return # The unified triggers already cover every course
+    _begin(conn)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name = ?",
+                          (f"search_ai_{course_name}",)).fetchone()
+    if not exists:
+        _index_course(conn, course_name)
+
+@contextmanager
+def bulk_load(conn, course_name):
+    """Suspends a course's triggers while rows are bulk-inserted, then indexes them in one pass.
+
+    A trigger that writes to FTS5 makes it flush its buffer on every row,
+    which cuts a bulk import to a quarter of its speed. The caller must hold
+    the write transaction throughout, so no other writes can slip past.
+    """
+    if not index_installed(conn):
+        yield
+        return
+    _begin(conn)
+    unified = detect_layout(connection_execute(conn)) == LAYOUT_UNIFIED
+    if unified:
+        triggers, table = UNIFIED_TRIGGERS, "questions"
+    else:
+        sync_course(conn, course_name)
+        course_no = _course_no(conn, course_name)
+        triggers, table = _legacy_triggers(course_name, course_no), course_name
+    last_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM "{table}"').fetchone()[0]
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND tbl_name = ? "
+                                "AND name GLOB 'search_a[idu]_*'", (table,)).fetchall():
+        conn.execute(f'DROP TRIGGER "{name}"')
+    yield
+    if unified:
+        conn.execute(
+            f'''INSERT INTO question_search (rowid, {INDEX_COLUMNS})
+                SELECT q.id, q.question, q.option_a, q.option_b, q.option_c, q.option_d, c.name, q.id
+                FROM questions q JOIN courses c ON c.id = q.course_id WHERE q.id > ?''', (last_id,))
+    else:
+        conn.execute(
+            f'''INSERT INTO question_search (rowid, {INDEX_COLUMNS})
+                SELECT ({course_no} << {COURSE_SHIFT}) | id, {TEXT_COLUMNS}, ?, id FROM "{course_name}" WHERE id > ?''',
+            (course_name, last_id))
+    for statement in triggers:
+        conn.execute(statement)
+
+
+# --- QUERYING ---
+
+def build_match(text):
+    """Turns what the user typed into an FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if not text[-1].isspace() and len(words[-1]) >= MIN_PREFIX:
+        terms[-1] += "*" # Still typing this word
+    return " ".join(terms)
+
+class SearchHits(list):
+    """The hits of one search; `capped` is True when only the first RANK_CAP matches were ranked."""
+    capped = False
+
+
+def search_questions(execute, text, limit=DEFAULT_LIMIT, course_name=None):
+    """Ranked hits as (course, question id, question text), best first.
+
+    bm25 has to read every match of every word before it can score one, so
+    a search with more than RANK_CAP matches (a word found in most
+    questions) is ranked within its first RANK_CAP matches in index order
+    only; that keeps every keystroke around 10 ms on 100k rows, where
+    ranking all 90k matches of "what" takes ~200 ms. The hits then come
+    back with `capped` set, and the search box asks for another word.
+    Searches with fewer matches are ranked in full.
+    """
+    hits = SearchHits()
+    match = build_match(text)
+    if match is None:
+        return hits
+    where, params = "question_search MATCH ?", (match,)
+    if course_name is not None:
+        where, params = where + " AND course = ?", params + (course_name,)
+    # The LIMIT in the subquery stops FTS5 from scoring every match before the outer ORDER BY;
+    # the window count says whether it cut anything off
+    ranked = execute(f"""SELECT rowid, COUNT(*) OVER () FROM (SELECT rowid, rank AS score FROM question_search
+                                                             WHERE {where} LIMIT ?)
+                        ORDER BY score LIMIT ?""", params + (RANK_CAP + 1, limit), fetch="all")
+    if not ranked:
+        return hits
+    hits.capped = ranked[0][1] > RANK_CAP
+    # Only the winners' text is read from the index
+    rowids = [row[0] for row in ranked]
+    rows = execute(f"SELECT rowid, course, question_id, question FROM question_search "
+                   f"WHERE rowid IN ({','.join('?' * len(rowids))})", tuple(rowids), fetch="all")
+    by_rowid = {row[0]: row[1:] for row in rows}
+    hits.extend(by_rowid[rowid] for rowid in rowids if rowid in by_rowid)
+    return hits
+
+
+# --- BENCHMARK ---
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "pre", "con", "ex", "tion", "ment", "al", "er", "ic")
+
+def _vocabulary(rng, size=5000):
+    """Real question banks have a long-tailed vocabulary; a handful of words are in most questions."""
+    common = ["what", "which", "the", "is", "of", "a", "in", "to", "used", "does"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    words = common + sorted(words)
+    weights = [1 / (rank + 1) for rank in range(len(words))] # Zipf's law
+    return words, weights
+
+def _build_bank(conn, rows, courses=10):
+    import random
+    rng = random.Random(1234)
+    words, weights = _vocabulary(rng)
+    per_course = rows // courses
+    for c in range(courses):
+        table_name = f"bench {c}"
+        conn.execute(f'''CREATE TABLE "{table_name}" (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question TEXT NOT NULL, option_a TEXT NOT NULL, option_b TEXT NOT NULL,
+                option_c TEXT NOT NULL, option_d TEXT NOT NULL, correct_answer TEXT NOT NULL
+            )''')
+        conn.executemany(
+            f'INSERT INTO "{table_name}" (question, option_a, option_b, option_c, option_d, correct_answer) VALUES (?, ?, ?, ?, ?, ?)',
+            ((" ".join(rng.choices(words, weights, k=10)) + "?",)
+             + tuple(" ".join(rng.choices(words, weights, k=3)) for _ in range(4)) + ("A",)
+             for _ in range(per_course)))
+    conn.commit()
+    return words
+
+def _like_scan(conn, text):
+    """What search looked like before: every row of every course is read, and nothing is ranked."""
+    pattern = f"%{text.strip()}%"
+    hits = []
+    for (course_name,) in conn.execute(LIST_LEGACY_TABLES_SQL).fetchall():
+        hits.extend(conn.execute(
+            f'''SELECT ?, id, question FROM "{course_name}" WHERE question LIKE ? OR option_a LIKE ?
+                OR option_b LIKE ? OR option_c LIKE ? OR option_d LIKE ?''',
+            (course_name,) + (pattern,) * 5).fetchall())
+    return hits
+
+def run_benchmark(rows=100_000, rounds=10):
+    """Times every keystroke of a few searches, FTS5 against LIKE '%term%' over every course table."""
+    workdir = tempfile.mkdtemp()
+    try:
+        conn = sqlite3.connect(os.path.join(workdir, "bench.db"))
+        words = _build_bank(conn, rows)
+        start = time.perf_counter()
+        with conn:
+            indexed = install(conn)
+        print(f"Indexed {indexed:,} questions in {time.perf_counter() - start:.2f}s.\n")
+        execute = connection_execute(conn)
+
+        # A very common word, a mid-frequency one, a rare one, one that is not there at all
+        searches = ["what is the", words[25] + " " + words[60], words[800], "zebra"]
+        print(f"{'search':<28} {'keys':>4} {'FTS5 avg':>10} {'FTS5 max':>10} {'LIKE avg':>10}")
+        for search in searches:
+            keystrokes = [search[:n] for n in range(MIN_PREFIX, len(search) + 1)]
+            fts_times, like_times = [], []
+            for typed in keystrokes:
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    search_questions(execute, typed)
+                fts_times.append((time.perf_counter() - start) / rounds)
+                start = time.perf_counter()
+                _like_scan(conn, typed)
+                like_times.append(time.perf_counter() - start)
+            print(f"{search:<28} {len(keystrokes):>4} {sum(fts_times) / len(fts_times) * 1000:>7.2f} ms "
+                  f"{max(fts_times) * 1000:>7.2f} ms {sum(like_times) / len(like_times) * 1000:>7.2f} ms")
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    run_benchmark(*([int(sys.argv[1])] if len(sys.argv) > 1 else []))
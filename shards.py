@@ -0,0 +1,431 @@
+"""Optional sharded layout: the course tables spread over one SQLite file per department.
+
+Usage: python shards.py split [database] [--dir DIR]   (move every course into its department's file)
+       python shards.py info [database]
+       python shards.py benchmark [--courses 100] [--questions 50000]
+
+In the sharded layout the main file keeps everything but the questions
+(attempts, statistics, the question checks, ...) plus `course_shards`,
+which maps each course to its shard. A shard is a legacy bank of its
+own: the course tables of one department ("ds 3850" and "ds 3860" go to
+ds.db) with their own course_catalog and catalog triggers.
+
+ShardedPool is a drop-in ConnectionPool. Before running a query it
+ATTACHes the shards of the courses the query names (course tables are
+always double-quoted), so the unchanged legacy SQL in QuestionStore finds
+them; attached shards stay on the pooled connection, up to SQLite's limit
+of MAX_ATTACHED, least recently used first out. Writers lock only the
+files they write, so a bulk import into one department no longer holds
+up edits in the others. Catalog scans read every shard on its own
+connection, in parallel.
+
+A transaction that writes to several files is atomic per file only (a
+limit of SQLite's WAL mode), so course edits never share a transaction
+with main-file writes here. Full-text search (search.py) is not
+available for sharded banks.
+"""
+import os
+import re
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from dbpool import ConnectionPool, DEFAULT_POOL_SIZE, DEFAULT_STATEMENT_CACHE, DEFAULT_TIMEOUT
+from questionstore import (QUESTION_COLUMNS, LEGACY_TABLE_SQL, LIST_LEGACY_TABLES_SQL, CATALOG_SCHEMA,
+                           CATALOG_COLUMNS, LAYOUT_LEGACY, LAYOUT_SHARDED, detect_layout,
+                           connection_execute, register_legacy_course)
+
+MAX_ATTACHED = 10 # SQLite's default SQLITE_MAX_ATTACHED
+DEFAULT_WORKERS = 4 # Shards scanned at once
+SHARD_POOL_SIZE = 2 # Connections kept per shard for scans and catalog writes
+
+SHARD_MAP_SCHEMA = '''CREATE TABLE IF NOT EXISTS course_shards (
+                          course TEXT PRIMARY KEY,
+                          shard TEXT NOT NULL
+                      ) WITHOUT ROWID'''
+
+_QUOTED = re.compile(r'"([^"]+)"') # Course tables are always written as "name"
+
+
+def department(course_name):
+    """The shard a course belongs to by default: the subject part of its name ("ds 3850" -> "ds")."""
+    subject = course_name.split()[0] if course_name.split() else course_name
+    return re.sub(r"[^a-z0-9]+", "_", subject.lower()).strip("_") or "courses"
+
+def default_shard_dir(db_path):
+    return os.path.splitext(os.path.basename(db_path))[0] + "_shards"
+
+def _schema(shard):
+    return f"shard_{shard}"
+
+
+class ShardedPool(ConnectionPool):
+    """A ConnectionPool over a sharded bank that attaches each shard when a query first needs it.
+
+    `execute` routes by itself. Code that runs its own SQL on a connection
+    from `connection()` / `transaction()` calls `attach_course` first,
+    before the transaction starts (SQLite cannot ATTACH inside one).
+    """
+    def __init__(self, db_path, size=DEFAULT_POOL_SIZE, statement_cache=DEFAULT_STATEMENT_CACHE,
+                 timeout=DEFAULT_TIMEOUT, wal=True, trace=None, workers=DEFAULT_WORKERS):
+        super().__init__(db_path, size, statement_cache, timeout, wal, trace)
+        self.workers = workers
+        self._routes = None # course -> shard, from course_shards
+        self._routes_version = None # Main file's data_version when the routes were read
+        self._shard_dir = None
+        self._attached = {} # connection -> OrderedDict of its attached shards, oldest first
+        self._shard_pools = {} # shard -> ConnectionPool on that file alone
+        self._shard_lock = threading.Lock()
+        self._scanner = None
+
+    @property
+    def shards(self):
+        return self
+
+    # --- ROUTING ---
+
+    def _load_routes(self, conn=None):
+        """Reads course_shards, on `conn` when the caller already holds one (the pool may have no other free)."""
+        if conn is None:
+            with self.connection() as conn:
+                return self._load_routes(conn)
+        version = super().data_version()
+        rows = conn.execute("SELECT course, shard FROM course_shards").fetchall()
+        shard_dir = conn.execute("SELECT value FROM quiz_meta WHERE key = 'shard_dir'").fetchone()
+        base = os.path.dirname(os.path.abspath(self.db_path))
+        self._shard_dir = os.path.join(base, shard_dir[0] if shard_dir else default_shard_dir(self.db_path))
+        self._routes, self._routes_version = dict(rows), version
+        return self._routes
+
+    def routes(self, conn=None):
+        """{course: shard}, read once and again only when another program changes the main file."""
+        return self._routes if self._routes is not None else self._load_routes(conn)
+
+    def shard_of(self, course_name, conn=None):
+        shard = self.routes(conn).get(course_name)
+        if shard is None and super().data_version() != self._routes_version:
+            shard = self._load_routes(conn).get(course_name) # Created by another program since
+        return shard
+
+    def shard_names(self):
+        return sorted(set(self.routes().values()))
+
+    def shard_path(self, shard):
+        if self._shard_dir is None:
+            self._load_routes()
+        return os.path.join(self._shard_dir, f"{shard}.db")
+
+    def _open(self):
+        conn = super()._open()
+        self._attached[conn] = OrderedDict()
+        return conn
+
+    def _attach(self, conn, shard, keep=()):
+        attached = self._attached[conn]
+        if shard in attached:
+            attached.move_to_end(shard)
+            return
+        if len(attached) >= MAX_ATTACHED:
+            if conn.in_transaction:
+                raise sqlite3.OperationalError(f"one transaction cannot use more than {MAX_ATTACHED} shards")
+            oldest = next(name for name in attached if name not in keep)
+            conn.execute(f'DETACH DATABASE "{_schema(oldest)}"')
+            del attached[oldest]
+        conn.execute(f'ATTACH DATABASE ? AS "{_schema(shard)}"', (self.shard_path(shard),))
+        if self.wal:
+            conn.execute(f'PRAGMA "{_schema(shard)}".synchronous=NORMAL')
+        attached[shard] = True
+
+    def _route(self, conn, query):
+        routes = self.routes(conn)
+        needed = set()
+        for name in _QUOTED.findall(query):
+            shard = routes.get(name)
+            if shard is None:
+                shard = self.shard_of(name, conn) # A course another program just created, or not a course at all
+                routes = self._routes
+            if shard is not None:
+                needed.add(shard)
+        for shard in needed:
+            self._attach(conn, shard, needed)
+
+    def attach_course(self, conn, course_name):
+        """Makes a course's table visible on `conn`, a connection lent out by this pool."""
+        shard = self.shard_of(course_name, conn)
+        if shard is not None:
+            self._attach(conn, shard, (shard,))
+
+    # --- PER-SHARD ACCESS ---
+
+    def shard_pool(self, shard):
+        """A small pool on one shard file alone, created (with the file) on first use."""
+        with self._shard_lock:
+            pool = self._shard_pools.get(shard)
+            if pool is None:
+                os.makedirs(os.path.dirname(self.shard_path(shard)), exist_ok=True)
+                pool = self._shard_pools[shard] = ConnectionPool(
+                    self.shard_path(shard), size=SHARD_POOL_SIZE, timeout=self.timeout, wal=self.wal, trace=self.trace)
+            return pool
+
+    def map_shards(self, fn):
+        """fn(conn, shard) on every shard, each on its own connection and in parallel. Results in shard order."""
+        shards = self.shard_names()
+
+        def run(shard):
+            with self.shard_pool(shard).connection() as conn:
+                return fn(conn, shard)
+
+        if len(shards) < 2 or self.workers < 2:
+            return [run(shard) for shard in shards]
+        with self._shard_lock:
+            if self._scanner is None:
+                self._scanner = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="shard-scan")
+        return list(self._scanner.map(run, shards))
+
+    def catalog(self):
+        """Every shard's course_catalog rows, merged and sorted by name."""
+        query = f"SELECT {CATALOG_COLUMNS} FROM course_catalog"
+        return sorted(row for rows in self.map_shards(lambda conn, shard: conn.execute(query).fetchall())
+                      for row in rows)
+
+    def create_course(self, course_name, shard=None):
+        """Creates the course table in its shard (its department's unless given) and routes to it.
+
+        Returns False if the course already exists.
+        """
+        if self.shard_of(course_name) is not None:
+            return False
+        shard = shard or department(course_name)
+        with self.shard_pool(shard).transaction() as conn:
+            create_shard_course(conn, course_name)
+        super().execute("INSERT OR IGNORE INTO course_shards (course, shard) VALUES (?, ?)", (course_name, shard))
+        self._routes = None
+        return True
+
+    def data_version(self):
+        """Changes whenever the main file or any shard is committed to."""
+        return (super().data_version(),) + tuple(self.shard_pool(shard).data_version()
+                                                 for shard in self.shard_names())
+
+    def external_version(self):
+        """Moves only when another program commits to the main file or any shard."""
+        return (super().external_version(),) + tuple(self.shard_pool(shard).external_version()
+                                                     for shard in self.shard_names())
+
+    def _note_own_write(self, conn):
+        super()._note_own_write(conn)
+        for shard in self._attached.get(conn, ()): # A commit here also wrote to the shards it had attached
+            self.shard_pool(shard)._absorb()
+
+    def close(self):
+        super().close()
+        with self._shard_lock:
+            if self._scanner is not None:
+                self._scanner.shutdown(wait=False)
+                self._scanner = None
+            for pool in self._shard_pools.values():
+                pool.close()
+            self._shard_pools.clear()
+
+
+def open_pool(db_path, **kwargs):
+    """A ShardedPool if the bank at `db_path` has been split, otherwise a plain ConnectionPool."""
+    if os.path.exists(db_path):
+        with closing(sqlite3.connect(db_path)) as conn:
+            if detect_layout(connection_execute(conn)) == LAYOUT_SHARDED:
+                return ShardedPool(db_path, **kwargs)
+    kwargs.pop("workers", None)
+    return ConnectionPool(db_path, **kwargs)
+
+
+def create_shard_course(conn, course_name):
+    """Creates a course table, its catalog row and triggers in a shard file (inside the caller's transaction)."""
+    for statement in CATALOG_SCHEMA:
+        conn.execute(statement)
+    conn.execute(LEGACY_TABLE_SQL.format(table_name=course_name))
+    register_legacy_course(connection_execute(conn), course_name)
+
+
+# --- SPLITTING ---
+
+def _copy_courses(db_path, shard_path, courses):
+    """Copies courses (ids, sequence and catalog row included) into a shard file. Re-runnable."""
+    with closing(sqlite3.connect(shard_path, timeout=30)) as shard:
+        shard.execute("PRAGMA journal_mode=WAL")
+        shard.execute("ATTACH DATABASE ? AS bank", (db_path,))
+        has_catalog = shard.execute(
+            "SELECT 1 FROM bank.sqlite_master WHERE type='table' AND name='course_catalog'").fetchone()
+        with shard:
+            shard.execute("BEGIN")
+            for statement in CATALOG_SCHEMA:
+                shard.execute(statement)
+            for course_name in courses:
+                # Left over from an interrupted split, whose switch-over never happened
+                shard.execute(f'DROP TABLE IF EXISTS main."{course_name}"')
+                shard.execute("DELETE FROM main.course_catalog WHERE name = ?", (course_name,))
+                shard.execute(LEGACY_TABLE_SQL.format(table_name=course_name))
+                shard.execute(f'INSERT INTO main."{course_name}" ({QUESTION_COLUMNS}) '
+                              f'SELECT {QUESTION_COLUMNS} FROM bank."{course_name}"')
+                # Deleted ids are never handed out again, as before the move
+                shard.execute("DELETE FROM main.sqlite_sequence WHERE name = ?", (course_name,))
+                shard.execute("INSERT INTO main.sqlite_sequence (name, seq) "
+                              "SELECT name, seq FROM bank.sqlite_sequence WHERE name = ?", (course_name,))
+                if has_catalog: # Keeps display names and dates
+                    shard.execute(f"INSERT INTO main.course_catalog ({CATALOG_COLUMNS}) "
+                                  f"SELECT {CATALOG_COLUMNS} FROM bank.course_catalog WHERE name = ?", (course_name,))
+                register_legacy_course(connection_execute(shard), course_name)
+        shard.execute("DETACH DATABASE bank")
+
+def split(db_path, shard_dir=None):
+    """Moves every course table of a legacy bank into its department's shard file. Returns {shard: [courses]}.
+
+    Writers are held off for the whole copy, so nothing written meanwhile
+    can be lost; close the apps first, as they only notice the new layout
+    when they start.
+    """
+    shard_dir = shard_dir or default_shard_dir(db_path)
+    directory = os.path.join(os.path.dirname(os.path.abspath(db_path)), shard_dir)
+    with closing(sqlite3.connect(db_path, timeout=30)) as conn:
+        layout = detect_layout(connection_execute(conn))
+        if layout != LAYOUT_LEGACY:
+            raise ValueError(f"only a bank in the legacy layout can be split (this one is {layout})")
+        conn.execute("PRAGMA journal_mode=WAL") # The shards read it while we hold the write lock
+        os.makedirs(directory, exist_ok=True)
+        groups = {}
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for (course_name,) in conn.execute(LIST_LEGACY_TABLES_SQL).fetchall():
+                groups.setdefault(department(course_name), []).append(course_name)
+            for shard, courses in groups.items():
+                _copy_courses(db_path, os.path.join(directory, f"{shard}.db"), courses)
+            # Switch-over: from here on the courses live in the shards
+            conn.execute(SHARD_MAP_SCHEMA)
+            conn.execute("CREATE TABLE IF NOT EXISTS quiz_meta (key TEXT PRIMARY KEY, value TEXT)")
+            for shard, courses in groups.items():
+                conn.executemany("INSERT OR REPLACE INTO course_shards (course, shard) VALUES (?, ?)",
+                                 [(course_name, shard) for course_name in courses])
+                for course_name in courses:
+                    conn.execute(f'DROP TABLE "{course_name}"') # Its search and catalog triggers go with it
+            for table in ("question_search", "search_courses", "course_catalog"):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.executemany("INSERT OR REPLACE INTO quiz_meta (key, value) VALUES (?, ?)",
+                             [("layout", LAYOUT_SHARDED), ("shard_dir", shard_dir)])
+        conn.execute("VACUUM") # Hands the space of the moved tables back
+    return groups
+
+
+# --- BENCHMARK ---
+
+def _timed(fn, rounds=20):
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+def _writes_during_import(pool, store, import_course, other_course, rows):
+    """Times single-question adds to `other_course` while `rows` go into `import_course` in one transaction."""
+    latencies, failures, done = [], [], threading.Event()
+    row = ("Extra question?", "a", "b", "c", "d", "A")
+
+    def bulk():
+        try:
+            with pool.transaction() as conn:
+                store.insert_many(conn, import_course, rows)
+        finally:
+            done.set()
+
+    importer = threading.Thread(target=bulk)
+    importer.start()
+    time.sleep(0.05) # Let the import take its lock
+    while not done.is_set():
+        start = time.perf_counter()
+        try:
+            store.add_question(other_course, row)
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.Error as e:
+            failures.append(str(e))
+    importer.join()
+    return latencies, failures
+
+def run_benchmark(courses=100, questions=50_000, import_rows=100_000, workers=DEFAULT_WORKERS):
+    import shutil
+    import tempfile
+    from questionstore import QuestionStore
+    from synthbank import build_bank, course_name, generate_course
+    workdir = tempfile.mkdtemp()
+    try:
+        single = os.path.join(workdir, "single.db")
+        print(build_bank(single, courses, questions).summary())
+        sharded = os.path.join(workdir, "sharded.db")
+        shutil.copyfile(single, sharded)
+        start = time.perf_counter()
+        groups = split(sharded)
+        print(f"split into {len(groups)} shards in {time.perf_counter() - start:.2f}s")
+
+        rows = [row for n in range(0, import_rows, 5000) for row in generate_course(99, n, 5000)][:import_rows]
+        for label, path in (("single file", single), ("sharded", sharded)):
+            pool = open_pool(path, timeout=30, workers=workers)
+            store = QuestionStore(pool.execute, shards=pool.shards)
+            print(f"\n{label}:")
+            print(f"  course catalog: {_timed(store.catalog):.2f} ms")
+            if pool.shards:
+                pool.workers = 1
+                print(f"  course catalog, 1 shard at a time: {_timed(store.catalog):.2f} ms")
+                pool.workers = workers
+            store.list_courses()
+            latencies, failures = _writes_during_import(pool, store, course_name(0), course_name(1), rows)
+            if latencies:
+                latencies.sort()
+                print(f"  adds to another department during a {import_rows:,}-row import: {len(latencies)} done, "
+                      f"median {latencies[len(latencies) // 2] * 1000:.1f} ms, worst {latencies[-1] * 1000:.0f} ms")
+            if failures:
+                print(f"  {len(failures)} adds failed: {failures[0]}")
+            pool.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spread the course tables over one file per department.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split_cmd = commands.add_parser("split", help="move every course into its department's shard file")
+    split_cmd.add_argument("database", nargs="?", default="rharrellQuiz.db")
+    split_cmd.add_argument("--dir", help="shard directory, relative to the database (default: <name>_shards)")
+    info = commands.add_parser("info", help="list the shards and their courses")
+    info.add_argument("database", nargs="?", default="rharrellQuiz.db")
+    bench = commands.add_parser("benchmark", help="compare a sharded bank with a single file")
+    bench.add_argument("--courses", type=int, default=100)
+    bench.add_argument("--questions", type=int, default=50_000)
+    bench.add_argument("--import-rows", type=int, default=100_000)
+    bench.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+    try:
+        if args.command == "split":
+            start = time.perf_counter()
+            groups = split(args.database, args.dir)
+            print(f"Moved {sum(len(c) for c in groups.values())} courses into {len(groups)} shards "
+                  f"in {time.perf_counter() - start:.2f}s.")
+        elif args.command == "info":
+            pool = open_pool(args.database)
+            if not pool.shards:
+                print(f"'{args.database}' is not sharded (python shards.py split).")
+            else:
+                by_shard = {}
+                for name, _, count, _, _ in pool.catalog():
+                    by_shard.setdefault(pool.shard_of(name), []).append((name, count))
+                for shard, entries in sorted(by_shard.items()):
+                    size = os.path.getsize(pool.shard_path(shard)) / 1e6
+                    print(f"{shard} ({pool.shard_path(shard)}, {size:,.1f} MB): {len(entries)} course(s), "
+                          f"{sum(count for _, count in entries):,} questions")
+            pool.close()
+        else:
+            run_benchmark(args.courses, args.questions, args.import_rows, args.workers)
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
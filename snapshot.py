@@ -0,0 +1,350 @@
+"""Read-only copy of the question bank for machines that only take quizzes.
+
+Usage: python snapshot.py [--questions N] [--quizzes N]   (benchmark on a scratch database)
+
+`Snapshot` copies the course tables (or `courses` / `questions` in the
+unified layout) out of the database into memory, and answers reads with
+the same `execute(query, params, fetch)` convention as execute_db_query,
+so a QuestionStore can sit on top of it. Only the bank is copied, not the
+attempt log or the search and duplicate indexes, so even a database that
+has recorded millions of answers loads in milliseconds.
+
+Two modes:
+
+    memory  the copy lives in an in-memory database behind one lock
+    mmap    the copy is written once to a local temporary file with the
+            backup API, then opened `mode=ro&immutable=1` and memory-mapped;
+            every thread reads it on its own connection with no locking
+
+Reads never touch the source file. At most every `check_interval` seconds
+a read also checks the source's PRAGMA data_version. Writes by any program
+move it, including every attempt-log flush, so when it has moved the bank
+stamp is read too: course_catalog's course count, question total and
+latest modified_at (its triggers touch them on every add, edit and delete)
+plus quiz_meta (the layout, when there is one). Only when that stamp has moved is a new copy
+built on a background thread and swapped in, with reads using the old copy
+meanwhile. A bank without course_catalog is re-read on every data_version
+change.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+from questionstore import LAYOUT_UNIFIED, LIST_LEGACY_TABLES_SQL, detect_layout, connection_execute
+
+SNAPSHOT_MODES = ("memory", "mmap")
+BANK_STAMP_SQL = '''SELECT COUNT(*), TOTAL(question_count), MAX(modified_at) FROM course_catalog'''
+LAYOUT_STAMP_SQL = "SELECT group_concat(key || '=' || value) FROM quiz_meta"
+DEFAULT_CHECK_INTERVAL = 10.0 # Seconds between change checks of the source file
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024 # Bytes of the local copy to map (mmap mode)
+
+
+def _read_only_uri(path, immutable=False):
+    uri = Path(path).absolute().as_uri() + "?mode=ro"
+    return uri + "&immutable=1" if immutable else uri
+
+def bank_tables(conn):
+    """Tables the quiz screens read: the course tables (or courses/questions), plus quiz_meta for the layout."""
+    if detect_layout(connection_execute(conn)) == LAYOUT_UNIFIED:
+        tables = ["courses", "questions"]
+    else:
+        tables = [row[0] for row in conn.execute(LIST_LEGACY_TABLES_SQL)]
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'quiz_meta'").fetchone():
+        tables.append("quiz_meta")
+    return tables
+
+def copy_bank(source_path):
+    """An in-memory database holding the bank tables (with their indexes) of `source_path`."""
+    with sqlite3.connect(_read_only_uri(source_path), uri=True) as source:
+        tables = bank_tables(source)
+    conn = sqlite3.connect("file::memory:", uri=True, check_same_thread=False)
+    conn.execute("ATTACH DATABASE ? AS src", (_read_only_uri(source_path),))
+    conn.execute("BEGIN") # One read transaction on src, so the copy is consistent
+    placeholders = ",".join("?" * len(tables))
+    schema = conn.execute(f'''SELECT type, name, sql FROM src.sqlite_master
+                              WHERE tbl_name IN ({placeholders}) AND type IN ('table', 'index') AND sql IS NOT NULL
+                              ORDER BY type = 'index' ''', tables).fetchall()
+    for kind, name, sql in schema:
+        conn.execute(sql)
+        if kind == "table":
+            conn.execute(f'INSERT INTO main."{name}" SELECT * FROM src."{name}"')
+    conn.commit()
+    conn.execute("DETACH DATABASE src")
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+def bank_stamp(conn):
+    """What only changes to the question bank move (see the module docstring); None without course_catalog."""
+    tables = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('course_catalog', 'quiz_meta')")}
+    if "course_catalog" not in tables:
+        return None
+    layout = conn.execute(LAYOUT_STAMP_SQL).fetchone() if "quiz_meta" in tables else None
+    return conn.execute(BANK_STAMP_SQL).fetchone() + (layout,)
+
+
+class Snapshot:
+    """A read-only, self-refreshing copy of the question bank (see the module docstring).
+
+    `on_reload()`, if given, runs on the background thread after a newer
+    copy has been swapped in, e.g. to drop a QuestionSampler's id lists.
+    """
+    def __init__(self, source_path, mode="memory", check_interval=DEFAULT_CHECK_INTERVAL,
+                 mmap_size=DEFAULT_MMAP_SIZE, on_reload=None):
+        if mode not in SNAPSHOT_MODES:
+            raise ValueError(f"snapshot mode must be one of {', '.join(SNAPSHOT_MODES)}, not '{mode}'")
+        self.source_path = source_path
+        self.mode = mode
+        self.check_interval = check_interval
+        self.mmap_size = mmap_size
+        self.on_reload = on_reload
+        self.generation = 0
+        self.reloads = 0
+        self.load_seconds = 0.0 # How long the latest copy took to build
+        self.last_error = None # Most recent failed background reload; the old copy stays in use
+        self._conn = None # memory mode: the copy
+        self._path = None # mmap mode: the local file
+        self._local = threading.local() # mmap mode: each thread's (generation, connection)
+        self._lock = threading.Lock() # memory mode: one reader at a time; both: guards the swap
+        self._reload_lock = threading.Lock() # One copy built at a time
+        self._reloading = False
+        self._closed = False
+        self._workdir = tempfile.mkdtemp(prefix="quiz-snapshot-") if mode == "mmap" else None
+        self._watcher = sqlite3.connect(_read_only_uri(source_path), uri=True, check_same_thread=False)
+        self._watcher_lock = threading.Lock()
+        self._version = None
+        self._stamp = None
+        self.reload()
+        self._next_check = time.monotonic() + check_interval
+
+    # --- LOADING ---
+
+    def _source_state(self):
+        """(data_version, bank stamp) of the source; the stamp is only read once data_version has moved."""
+        with self._watcher_lock:
+            version = self._watcher.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._version:
+                return version, self._stamp
+            return version, bank_stamp(self._watcher)
+
+    def _build(self):
+        start = time.perf_counter()
+        conn = copy_bank(self.source_path)
+        if self.mode == "mmap":
+            path = os.path.join(self._workdir, f"bank-{self.generation + 1}.db")
+            with sqlite3.connect(path) as local:
+                conn.backup(local)
+            conn.close()
+            conn = path
+        self.load_seconds = time.perf_counter() - start
+        return conn
+
+    def reload(self):
+        """Builds a fresh copy now and swaps it in. Returns False if the source had not changed."""
+        with self._reload_lock:
+            # Read first: a change made during the copy triggers another reload
+            version, stamp = self._source_state()
+            if version == self._version:
+                return False
+            if stamp is not None and stamp == self._stamp:
+                self._version = version # Attempts or indexes were written; the bank itself is unchanged
+                return False
+            built = self._build()
+            with self._lock:
+                old_conn, old_path = self._conn, self._path
+                if self.mode == "memory":
+                    self._conn = built
+                else:
+                    self._path = built
+                self.generation += 1
+                self._version, self._stamp = version, stamp
+        if old_conn is not None:
+            old_conn.close() # Safe: memory-mode reads hold _lock
+        if old_path is not None:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass # Still open on another thread (Windows); removed with the directory on close()
+        if self.generation > 1:
+            self.reloads += 1
+            if self.on_reload is not None:
+                self.on_reload()
+        return True
+
+    def _reload_in_background(self):
+        try:
+            self.reload()
+            self.last_error = None
+        except sqlite3.Error as e: # e.g. the share is briefly unreachable; the next check retries
+            self.last_error = e
+        finally:
+            self._reloading = False
+
+    def _maybe_check(self):
+        now = time.monotonic()
+        if now < self._next_check or self._reloading or self._closed:
+            return
+        self._next_check = now + self.check_interval
+        self._reloading = True
+        threading.Thread(target=self._reload_in_background, name="snapshot-reload", daemon=True).start()
+
+    # --- READING ---
+
+    def _thread_connection(self):
+        generation, conn = getattr(self._local, "current", (None, None))
+        if generation != self.generation:
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                generation, path = self.generation, self._path
+            conn = sqlite3.connect(_read_only_uri(path, immutable=True), uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            self._local.current = (generation, conn)
+        return conn
+
+    def execute(self, query, params=(), fetch=None):
+        """Runs a read against the copy. Mirrors the `fetch` convention of execute_db_query."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Snapshot is closed")
+        self._maybe_check()
+        if self.mode == "memory":
+            with self._lock:
+                return self._fetch(self._conn.execute(query, params), fetch)
+        return self._fetch(self._thread_connection().execute(query, params), fetch)
+
+    @staticmethod
+    def _fetch(cursor, fetch):
+        if fetch == "all":
+            return cursor.fetchall()
+        if fetch == "one":
+            return cursor.fetchone()
+        return True
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        with self._watcher_lock:
+            self._watcher.close()
+        generation, conn = getattr(self._local, "current", (None, None))
+        if conn is not None:
+            conn.close()
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+
+
+# --- BENCHMARK ---
+
+def _build_bank(db_path, questions, courses=4, answers=200_000):
+    """A legacy-layout bank plus an attempt log, like a database that has been in use for a while."""
+    import attemptlog
+    rng = random.Random(1234)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        for c in range(courses):
+            conn.execute(f'''CREATE TABLE "course {c}" (id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL,
+                             option_a TEXT NOT NULL, option_b TEXT NOT NULL, option_c TEXT NOT NULL,
+                             option_d TEXT NOT NULL, correct_answer TEXT NOT NULL)''')
+            conn.executemany(f'INSERT INTO "course {c}" (question, option_a, option_b, option_c, option_d, correct_answer) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             ((f"Question {n} of course {c}: " + "lorem ipsum " * rng.randrange(3, 12),
+                               f"option a {n}", f"option b {n}", f"option c {n}", f"option d {n}", rng.choice("ABCD"))
+                              for n in range(questions // courses)))
+        attemptlog.create_schema(conn)
+        conn.executemany("INSERT INTO attempt_answers VALUES (?, ?, ?, ?, ?, ?)",
+                         ((f"a{n // 10}", n % 10, rng.randrange(1, questions // courses), rng.randrange(4), 1, 1.0)
+                          for n in range(answers)))
+
+def _drop_os_cache(path):
+    """Asks the OS to forget the file's cached pages, so the next read comes from the disk."""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for name in (path, path + "-wal"):
+        if os.path.exists(name):
+            fd = os.open(name, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+    return True
+
+def _time_quizzes(execute, tables, ids_per_table, quizzes, rng, before_each=None):
+    latencies = []
+    for _ in range(quizzes):
+        table = rng.choice(tables)
+        ids = rng.sample(ids_per_table, 10)
+        if before_each is not None:
+            before_each()
+        start = time.perf_counter()
+        execute(f'SELECT * FROM "{table}" WHERE id IN ({",".join("?" * len(ids))})', ids, fetch="all")
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+def run_benchmark(questions=20_000, quizzes=300):
+    from dbpool import ConnectionPool
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        _build_bank(db_path, questions)
+        tables = [f"course {c}" for c in range(4)]
+        per_table = questions // 4
+        writer = sqlite3.connect(db_path)
+
+        def other_kiosk_writes():
+            # Another machine finishing a quiz: SQLite drops every other connection's page cache
+            writer.execute("INSERT OR REPLACE INTO attempts (id, course, source, started_at, total) "
+                           "VALUES ('x', 'c', 'bench', 0, 10)")
+            writer.commit()
+
+        def cold():
+            other_kiosk_writes()
+            _drop_os_cache(db_path)
+
+        pool = ConnectionPool(db_path)
+        results = [("disk, cold", _time_quizzes(pool.execute, tables, range(1, per_table), quizzes,
+                                                random.Random(1), before_each=cold)),
+                   ("disk, after a write", _time_quizzes(pool.execute, tables, range(1, per_table), quizzes,
+                                                         random.Random(1), before_each=other_kiosk_writes)),
+                   ("disk, warm, no writes", _time_quizzes(pool.execute, tables, range(1, per_table), quizzes, random.Random(1)))]
+        pool.close()
+        loads = []
+        for mode in SNAPSHOT_MODES:
+            snapshot = Snapshot(db_path, mode=mode, check_interval=3600)
+            loads.append(f"{mode} {snapshot.load_seconds * 1000:.0f} ms")
+            results.append((f"snapshot ({mode})", _time_quizzes(snapshot.execute, tables, range(1, per_table),
+                                                                quizzes, random.Random(1), before_each=cold)))
+            snapshot.close()
+        writer.close()
+
+        size = os.path.getsize(db_path) / 1e6
+        print(f"{quizzes} quiz reads (10 random questions) from a {questions:,}-question bank in a {size:.0f} MB file "
+              f"that also holds an attempt log")
+        if not hasattr(os, "posix_fadvise"):
+            print("  (no posix_fadvise here, so 'cold' only drops SQLite's cache, not the OS's)")
+        print(f"  snapshot load: {', '.join(loads)}")
+        for label, latencies in results:
+            print(f"  {label:<22} p50 {latencies[len(latencies) // 2] * 1e6:>7,.0f} us   "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:>7,.0f} us")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark snapshot reads against the database file.")
+    parser.add_argument("--questions", type=int, default=20_000)
+    parser.add_argument("--quizzes", type=int, default=300)
+    args = parser.parse_args()
+    try:
+        run_benchmark(args.questions, args.quizzes)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        sys.exit(1)
@@ -1,12 +1,58 @@
 import tkinter as tk
 from tkinter import font as tkfont
 import sqlite3
-import random
+import atexit
+from shards import open_pool
+from questionstore import QuestionStore, validate_question
+from dbworker import DBExecutor
+from quizengine import QuizSession
+from attemptlog import AttemptLog
+from analytics import ItemAnalytics
+from snapshot import Snapshot
+from quizpack import open_pack, PackError
 
 # --- Configuration ---
 DATABASE_FILE = "rharrellQuiz.db"
 # A list of your table names to validate against and prevent errors.
 QUIZ_CATEGORIES = ["ds 3850", "ds 3860", "mkt 4100", "hist 4093"]
+ATTEMPT_JOURNAL = "student_attempts.journal" # Attempts not yet written to the database (see attemptlog.py)
+SNAPSHOT_MODE = "memory" # Read questions from a copy: "memory", "mmap" or None for the file itself (see snapshot.py)
+QUIZ_PACK = "quizbank.qpack" # Used instead of the database for questions when present (python quizpack.py build)
+
+db_pool = open_pool(DATABASE_FILE) # Routes to the shard files of a split bank (see shards.py)
+atexit.register(db_pool.close)
+try:
+    quiz_pack = open_pack(QUIZ_PACK) # Opening a pack reads no SQLite at all
+except (PackError, OSError) as e:
+    quiz_pack = None
+    print(f"Not using quiz pack '{QUIZ_PACK}': {e}")
+question_bank = None
+if SNAPSHOT_MODE and quiz_pack is None and not db_pool.shards: # A snapshot copies the main file only
+    try:
+        question_bank = Snapshot(DATABASE_FILE, mode=SNAPSHOT_MODE)
+        atexit.register(question_bank.close)
+    except sqlite3.Error as e:
+        print(f"Reading questions from '{DATABASE_FILE}' directly; no snapshot: {e}")
+# Handles both the per-course and unified layouts
+question_store = QuestionStore(question_bank.execute if question_bank else db_pool.execute, shards=db_pool.shards)
+if question_bank:
+    question_bank.on_reload = question_store.refresh_layout # The new copy may have been migrated
+db_executor = DBExecutor() # Runs queries off the Tk thread
+atexit.register(db_executor.shutdown)
+# Attempts are rolled into the admin's question statistics as they are written
+attempt_log = AttemptLog(db_pool, ATTEMPT_JOURNAL, source="student", on_flush=ItemAnalytics(db_pool).refresh)
+attempt_log.recover()
+atexit.register(attempt_log.close) # Runs before db_pool.close
+
+
+def load_session(category):
+    """Reads a whole category and shuffles it into a quiz; runs on a worker thread."""
+    # A pack older than the last edit to the course is passed over for the database
+    if quiz_pack is not None and category in quiz_pack and quiz_pack.is_current(question_store.catalog()):
+        return quiz_pack.session(category, timed=True)
+    # Unusable rows (blank options, no valid answer) are left out; the admin's report lists them
+    rows = [row for row in question_store.all_questions(category) or [] if validate_question(row[1:]) is None]
+    return QuizSession.from_rows(category, rows, shuffle=True, timed=True)
 
 
 class QuizBowlApp(tk.Tk):
@@ -95,11 +141,8 @@ class QuizFrame(tk.Frame):
         self.controller = controller
         
         # --- State variables ---
-        self.questions = []
-        self.current_question_index = 0
-        self.score = 0
-        self.correct_answer = ""
-        self.selected_option = tk.StringVar()
+        self.session = None # quizengine.QuizSession holding the questions, position and score
+        self.selected_option = tk.IntVar(value=-1) # Index of the chosen option, -1 for none
 
         # --- GUI Widgets ---
         self.title_label = tk.Label(self, text="Quiz", font=tkfont.Font(size=20, weight="bold"))
@@ -112,9 +155,9 @@ class QuizFrame(tk.Frame):
         options_frame.pack(pady=10)
         self.option_buttons = []
         # Create radio buttons for options a, b, c, d
-        for option_char in ["A", "B", "C", "D"]:
+        for option_index in range(4):
             rb = tk.Radiobutton(options_frame, text="", variable=self.selected_option,
-                               value=option_char, font=tkfont.Font(size=12), anchor="w", justify="left")
+                               value=option_index, font=tkfont.Font(size=12), anchor="w", justify="left")
             rb.pack(fill="x", pady=5, padx=20)
             self.option_buttons.append(rb)
         
@@ -133,27 +176,37 @@ class QuizFrame(tk.Frame):
         if category not in QUIZ_CATEGORIES:
             self.question_label.config(text=f"Error: Invalid category '{category}'.")
             return
-        try:
-            conn = sqlite3.connect(DATABASE_FILE)
-            cursor = conn.cursor()
-            # Note: Quoting column and table names with spaces is crucial
-            query = f'SELECT "Question", "Option A", "Option B", "Option C", "Option D", "Correct" FROM "{category}"'
-            cursor.execute(query)
-            self.questions = cursor.fetchall()
-            conn.close()
-            
-            random.shuffle(self.questions) # Shuffle questions for a new experience
-            self.current_question_index = 0
-            self.score = 0
-            self.display_question()
-        except sqlite3.Error as e:
-            self.question_label.config(text=f"Database Error: {e}\nCould not load quiz.")
+        # Show a loading state while a worker thread reads the questions
+        self.title_label.config(text="Quiz")
+        self.question_label.config(text="Loading questions...")
+        for rb in self.option_buttons:
+            rb.pack_forget()
+        self.submit_button.pack_forget()
+        self.results_label.pack_forget()
+        self.return_button.pack_forget()
+        db_executor.cancel_owner(self)
+        db_executor.submit(self, load_session, category,
+                           on_done=self.start_quiz, on_error=self.show_load_error)
+
+    def start_quiz(self, session):
+        # The session arrives already shuffled, for a new experience every time
+        self.session = session
+        if not session.total:
+            self.question_label.config(text="This category has no questions yet.")
+            self.return_button.pack(pady=20)
+            return
+        attempt_log.start(session)
+        self.display_question()
+
+    def show_load_error(self, error):
+        self.question_label.config(text=f"Database Error: {error}\nCould not load quiz.")
+        self.return_button.pack(pady=20)
 
     def display_question(self):
         """Updates the GUI with the current question and options."""
         # Reset UI for the new question
         self.feedback_label.config(text="")
-        self.selected_option.set(None)
+        self.selected_option.set(-1)
         for rb in self.option_buttons:
             rb.config(state="normal")
             rb.pack(fill="x", pady=5, padx=20) # Ensure they are visible
@@ -163,29 +216,29 @@ class QuizFrame(tk.Frame):
         self.return_button.pack_forget()
 
         # Load question data
-        q_data = self.questions[self.current_question_index]
-        question_text, opt_a, opt_b, opt_c, opt_d, self.correct_answer = q_data
-        
-        self.title_label.config(text=f"Question {self.current_question_index + 1}/{len(self.questions)}")
-        self.question_label.config(text=question_text)
-        self.option_buttons[0].config(text=opt_a)
-        self.option_buttons[1].config(text=opt_b)
-        self.option_buttons[2].config(text=opt_c)
-        self.option_buttons[3].config(text=opt_d)
+        question = self.session.current
+        self.title_label.config(text=f"Question {self.session.index + 1}/{self.session.total}")
+        self.question_label.config(text=question.text)
+        for rb, option_text in zip(self.option_buttons, question.options):
+            rb.config(text=option_text)
+        self.session.mark_shown()
 
     def check_answer(self):
         """Checks the selected answer and provides immediate feedback."""
-        user_answer = self.selected_option.get()
-        if user_answer == 'None': # Check if an option was selected
+        choice = self.selected_option.get()
+        if choice < 0: # Check if an option was selected
             self.feedback_label.config(text="Please select an answer.", fg="orange")
             return
         
         # Provide feedback and update score
-        if user_answer.strip().lower() == self.correct_answer.strip().lower():
-            self.score += 1
+        question = self.session.current
+        correct = self.session.answer(choice)
+        attempt_log.answered(self.session)
+        if correct:
             self.feedback_label.config(text="Correct! 🎉", fg="green")
         else:
-            self.feedback_label.config(text=f"Incorrect. The correct answer was: {self.correct_answer}", fg="red")
+            self.feedback_label.config(text=f"Incorrect. The correct answer was: "
+                                            f"{question.correct_letter}) {question.correct_text}", fg="red")
         
         # Disable options and swap the Submit button for the Next button
         for rb in self.option_buttons:
@@ -195,8 +248,7 @@ class QuizFrame(tk.Frame):
         
     def next_question(self):
         """Loads the next question or shows the final results."""
-        self.current_question_index += 1
-        if self.current_question_index < len(self.questions):
+        if self.session.advance():
             self.display_question()
         else:
             self.show_results()
@@ -210,14 +262,16 @@ class QuizFrame(tk.Frame):
         self.next_button.pack_forget()
         self.feedback_label.config(text="")
         
-        # Display final score
-        self.results_label.config(text=f"Quiz Complete!\nYour Final Score: {self.score} / {len(self.questions)}", fg="blue")
+        # Display final score and save the attempt
+        attempt_log.finish(self.session)
+        self.results_label.config(text=f"Quiz Complete!\nYour Final Score: {self.session.score} / {self.session.total}", fg="blue")
         self.results_label.pack(pady=50)
         self.return_button.pack(pady=20)
 
     def reset_and_return(self):
         """Resets the quiz state and returns to the category selection screen."""
-        self.questions = []
+        db_executor.cancel_owner(self) # Don't start a quiz the user has already left
+        self.session = None
         self.controller.show_frame("CategorySelectionFrame")
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+"""Deterministic synthetic question banks, for seeing how the app behaves at scale.
+
+Usage: python synthbank.py OUT.db [--courses 1000] [--questions 100000] [--seed 1234]
+                                  [--layout legacy|unified] [--workers N]
+
+The same seed, course count and question count always give the same bank,
+byte for byte in its rows, whatever the number of workers. Courses are
+generated in parallel worker processes and written with executemany in
+one transaction; the schema migrations (search index, attempt log,
+statistics) are applied afterwards so the index is built in one pass, as
+zdatabasesetup.py would leave a real database.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import multiprocessing
+from questionstore import QuestionStore, connection_execute, LAYOUT_LEGACY, LAYOUT_UNIFIED, UNIFIED_SCHEMA
+
+DEFAULT_COURSES = 1000
+DEFAULT_QUESTIONS = 100_000
+DEFAULT_SEED = 1234
+CHUNK_QUESTIONS = 5000 # Questions a worker generates before handing them back
+
+SUBJECTS = ("ds", "mkt", "hist", "acct", "bio", "chem", "econ", "math", "phys", "psy")
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "pre", "con", "ex", "tion", "ment", "al", "er", "ic")
+TEMPLATES = (
+    "What is the main purpose of {0} in {1}?",
+    "Which of the following best describes {0}?",
+    "In {1}, {0} is most closely associated with which idea?",
+    "Which term refers to the {0} of a {1}?",
+    "What happens to {0} when {1} increases?",
+    "Who is usually credited with introducing {0} to {1}?",
+)
+
+
+def course_name(index):
+    """Names like the seed courses ("ds 1000", "mkt 1000", ...), unique for up to 90,000 courses."""
+    return f"{SUBJECTS[index % len(SUBJECTS)]} {1000 + index // len(SUBJECTS)}"
+
+def _course_sizes(courses, questions):
+    """Spreads `questions` over `courses` as evenly as possible."""
+    base, extra = divmod(questions, courses)
+    return [base + (1 if index < extra else 0) for index in range(courses)]
+
+VOCABULARY_SIZE = 5000
+
+_vocabularies = {} # seed -> words, built once per process
+
+def vocabulary(seed):
+    """The words every course of a bank draws from, derived from the seed alone."""
+    words = _vocabularies.get(seed)
+    if words is None:
+        rng = random.Random(f"{seed}/words")
+        words = _vocabularies[seed] = sorted({"".join(rng.choices(SYLLABLES, k=rng.randrange(2, 5)))
+                                              for _ in range(VOCABULARY_SIZE)})
+    return words
+
+def _phrase(rng, words, low, high):
+    return " ".join(rng.choices(words, k=rng.randrange(low, high)))
+
+def generate_course(seed, index, count):
+    """The (question, opt_a, opt_b, opt_c, opt_d, correct) rows of one course.
+
+    Seeded from (seed, index) alone, so a course comes out the same
+    whichever process generates it.
+    """
+    rng = random.Random(f"{seed}/{index}") # String seeds hash the same in every process
+    words = vocabulary(seed)
+    topic = _phrase(rng, words, 1, 3)
+    rows = []
+    for n in range(count):
+        question = rng.choice(TEMPLATES).format(_phrase(rng, words, 1, 4), topic)
+        options = []
+        while len(options) < 4:
+            option = _phrase(rng, words, 1, 5)
+            if option not in options:
+                options.append(option)
+        rows.append((f"{question} ({n + 1})", *options, rng.choice("ABCD")))
+    return rows
+
+def _generate_chunk(task):
+    seed, index, count = task
+    return index, generate_course(seed, index, count)
+
+def _tasks(seed, sizes):
+    """One task per course, so the rows of a course arrive together and in order."""
+    return [(seed, index, count) for index, count in enumerate(sizes)]
+
+
+class BankReport:
+    """What build_bank wrote and how long it took."""
+    def __init__(self, path, layout):
+        self.path = path
+        self.layout = layout
+        self.courses = 0
+        self.questions = 0
+        self.generate_seconds = 0.0
+        self.index_seconds = 0.0
+        self.seconds = 0.0
+
+    def summary(self):
+        size = os.path.getsize(self.path) / 1e6 if os.path.exists(self.path) else 0.0
+        return (f"Wrote {self.questions:,} questions in {self.courses:,} courses ({self.layout} layout) to "
+                f"'{self.path}' ({size:,.1f} MB) in {self.seconds:.1f}s: "
+                f"{self.generate_seconds:.1f}s generating and inserting, {self.index_seconds:.1f}s on the schema and indexes.")
+
+
+def build_bank(path, courses=DEFAULT_COURSES, questions=DEFAULT_QUESTIONS, seed=DEFAULT_SEED,
+               layout=LAYOUT_LEGACY, workers=None):
+    """Writes a new bank to `path`, which must not exist yet. Returns a BankReport."""
+    # Imported here: zdatabasesetup pulls in every module that owns a migration
+    from zdatabasesetup import apply_migrations
+    if os.path.exists(path):
+        raise FileExistsError(f"'{path}' already exists")
+    if courses < 1 or questions < 0:
+        raise ValueError("need at least one course and a non-negative question count")
+    report = BankReport(path, layout)
+    start = time.perf_counter()
+    sizes = _course_sizes(courses, questions)
+    workers = workers or os.cpu_count() or 1
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF") # A half-written scratch bank is simply rebuilt
+        if layout == LAYOUT_UNIFIED:
+            conn.executescript(UNIFIED_SCHEMA)
+            conn.execute("INSERT OR REPLACE INTO quiz_meta (key, value) VALUES ('layout', ?)", (LAYOUT_UNIFIED,))
+        store = QuestionStore(connection_execute(conn), layout=layout)
+        with conn:
+            # Course rows are inserted before any migration exists, so no per-row triggers fire
+            if workers > 1 and courses > 1:
+                with multiprocessing.Pool(min(workers, courses)) as pool:
+                    chunksize = max(1, CHUNK_QUESTIONS // max(1, questions // courses))
+                    for index, rows in pool.imap(_generate_chunk, _tasks(seed, sizes), chunksize):
+                        store.create_course(course_name(index))
+                        store.insert_many(conn, course_name(index), rows)
+            else:
+                for index, rows in map(_generate_chunk, _tasks(seed, sizes)):
+                    store.create_course(course_name(index))
+                    store.insert_many(conn, course_name(index), rows)
+        report.courses, report.questions = courses, questions
+        report.generate_seconds = time.perf_counter() - start
+        apply_migrations(conn) # Builds the search index over every course in one pass
+        conn.execute("PRAGMA optimize")
+        report.index_seconds = time.perf_counter() - start - report.generate_seconds
+    finally:
+        conn.close()
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic question bank.")
+    parser.add_argument("out", help="database file to create")
+    parser.add_argument("--courses", type=int, default=DEFAULT_COURSES)
+    parser.add_argument("--questions", type=int, default=DEFAULT_QUESTIONS, help="total, spread over the courses")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--layout", choices=(LAYOUT_LEGACY, LAYOUT_UNIFIED), default=LAYOUT_LEGACY)
+    parser.add_argument("--workers", type=int, default=None, help="generator processes (default: one per CPU)")
+    args = parser.parse_args()
+    try:
+        print(build_bank(args.out, args.courses, args.questions, args.seed, args.layout, args.workers).summary())
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,29 @@
+"""The scale benchmarks as a test: the small bank must not regress past the committed baseline.
+
+Opt-in, because sub-millisecond medians only compare with a baseline saved
+on the same machine: run `SCALEBENCH_TEST=1 python -m pytest test_scalebench.py`
+after `python scalebench.py --save`. `SCALEBENCH_SIZES="small medium"` also
+checks the bigger banks (the first run builds them, see scalebench.py).
+"""
+import os
+
+import pytest
+
+import scalebench
+
+SIZES = os.environ.get("SCALEBENCH_SIZES", "small").split()
+
+pytestmark = pytest.mark.skipif(not os.environ.get("SCALEBENCH_TEST"),
+                                reason="timing test; set SCALEBENCH_TEST=1 on the machine that saved the baseline")
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_no_regression_against_baseline(size):
+    baseline = scalebench.load_baseline()
+    assert baseline is not None, f"{scalebench.BASELINE_FILE} is missing; run python scalebench.py --save"
+    if size not in baseline["results"]:
+        pytest.skip(f"no baseline for '{size}'; run python scalebench.py --save --sizes {size}")
+    results = {size: scalebench.measure_size(size)}
+    regressions = scalebench.compare(results, baseline["results"])
+    assert regressions == [], "\n" + "\n".join(
+        f"{size} / {name}: {then:.3f} ms -> {now:.3f} ms" for size, name, then, now in regressions)
@@ -0,0 +1,298 @@
+"""Index of the questions that can be asked, so unusable rows never reach a quiz.
+
+Usage: python validindex.py [database] [--workers 4] [--recheck]   (report of left-out questions)
+       python validindex.py --benchmark [--courses 1000] [--questions 100000]
+
+Every question is checked against the rules of questionstore.validate_question
+(question and options not blank, correct answer A-D) and the verdict is
+stored in `question_validity`: problem NULL for a usable question, otherwise
+the reason. Quizzes sample only from the usable ids, so a bad row is never
+drawn and nothing has to be retried mid-quiz.
+
+The check is one SQL statement per course (questionstore.PROBLEM_SQL), so
+courses are checked in parallel on separate pooled connections with SQLite
+doing the work outside the GIL. `course_validity` remembers each course's
+row count and highest id; a course whose rows were added or removed by
+another program is re-checked the next time it is used. Edits made through
+the admin helpers update the index as they happen (record / remove);
+rows edited in place by other programs need --recheck.
+"""
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from questionstore import validate_question
+
+DEFAULT_WORKERS = 4 # Courses checked at once, each on its own connection
+
+VALIDITY_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS question_validity (
+           course TEXT NOT NULL,
+           question_id INTEGER NOT NULL,
+           problem TEXT, -- NULL when the question can be asked
+           PRIMARY KEY (course, question_id)
+       ) WITHOUT ROWID''',
+    # The report only ever looks at the few rows that were left out
+    "CREATE INDEX IF NOT EXISTS idx_question_validity_problem ON question_validity(course) WHERE problem IS NOT NULL",
+    '''CREATE TABLE IF NOT EXISTS course_validity (
+           course TEXT PRIMARY KEY,
+           question_count INTEGER NOT NULL,
+           max_id INTEGER NOT NULL,
+           checked_at REAL NOT NULL
+       )''',
+]
+
+
+# Keeps questionstore's course_catalog in step with the verdicts
+VALID_COUNT_SQL = '''UPDATE course_catalog SET valid_count =
+                       (SELECT COUNT(*) FROM question_validity WHERE course = ?1 AND problem IS NULL)
+                   WHERE name = ?1'''
+# A sharded bank keeps each course's catalog row in its shard file (see shards.py)
+SHARD_VALID_COUNT_SQL = "UPDATE course_catalog SET valid_count = ? WHERE name = ?"
+
+
+def create_schema(conn):
+    for statement in VALIDITY_SCHEMA:
+        conn.execute(statement)
+
+
+class ValidIndex:
+    """Usable question ids per course, kept in `question_validity`.
+
+    `valid_ids` is meant as a QuestionSampler / AdaptiveSelector id source.
+    """
+    def __init__(self, pool, store, workers=DEFAULT_WORKERS):
+        self.pool = pool
+        self.store = store
+        self.workers = workers
+        self._schema_ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_schema(self, conn):
+        """Databases set up before migration 6 get the tables on first use."""
+        if not self._schema_ready:
+            create_schema(conn)
+            self._schema_ready = True
+
+    # --- CHECKING ---
+
+    def _check_course(self, course_name, known, force):
+        """Runs on a worker thread: (course, signature, [(id, problem)]), or None if nothing changed."""
+        signature = self.store.course_signature(course_name)
+        if not force and known.get(course_name) == signature:
+            return None
+        return course_name, signature, self.store.question_problems(course_name) or []
+
+    def check(self, courses=None, force=False):
+        """Re-checks the courses whose rows changed since their last check (every course with force=True).
+
+        `courses` defaults to all of them, in which case entries for deleted
+        courses are dropped too. Returns the number of courses re-checked.
+        """
+        with self._lock:
+            if not self._schema_ready:
+                with self.pool.transaction() as conn:
+                    self._ensure_schema(conn)
+            every_course = courses is None
+            courses = self.store.list_courses() if every_course else list(courses)
+            with self.pool.connection() as conn:
+                if every_course:
+                    rows = conn.execute("SELECT course, question_count, max_id FROM course_validity").fetchall()
+                else:
+                    rows = [row for course in courses for row in conn.execute(
+                        "SELECT course, question_count, max_id FROM course_validity WHERE course = ?", (course,))]
+            known = {course: (count, max_id) for course, count, max_id in rows}
+            if len(courses) > 1 and self.workers > 1:
+                with ThreadPoolExecutor(max_workers=min(self.workers, len(courses))) as executor:
+                    results = list(executor.map(lambda course: self._check_course(course, known, force), courses))
+            else:
+                results = [self._check_course(course, known, force) for course in courses]
+            results = [result for result in results if result]
+            gone = set(known) - set(courses) if every_course else set()
+            if not results and not gone:
+                return 0
+            catalog = self.store.has_catalog
+            with self.pool.transaction() as conn:
+                for course_name, (count, max_id), problems in results:
+                    conn.execute("DELETE FROM question_validity WHERE course = ?", (course_name,))
+                    conn.executemany("INSERT INTO question_validity (course, question_id, problem) VALUES (?, ?, ?)",
+                                     ((course_name, q_id, problem) for q_id, problem in problems))
+                    conn.execute('''INSERT OR REPLACE INTO course_validity (course, question_count, max_id, checked_at)
+                                    VALUES (?, ?, ?, ?)''', (course_name, count, max_id, time.time()))
+                    if catalog:
+                        conn.execute(VALID_COUNT_SQL, (course_name,))
+                for table in ("question_validity", "course_validity"):
+                    conn.executemany(f"DELETE FROM {table} WHERE course = ?", ((course,) for course in gone))
+            self._update_shard_catalogs([course_name for course_name, _, _ in results])
+            return len(results)
+
+    def valid_ids(self, course_name):
+        """Ids of the usable questions in a course, re-checking it first if its rows changed."""
+        self.check([course_name])
+        with self.pool.connection() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT question_id FROM question_validity WHERE course = ? AND problem IS NULL", (course_name,))]
+
+    # --- MAINTENANCE ---
+
+    def _before_write(self, course_name):
+        """What _note_write needs, read before the write transaction takes a connection."""
+        return self.store.course_signature(course_name), self.store.has_catalog
+
+    def _update_shard_catalogs(self, courses):
+        """Sharded banks: the catalog rows are in other files, so they are updated after our transaction."""
+        shards = self.store.shards
+        if shards is None or not courses:
+            return
+        by_shard = {}
+        with self.pool.connection() as conn:
+            for course_name in courses:
+                usable = conn.execute("SELECT COUNT(*) FROM question_validity WHERE course = ? AND problem IS NULL",
+                                      (course_name,)).fetchone()[0]
+                by_shard.setdefault(shards.shard_of(course_name, conn), []).append((usable, course_name))
+        for shard, rows in by_shard.items():
+            if shard is not None:
+                with shards.shard_pool(shard).transaction() as conn:
+                    conn.executemany(SHARD_VALID_COUNT_SQL, rows)
+
+    def _note_write(self, conn, course_name, signature, catalog):
+        """Keeps the stored signature in step with our own write, so it does not look like someone else's."""
+        conn.execute("UPDATE course_validity SET question_count = ?, max_id = ? WHERE course = ?",
+                     signature + (course_name,))
+        if catalog:
+            conn.execute(VALID_COUNT_SQL, (course_name,))
+
+    def record(self, course_name, q_id, params):
+        """Stores the verdict on a question just added or edited. Returns its problem, None if it is usable."""
+        problem = validate_question(params)
+        signature, catalog = self._before_write(course_name)
+        with self._lock, self.pool.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.execute("INSERT OR REPLACE INTO question_validity (course, question_id, problem) VALUES (?, ?, ?)",
+                         (course_name, q_id, problem))
+            self._note_write(conn, course_name, signature, catalog)
+        self._update_shard_catalogs([course_name])
+        return problem
+
+    def remove(self, course_name, q_id):
+        signature, catalog = self._before_write(course_name)
+        with self._lock, self.pool.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.execute("DELETE FROM question_validity WHERE course = ? AND question_id = ?", (course_name, q_id))
+            self._note_write(conn, course_name, signature, catalog)
+        self._update_shard_catalogs([course_name])
+
+    # --- REPORTING ---
+
+    def excluded(self):
+        """(course, row, problem) for every question left out of quizzes, after re-checking changed courses."""
+        self.check()
+        with self.pool.connection() as conn:
+            rows = conn.execute('''SELECT course, question_id, problem FROM question_validity
+                                   WHERE problem IS NOT NULL ORDER BY course, question_id''').fetchall()
+        by_course = {}
+        for course_name, q_id, problem in rows:
+            by_course.setdefault(course_name, []).append((q_id, problem))
+        result = []
+        for course_name, entries in by_course.items():
+            found = {row[0]: row for row in self.store.questions_by_ids(course_name, [q_id for q_id, _ in entries]) or []}
+            result.extend((course_name, found[q_id], problem) for q_id, problem in entries if q_id in found)
+        return result
+
+    def totals(self):
+        """(usable, left out) question counts over every checked course."""
+        with self.pool.connection() as conn:
+            usable, left_out = conn.execute(
+                "SELECT COALESCE(SUM(problem IS NULL), 0), COUNT(problem) FROM question_validity").fetchone()
+        return usable, left_out
+
+
+def format_exclusions(excluded, totals=None):
+    """The excluded questions as printable text, grouped by course."""
+    if not excluded:
+        return "Every question can be used in quizzes."
+    lines = [f"Left out of quizzes until fixed: {len(excluded)}" + (f" ({totals[0]:,} usable)." if totals else ".")]
+    course = None
+    for course_name, row, problem in excluded:
+        if course_name != course:
+            course = course_name
+            lines.append(f"\n{course_name}:")
+        text = str(row[1] or "").strip()
+        lines.append(f"  #{row[0]}: {problem} - {text[:70] + '...' if len(text) > 70 else text or '(no text)'}")
+    return "\n".join(lines)
+
+
+# --- BENCHMARK ---
+
+def run_benchmark(courses=1000, questions=100_000, workers=DEFAULT_WORKERS, bad_every=500):
+    import os
+    import tempfile
+    from dbpool import ConnectionPool
+    from questionstore import QuestionStore
+    from sampler import QuestionSampler
+    from synthbank import build_bank, course_name
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        print(build_bank(db_path, courses, questions).summary())
+        with sqlite3.connect(db_path) as conn:
+            for index in range(0, courses, max(1, courses // 20)): # Spoil a few rows in some courses
+                conn.execute(f'UPDATE "{course_name(index)}" SET option_d = \'\' WHERE id % ? = 1', (bad_every,))
+                conn.execute(f'UPDATE "{course_name(index)}" SET correct_answer = \'E\' WHERE id % ? = 2', (bad_every,))
+        pool = ConnectionPool(db_path, size=max(workers, 1))
+        store = QuestionStore(pool.execute)
+        for label, count in (("1 worker", 1), (f"{workers} workers", workers)):
+            index = ValidIndex(pool, store, workers=count)
+            start = time.perf_counter()
+            index.check(force=True)
+            print(f"full check, {label}: {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        python_bad = sum(1 for course in store.list_courses() for row in store.all_questions(course)
+                         if validate_question(row[1:]))
+        print(f"same check in Python over every row: {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        rechecked = index.check()
+        print(f"re-check with nothing changed: {(time.perf_counter() - start) * 1000:.1f} ms ({rechecked} courses)")
+        usable, left_out = index.totals()
+        print(f"{usable:,} usable, {left_out:,} left out (Python agrees: {python_bad == left_out})")
+
+        plain, checked = QuestionSampler(store, seed=1), QuestionSampler(store, seed=1, id_source=index.valid_ids)
+        for label, sampler in (("all ids", plain), ("valid ids", checked)):
+            start = time.perf_counter()
+            for n in range(0, courses, max(1, courses // 100)):
+                sampler.sample(course_name(n), 10)
+            print(f"first quiz per course, {label}: {(time.perf_counter() - start) / min(courses, 100) * 1000:.2f} ms")
+        pool.close()
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the questions left out of quizzes.")
+    parser.add_argument("database", nargs="?", default="rharrellQuiz.db")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--recheck", action="store_true", help="check every course again, even unchanged ones")
+    parser.add_argument("--benchmark", action="store_true", help="time the check on a synthetic bank")
+    parser.add_argument("--courses", type=int, default=1000)
+    parser.add_argument("--questions", type=int, default=100_000)
+    args = parser.parse_args()
+    try:
+        if args.benchmark:
+            run_benchmark(args.courses, args.questions, args.workers)
+        else:
+            from shards import open_pool
+            from questionstore import QuestionStore
+            pool = open_pool(args.database, size=max(args.workers, 1))
+            index = ValidIndex(pool, QuestionStore(pool.execute, shards=pool.shards), workers=args.workers)
+            start = time.perf_counter()
+            rechecked = index.check(force=args.recheck)
+            print(f"Checked {rechecked} courses in {time.perf_counter() - start:.2f}s.\n")
+            print(format_exclusions(index.excluded(), index.totals()))
+            pool.close()
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        sys.exit(1)
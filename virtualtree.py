@@ -0,0 +1,340 @@
+import tkinter as tk
+from tkinter import ttk
+import time
+from dbworker import show_db_error
+
+DEFAULT_PAGE_SIZE = 100 # Rows fetched per keyset page
+DEFAULT_PREFETCH_PAGES = 1 # Pages kept loaded on each side of the visible window
+HEADER_HEIGHT = 25 # Approximate pixel height of the Treeview heading row
+DEFAULT_ROW_HEIGHT = 20
+
+
+class VirtualTreeview(ttk.Frame):
+    """A Treeview that only holds the rows currently on screen.
+
+    Rows are fetched in keyset-paginated pages (`WHERE id > ? ORDER BY id
+    LIMIT ?`) as the user scrolls. Only the pages around the visible window
+    stay in memory, and only the visible rows exist as Tk items, so opening
+    a 100k-row table costs one COUNT(*) and one page read.
+
+    fetch_page(after_id, limit) -> rows ordered by id, with the id in row[0]
+    count_rows() -> total number of rows
+    seek(offset) -> id of the row just before position `offset`, used when jumping far ahead
+
+    With a DBExecutor (and a seek function) the callbacks run on a worker
+    thread and pages are drawn as they arrive, so scrolling never blocks Tk.
+    """
+    def __init__(self, parent, columns, fetch_page, count_rows, seek=None, row_values=None,
+                 page_size=DEFAULT_PAGE_SIZE, prefetch_pages=DEFAULT_PREFETCH_PAGES, status_var=None,
+                 executor=None, owner=None):
+        super().__init__(parent)
+        self.executor = executor if seek is not None else None
+        self.owner = owner if owner is not None else self
+        self.fetch_page = fetch_page
+        self.count_rows = count_rows
+        self.seek = seek
+        self.row_values = row_values or (lambda row: row)
+        self.page_size = page_size
+        self.prefetch_pages = prefetch_pages
+        self.status_var = status_var
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings")
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_wheel) # Windows / macOS
+        self.tree.bind("<Button-4>", lambda e: self.scroll_to(self.top - 3)) # X11 wheel up
+        self.tree.bind("<Button-5>", lambda e: self.scroll_to(self.top + 3)) # X11 wheel down
+        self.tree.bind("<<TreeviewSelect>>", self._remember_selection, add="+")
+
+        row_height = ttk.Style().lookup("Treeview", "rowheight")
+        self.row_height = int(row_height) if row_height else DEFAULT_ROW_HEIGHT
+        self.visible_rows = 20
+        self.total = 0
+        self.top = 0
+        self._pages = {} # page number -> rows
+        self._anchors = {0: 0} # page number -> id of the last row before that page
+        self._selected = None
+        self._pending = set() # Pages requested from the executor but not back yet
+        self._generation = 0 # Bumped on reload so late results for an old table are ignored
+        self.fetch_seconds = 0.0
+        self.rows_fetched = 0
+
+    # --- PUBLIC API ---
+
+    def reload(self):
+        """Forgets every cached page and starts again from the top."""
+        self._pages.clear()
+        self._pending.clear()
+        self._generation += 1
+        self._anchors = {0: 0}
+        self._selected = None
+        self.fetch_seconds = 0.0
+        self.rows_fetched = 0
+        self.top = 0
+        if self.executor is None:
+            self.total = self.count_rows() or 0
+            self._render()
+            return
+        self.total = 0
+        self._render()
+        if self.status_var is not None:
+            self.status_var.set("Loading...")
+        generation = self._generation
+        self.executor.submit(self, self.count_rows, owner=self.owner,
+                             on_done=lambda total: self._on_count(generation, total))
+
+    def _on_count(self, generation, total):
+        if generation == self._generation:
+            self.total = total or 0
+            self._render()
+
+    def clear(self):
+        """Empties the list without querying anything."""
+        self._pages.clear()
+        self._pending.clear()
+        self._generation += 1
+        self._anchors = {0: 0}
+        self._selected = None
+        self.total = 0
+        self.top = 0
+        self._render()
+
+    def selection(self):
+        return self.tree.selection()
+
+    def scroll_to(self, index):
+        self.top = max(0, min(index, self.total - self.visible_rows))
+        self._render()
+
+    def update_row(self, row):
+        """Replaces a cached row (matched on row[0]) after an edit."""
+        for rows in self._pages.values():
+            for i, cached in enumerate(rows):
+                if cached[0] == row[0]:
+                    rows[i] = row
+                    self._render()
+                    return
+
+    def remove_row(self, row_id):
+        """Drops a deleted row; pages from that point on are re-fetched on demand."""
+        for page, rows in self._pages.items():
+            if any(cached[0] == row_id for cached in rows):
+                break
+        else:
+            page = 0
+        for stale in [p for p in self._pages if p >= page]:
+            del self._pages[stale]
+        for stale in [p for p in self._anchors if p > page]:
+            del self._anchors[stale]
+        if str(row_id) == self._selected:
+            self._selected = None
+        self.total = max(0, self.total - 1)
+        self.top = max(0, min(self.top, self.total - self.visible_rows))
+        self._render()
+
+    def stats(self):
+        """How much of the table is actually materialized right now."""
+        return {
+            "total_rows": self.total,
+            "cached_rows": sum(len(rows) for rows in self._pages.values()),
+            "tk_items": len(self.tree.get_children()),
+            "rows_fetched": self.rows_fetched,
+            "fetch_ms": round(self.fetch_seconds * 1000, 2),
+        }
+
+    # --- PAGING ---
+
+    def _request_page(self, page):
+        """Asks the executor for a page; it is drawn when the result comes back."""
+        if page in self._pages or page in self._pending:
+            return
+        self._pending.add(page)
+        after_id = self._anchors.get(page)
+        generation = self._generation
+
+        def fetch():
+            start = time.perf_counter()
+            cursor = after_id if after_id is not None else self.seek(page * self.page_size)
+            rows = []
+            if cursor is not None:
+                rows = self.fetch_page(cursor, self.page_size) or []
+            return cursor, rows, time.perf_counter() - start
+
+        def on_error(error):
+            self._pending.discard(page)
+            show_db_error(error)
+
+        self.executor.submit(self, fetch, owner=self.owner, on_error=on_error,
+                             on_done=lambda result: self._on_page(generation, page, *result))
+
+    def _on_page(self, generation, page, after_id, rows, seconds):
+        if generation != self._generation:
+            return
+        self._pending.discard(page)
+        self.fetch_seconds += seconds
+        self.rows_fetched += len(rows)
+        self._pages[page] = list(rows)
+        self._anchors[page] = after_id
+        if rows:
+            self._anchors[page + 1] = rows[-1][0]
+        self._render()
+
+    def _load_page(self, page):
+        if page in self._pages:
+            return self._pages[page]
+        if self.executor is not None:
+            self._request_page(page)
+            return []
+        after_id = self._anchors.get(page)
+        if after_id is None:
+            if self.seek is not None:
+                after_id = self.seek(page * self.page_size)
+            else:
+                # Walk forward from the nearest page we know the cursor for
+                known = max(p for p in self._anchors if p < page)
+                for p in range(known, page):
+                    self._load_page(p)
+                return self._pages.get(page, [])
+            if after_id is None: # Row vanished underneath us
+                return []
+        start = time.perf_counter()
+        rows = self.fetch_page(after_id, self.page_size) or []
+        self.fetch_seconds += time.perf_counter() - start
+        self.rows_fetched += len(rows)
+        self._pages[page] = list(rows)
+        self._anchors[page] = after_id
+        if rows:
+            self._anchors[page + 1] = rows[-1][0]
+        return self._pages[page]
+
+    def _render(self):
+        first = self.top
+        last = min(self.total, first + self.visible_rows)
+        first_page = first // self.page_size
+        last_page = max(first_page, (last - 1) // self.page_size)
+        keep = range(max(0, first_page - self.prefetch_pages),
+                     min(last_page + self.prefetch_pages, max(0, self.total - 1) // self.page_size) + 1)
+        for page in keep:
+            if self.total:
+                self._load_page(page)
+        for page in [p for p in self._pages if p not in keep]:
+            del self._pages[page]
+
+        self.tree.delete(*self.tree.get_children())
+        for index in range(first, last):
+            rows = self._pages.get(index // self.page_size, [])
+            offset = index % self.page_size
+            if offset >= len(rows):
+                break
+            row = rows[offset]
+            self.tree.insert("", tk.END, iid=str(row[0]), values=self.row_values(row))
+        if self._selected is not None and self.tree.exists(self._selected):
+            self.tree.selection_set(self._selected)
+
+        if self.total:
+            self.scrollbar.set(first / self.total, last / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+        if self.status_var is not None:
+            stats = self.stats()
+            if self._pending:
+                self.status_var.set("Loading...")
+                return
+            self.status_var.set(f"Rows {first + 1 if self.total else 0}-{last} of {self.total} "
+                                f"({stats['cached_rows']} in memory)")
+
+    # --- EVENTS ---
+
+    def _remember_selection(self, event):
+        selected = self.tree.selection()
+        if selected: # Scrolling a selected row out of view must not forget it
+            self._selected = selected[0]
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total))
+        elif unit == "pages":
+            self.scroll_to(self.top + int(amount) * self.visible_rows)
+        else:
+            self.scroll_to(self.top + int(amount))
+
+    def _on_wheel(self, event):
+        step = event.delta // 120 if abs(event.delta) >= 120 else event.delta # Windows sends multiples of 120
+        self.scroll_to(self.top - step * 3)
+
+    def _on_resize(self, event):
+        visible = max(1, (event.height - HEADER_HEIGHT) // self.row_height)
+        if visible != self.visible_rows:
+            self.visible_rows = visible
+            self.scroll_to(self.top)
+
+
+# --- BENCHMARK ---
+
+def run_benchmark(rows=100_000, page_size=DEFAULT_PAGE_SIZE):
+    """Compares loading a whole table into a Treeview against the virtual list (needs a display)."""
+    import os
+    import shutil
+    import sqlite3
+    import tempfile
+    import tracemalloc
+    from dbpool import ConnectionPool
+    from questionstore import QuestionStore, LEGACY_TABLE_SQL
+
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, "bench.db")
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(LEGACY_TABLE_SQL.format(table_name="bench"))
+            conn.executemany(
+                'INSERT INTO "bench" (question, option_a, option_b, option_c, option_d, correct_answer) VALUES (?, ?, ?, ?, ?, ?)',
+                ((f"Question {i}?", "a", "b", "c", "d", "A") for i in range(rows)))
+        pool = ConnectionPool(db_path)
+        store = QuestionStore(pool.execute)
+        root = tk.Tk()
+        try:
+            tree = ttk.Treeview(root, columns=("id", "question"), show="headings")
+            tree.pack()
+            tracemalloc.start()
+            start = time.perf_counter()
+            for row in store.all_questions("bench"):
+                tree.insert("", tk.END, values=(row[0], row[1]))
+            root.update_idletasks()
+            full_time = time.perf_counter() - start
+            full_peak = tracemalloc.get_traced_memory()[1]
+            full_items = len(tree.get_children())
+            tracemalloc.stop()
+            tree.destroy()
+
+            virtual = VirtualTreeview(root, ("id", "question"),
+                                      fetch_page=lambda after, limit: store.page_questions("bench", after, limit),
+                                      count_rows=lambda: store.count_questions("bench"),
+                                      seek=lambda offset: store.question_id_before("bench", offset),
+                                      row_values=lambda row: (row[0], row[1]), page_size=page_size)
+            virtual.pack()
+            tracemalloc.start()
+            start = time.perf_counter()
+            virtual.reload()
+            root.update_idletasks()
+            virtual_time = time.perf_counter() - start
+            virtual_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            stats = virtual.stats()
+        finally:
+            root.destroy()
+            pool.close()
+
+        print(f"{rows:,} rows:")
+        print(f"  full load:    {full_time * 1000:9.1f} ms, {full_items:>7,} Tk items, peak {full_peak / 1024:9.1f} KiB Python heap")
+        print(f"  virtual list: {virtual_time * 1000:9.1f} ms, {stats['tk_items']:>7,} Tk items, peak {virtual_peak / 1024:9.1f} KiB Python heap")
+        print(f"  saved:        {(full_time - virtual_time) * 1000:9.1f} ms, {full_items - stats['tk_items']:>7,} Tk items")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
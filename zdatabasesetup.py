@@ -1,5 +1,15 @@
 import sqlite3
 import os
+import sys
+import time
+import hashlib
+from questionstore import QuestionStore, connection_execute, install_catalog, detect_layout, LAYOUT_SHARDED
+import search
+import dedup
+import attemptlog
+import analytics
+import validindex
+from shards import open_pool
 
 DATABASE_FILE = "rharrellQuiz.db"
 
@@ -56,48 +66,162 @@ QUESTIONS = {
     ]
 }
 
-def create_database():
-    """Creates the database and populates it with tables and questions."""
-    
-    # Remove the old database file if it exists to start fresh
-    if os.path.exists(DATABASE_FILE):
+# --- SCHEMA VERSIONING ---
+# Each migration runs once, in order, and bumps PRAGMA user_version to its number.
+# Add new entries at the end; never edit one that has already shipped.
+
+def _migration_1_seed_tracking(conn):
+    """Remembers which row each seed question became, with a hash of its content."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS seed_questions (
+                    course TEXT NOT NULL,
+                    seed_key TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    PRIMARY KEY (course, seed_key)
+                )''')
+
+def _migration_2_search_index(conn):
+    """Full-text index over every question and option (see search.py); skipped if SQLite lacks FTS5."""
+    if search.fts5_available(conn):
+        search.install(conn)
+
+def _migration_3_duplicate_index(conn):
+    """LSH buckets for near-duplicate detection (see dedup.py); filled in on first use."""
+    dedup.create_schema(conn)
+
+def _migration_4_attempt_log(conn):
+    """Quiz attempts and their answers (see attemptlog.py)."""
+    attemptlog.create_schema(conn)
+
+def _migration_5_item_analytics(conn):
+    """Rolled-up question and course statistics over the attempts (see analytics.py)."""
+    analytics.create_schema(conn)
+
+def _migration_6_valid_index(conn):
+    """Which questions can be used in quizzes (see validindex.py); filled in after seeding."""
+    validindex.create_schema(conn)
+
+def _migration_7_course_catalog(conn):
+    """Course list with trigger-maintained question counts (see questionstore.install_catalog)."""
+    install_catalog(conn)
+
+MIGRATIONS = [
+    (1, _migration_1_seed_tracking),
+    (2, _migration_2_search_index),
+    (3, _migration_3_duplicate_index),
+    (4, _migration_4_attempt_log),
+    (5, _migration_5_item_analytics),
+    (6, _migration_6_valid_index),
+    (7, _migration_7_course_catalog),
+]
+
+def apply_migrations(conn):
+    """Brings the schema up to the latest version in place. Returns the versions applied."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    applied = []
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        with conn: # One transaction per migration, including the version bump
+            conn.execute("BEGIN") # Migrations are mostly DDL, which sqlite3 would otherwise autocommit
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        applied.append(version)
+    return applied
+
+# --- SEEDING ---
+
+def _seed_key(table_name, question):
+    """Stable identity of a seed question: its course and its wording."""
+    return hashlib.sha1(f"{table_name}\0{question}".encode("utf-8")).hexdigest()
+
+def _content_hash(row):
+    return hashlib.sha1("\0".join(row).encode("utf-8")).hexdigest()
+
+def seed_questions(conn):
+    """Upserts QUESTIONS: inserts new seeds, updates changed ones, leaves everything else alone.
+
+    Returns (inserted, updated, adopted, unchanged).
+    """
+    store = QuestionStore(connection_execute(conn))
+    inserted = updated = adopted = unchanged = 0
+    with conn:
+        for table_name, questions_list in QUESTIONS.items():
+            store.create_course(table_name)
+            search.sync_course(conn, table_name)
+            known = dict(((key, (content_hash, q_id)) for key, content_hash, q_id in conn.execute(
+                "SELECT seed_key, content_hash, question_id FROM seed_questions WHERE course = ?", (table_name,))))
+
+            for row in questions_list:
+                key, content_hash = _seed_key(table_name, row[0]), _content_hash(row)
+                seen = known.get(key)
+                if seen and seen[0] == content_hash:
+                    unchanged += 1
+                    continue
+                existing = store.get_question(table_name, seen[1]) if seen else None
+                if seen and existing and existing[1] == row[0]:
+                    # The seed itself changed since it was last applied
+                    q_id = existing[0]
+                    store.update_question(table_name, q_id, row)
+                    updated += 1
+                else:
+                    # Untracked seeds already in the table (loaded before tracking existed) are
+                    # adopted as they are, so fixes made by admins are not overwritten
+                    q_id = store.question_id_by_text(table_name, row[0])
+                    if q_id is None:
+                        q_id = store.add_question(table_name, row)
+                        inserted += 1
+                    else:
+                        adopted += 1
+                conn.execute(
+                    '''INSERT INTO seed_questions (course, seed_key, content_hash, question_id) VALUES (?, ?, ?, ?)
+                       ON CONFLICT (course, seed_key) DO UPDATE SET
+                           content_hash = excluded.content_hash, question_id = excluded.question_id''',
+                    (table_name, key, content_hash, q_id))
+    return inserted, updated, adopted, unchanged
+
+def check_questions():
+    """Checks every question again for the valid-question index. Returns (usable, left out)."""
+    pool = open_pool(DATABASE_FILE, size=validindex.DEFAULT_WORKERS)
+    try:
+        index = validindex.ValidIndex(pool, QuestionStore(pool.execute, shards=pool.shards))
+        index.check(force=True) # Seeds may have been changed in place, which row counts don't show
+        return index.totals()
+    finally:
+        pool.close()
+
+def create_database(reset=False):
+    """Creates or upgrades the database in place and upserts the seed questions.
+
+    Safe to re-run against a live database: nothing is deleted and unchanged
+    seeds cost one lookup. Pass reset=True to start from an empty file.
+    """
+    if reset and os.path.exists(DATABASE_FILE):
         os.remove(DATABASE_FILE)
         print(f"Removed old database file: {DATABASE_FILE}")
 
+    conn = None
     try:
-        # Connect to the SQLite database (this will create the file)
+        start = time.perf_counter()
         conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
         print(f"Successfully connected to database '{DATABASE_FILE}'")
 
-        # Loop through the questions dictionary to create and populate each table
-        for table_name, questions_list in QUESTIONS.items():
-            
-            # 1. Create the table
-            # Using f-string with quotes to handle table names with spaces
-            create_table_sql = f'''
-            CREATE TABLE IF NOT EXISTS "{table_name}" (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT NOT NULL,
-                option_a TEXT NOT NULL,
-                option_b TEXT NOT NULL,
-                option_c TEXT NOT NULL,
-                option_d TEXT NOT NULL,
-                correct_answer TEXT NOT NULL
-            );
-            '''
-            cursor.execute(create_table_sql)
-            
-            # 2. Populate the table
-            # Using executemany for efficiency
-            insert_sql = f'INSERT INTO "{table_name}" (question, option_a, option_b, option_c, option_d, correct_answer) VALUES (?, ?, ?, ?, ?, ?)'
-            cursor.executemany(insert_sql, questions_list)
-            
-            print(f"- Table '{table_name}' created and populated with {len(questions_list)} questions.")
-
-        # Commit the changes to the database
-        conn.commit()
-        print("\nAll changes have been committed to the database.")
+        applied = apply_migrations(conn)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if applied:
+            print(f"- Applied schema migrations {applied}; now at version {version}.")
+        else:
+            print(f"- Schema already at version {version}.")
+
+        if detect_layout(connection_execute(conn)) == LAYOUT_SHARDED:
+            print("- Seed questions: not applied to a sharded bank (they go in before `python shards.py split`).")
+        else:
+            inserted, updated, adopted, unchanged = seed_questions(conn)
+            print(f"- Seed questions: {inserted} inserted, {updated} updated, {adopted} adopted, {unchanged} unchanged.")
+        usable, left_out = check_questions()
+        print(f"- Question check: {usable} usable, {left_out} left out of quizzes"
+              + (" (`python validindex.py` lists them)." if left_out else "."))
+        print(f"\nProvisioning finished in {(time.perf_counter() - start) * 1000:.1f} ms.")
 
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -108,4 +232,4 @@ def create_database():
             print("Database connection closed.")
 
 if __name__ == "__main__":
-    create_database()
+    create_database(reset="--reset" in sys.argv[1:])